@@ -13,6 +13,9 @@ _G_ASTRO_DAYS_REF = (0.017202098950233253**2) / 333000.0 # Approx 8.886e-10
 G_ASTRO_MONTHS = _G_ASTRO_DAYS_REF * (DAYS_PER_MONTH**2) # Approx 8.231e-7
 CONVERT_ACCEL_AU_MONTH2_TO_KM_S_MONTH = 1.0 / KM_PER_S_TO_AU_PER_MONTH
 
+# Time units a gravitational constant may be given in, as that unit per month
+G_TIME_UNITS = {"months": 1.0, "days": DAYS_PER_MONTH}
+
 
 #==============================================================================
 #                                 Package Methods
@@ -77,6 +80,75 @@ def read_system(file_name):
 
 
 
+#---------------------------- Array Conversions -------------------------------
+def bodies_to_arrays(system):
+    """Convert a list of bodies to the array form used by the simulations.
+
+    Method Arguments:
+    * system: A list of bodies.
+
+    Output:
+    * A tuple of (masses, positions, velocities, names): a length N numpy
+      array of masses, Vector3Arrays of the positions and velocities, and a
+      list of names.
+    """
+    import numpy as np
+    masses = np.array([body.mass for body in system], dtype=float)
+    positions = Vector3Array.from_vectors([body.pos for body in system])
+    velocities = Vector3Array.from_vectors([body.velocity for body in system])
+    return masses, positions, velocities, [body.name for body in system]
+
+
+
+def arrays_to_bodies(masses, positions, velocities, names):
+    """Convert the array form back to a list of new bodies.
+
+    Method Arguments:
+    * masses: A length N array of masses in Earth masses.
+    * positions: A Vector3Array or (N, 3) array of positions in AU.
+    * velocities: A Vector3Array or (N, 3) array of velocities in km/s.
+    * names: A list of N names.
+
+    Output:
+    * A list of new Planetary_Body objects.
+    """
+    positions = positions.data if isinstance(positions, Vector3Array) else positions
+    velocities = velocities.data if isinstance(velocities, Vector3Array) else velocities
+    return [Planetary_Body(mass, Vector3(*pos), Vector3(*vel), name)
+            for mass, pos, vel, name in zip(list(masses), positions.tolist(), velocities.tolist(), names)]
+
+
+
+def _restore_slots(obj, state):
+    """Set the attributes of an unpickled slotted object. Accepts the
+    (None, slots) state of slotted classes and the plain attribute dict that
+    older pickles hold."""
+    if isinstance(state, tuple):
+        state = state[1]
+    for key, value in state.items():
+        setattr(obj, key, value)
+
+
+
+#------------------------ Gravitational Constant Units ------------------------
+def G_to_months(G, time_unit="months"):
+    """Convert a gravitational constant to AU^3/(MEarth * month^2), the units
+    the simulations work in.
+
+    Method Arguments:
+    * G: The gravitational constant in AU^3/(MEarth * time_unit^2). A number
+      or a numpy array.
+    * time_unit: One of the keys of G_TIME_UNITS ("months" or "days").
+
+    Output:
+    * G in AU^3/(MEarth * month^2).
+    """
+    if time_unit not in G_TIME_UNITS:
+        raise ValueError(f"time_unit must be one of {tuple(G_TIME_UNITS)}, got '{time_unit}'.")
+    return G * G_TIME_UNITS[time_unit]**2
+
+
+
 #-------------------------- Body Gravitational Force --------------------------
 def get_gravitatonal_force_euler(body1, body2):
     """Get the gravitational force between 2 bodies based on the elasped 
@@ -183,6 +255,9 @@ def get_body_distance(body1, body2):
 #                                  Vector3 Class
 #==============================================================================
 class Vector3:
+
+    # No per-instance __dict__, which keeps every vector small
+    __slots__ = ("x", "y", "z")
     
     #--------------------------- Constructor Method ---------------------------
     def __init__(self, x_val = 0.0, y_val = 0.0, z_val = 0.0):
@@ -388,6 +463,190 @@ class Vector3:
         """
         return f"Vector3({self.x}, {self.y}, {self.z})"
 
+    def __setstate__(self, state):
+        """Restore a pickled Vector3, including ones dumped before the class
+        used __slots__."""
+        _restore_slots(self, state)
+
+#==============================================================================
+#                               Vector3Array Class
+#==============================================================================
+class Vector3Array:
+    """Many Vector3s stored together in one (M, 3) numpy array.
+
+    Supports the same + - * / operators, magnitude() and normalize() as
+    Vector3, applied to every vector at once. The other operand may be a
+    number, a Vector3, a Vector3Array of the same length, or a length M numpy
+    array holding one number per vector (a length 3 array is read as one
+    vector). The x, y and z attributes are views of the columns of the
+    buffer.
+    """
+
+    __slots__ = ("data",)
+
+    #--------------------------- Constructor Method ---------------------------
+    def __init__(self, data = None):
+        """Initailize the Vector3Array.
+
+        Method Arguments:
+        * data: An (M, 3) array-like of components, a list of Vector3s, or
+          None for an empty array. Numpy float arrays are used without a copy.
+
+        Output:
+        * None
+        """
+        import numpy as np
+        if data is None:
+            data = np.empty((0, 3))
+        elif isinstance(data, (list, tuple)) and data and isinstance(data[0], Vector3):
+            data = [[v.x, v.y, v.z] for v in data]
+        self.data = np.asarray(data, dtype=float).reshape(-1, 3)
+
+    @classmethod
+    def from_vectors(cls, vectors):
+        """Build a Vector3Array from a list of Vector3s.
+
+        Method Arguments:
+        * vectors: A list of Vector3.
+
+        Output:
+        * A new Vector3Array holding a copy of every vector.
+        """
+        import numpy as np
+        return cls(np.array([[v.x, v.y, v.z] for v in vectors], dtype=float))
+
+    def to_vectors(self):
+        """Return the vectors as a list of new Vector3s.
+
+        Method Arguments:
+        * None
+
+        Output:
+        * A list of Vector3, one per row.
+        """
+        return [Vector3(x, y, z) for x, y, z in self.data.tolist()]
+
+
+
+    #---------------------------- Container Methods ---------------------------
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __getitem__(self, index):
+        """An integer index returns a new Vector3. A slice or index array
+        returns a Vector3Array (a view for slices)."""
+        import numpy as np
+        if isinstance(index, (int, np.integer)):
+            return Vector3(*self.data[index])
+        return Vector3Array(self.data[index])
+
+    def __setitem__(self, index, value):
+        """Set one or more rows from a Vector3, Vector3Array or array-like."""
+        if isinstance(value, Vector3):
+            value = (value.x, value.y, value.z)
+        elif isinstance(value, Vector3Array):
+            value = value.data
+        self.data[index] = value
+
+    def __iter__(self):
+        return iter(self.to_vectors())
+
+    @property
+    def x(self):
+        return self.data[:, 0]
+
+    @property
+    def y(self):
+        return self.data[:, 1]
+
+    @property
+    def z(self):
+        return self.data[:, 2]
+
+
+
+    #--------------------------- Arithmetic Methods ---------------------------
+    def _operand(self, other):
+        """Turn the other operand into something that broadcasts against the
+        (M, 3) buffer."""
+        import numpy as np
+        if isinstance(other, Vector3Array):
+            return other.data
+        if isinstance(other, Vector3):
+            return np.array([other.x, other.y, other.z])
+        other = np.asarray(other, dtype=float)
+        if other.ndim == 1 and other.shape[0] == len(self) and other.shape[0] != 3:
+            return other[:, np.newaxis]
+        return other
+
+    def __add__(self, other):
+        """The element-wise sum, as a new Vector3Array."""
+        return Vector3Array(self.data + self._operand(other))
+
+    def __sub__(self, other):
+        """The element-wise difference, as a new Vector3Array."""
+        return Vector3Array(self.data - self._operand(other))
+
+    def __mul__(self, other):
+        """The element-wise product, as a new Vector3Array."""
+        return Vector3Array(self.data * self._operand(other))
+
+    def __truediv__(self, other):
+        """The element-wise quotient, as a new Vector3Array.
+
+        Raises a ValueError for division by zero, like Vector3.
+        """
+        import numpy as np
+        other = self._operand(other)
+        if np.any(other == 0):
+            raise ValueError("Division by zero in Vector3Array.")
+        return Vector3Array(self.data / other)
+
+    __radd__ = __add__
+    __rmul__ = __mul__
+
+
+
+    #----------------------------- Getter Methods -----------------------------
+    def magnitude(self):
+        """Return the magnitude of every vector.
+
+        Method Arguments:
+        * None
+
+        Output:
+        * A length M numpy array of magnitudes.
+        """
+        import numpy as np
+        return np.sqrt(np.einsum('ij,ij->i', self.data, self.data))
+
+    def normalize(self):
+        """Return a normalized copy of every vector.
+
+        Method Arguments:
+        * None
+
+        Output:
+        * A new Vector3Array of unit vectors. Zero vectors stay zero, like
+          Vector3.normalize().
+        """
+        import numpy as np
+        mag = self.magnitude()
+        safe = np.where(mag == 0, 1.0, mag)
+        return Vector3Array(self.data / safe[:, np.newaxis])
+
+    def to_list(self):
+        """Return the vectors as a list of [x, y, z] lists."""
+        return self.data.tolist()
+
+    def copy(self):
+        """A deep copy of the Vector3Array."""
+        return Vector3Array(self.data.copy())
+
+    def __str__(self):
+        """Returns the Vector3Array as a string, one Vector3 per row."""
+        return "Vector3Array([" + ", ".join(str(v) for v in self.to_vectors()) + "])"
+
 #==============================================================================
 #                             Planetary_Body Class
 #==============================================================================
@@ -395,6 +654,7 @@ class Planetary_Body:
 
     #---------------------------- Static Variables ----------------------------
     km_per_s_to_AU_per_month = KM_PER_S_TO_AU_PER_MONTH
+    __slots__ = ("name", "mass", "pos", "velocity")
     
     #--------------------------- Constructor Method ---------------------------
     def __init__(self, mass_val = 0.0, pos_vector = Vector3(), 
@@ -435,15 +695,22 @@ class Planetary_Body:
             n = self.name == other.name
             return m and p and v and n
         return False
+
+    def __setstate__(self, state):
+        """Restore a pickled body, including ones dumped before the class used
+        __slots__."""
+        _restore_slots(self, state)
     
     @staticmethod
-    def calculate_gravitational_force_exerted_by_on(acting_body, target_body):
+    def calculate_gravitational_force_exerted_by_on(acting_body, target_body, G=None):
         """Returns the Force an exerting object applies 
         to a target object due to gravity.
         
         Method Arguments:
         * acting_body: the body applying the force
         * target_body: the body being pulled
+        * G: the gravitational constant in AU^3/(MEarth * month^2). Defaults to
+          G_ASTRO_MONTHS.
 
         Output:
         * The forece of gravity experienced by the target body.
@@ -459,6 +726,8 @@ class Planetary_Body:
         a = ( G * M ) / r^2
         """
         import numpy as np 
+        if G is None:
+            G = G_ASTRO_MONTHS
         r_vector = acting_body.pos - target_body.pos 
         dist_sq = r_vector.x**2 + r_vector.y**2 + r_vector.z**2 
         if dist_sq == 0:
@@ -466,7 +735,7 @@ class Planetary_Body:
         dist = np.sqrt(dist_sq)
         if dist == 0: 
             return Vector3(0,0,0)
-        force_scalar_part = G_ASTRO_MONTHS * acting_body.mass * target_body.mass / (dist * dist_sq)
+        force_scalar_part = G * acting_body.mass * target_body.mass / (dist * dist_sq)
         force_vector = r_vector * force_scalar_part
         return force_vector
     
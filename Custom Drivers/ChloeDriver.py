@@ -2,13 +2,11 @@
 import Body
 import time
 import os
-from Simulation import Simulation 
+import Sweep
+from Simulation import Simulation, EnsembleSimulation
 from Visualizer import run_anim
 
 def run_sim_with_G(G, sim_name, display_anim = False, overide_max_range = -1):
-    Body._G_ASTRO_DAYS_REF = G
-    Body.G_ASTRO_MONTHS = Body._G_ASTRO_DAYS_REF * (Body.DAYS_PER_MONTH**2)
-
     # Adjust these variables to adjust simulation
     SIMULATION_DURATION_YEARS = 10.0        # Total duration in years
     TIME_STEP_MONTHS = .1                   # Simulation time step in months (e.g., 0.1 months ~ 3 days)
@@ -25,7 +23,10 @@ def run_sim_with_G(G, sim_name, display_anim = False, overide_max_range = -1):
     simulation_instance = Simulation(
         list_of_planetary_bodies=system,
         time_step_months=TIME_STEP_MONTHS,
-        name = SIMULATION_NAME
+        name = SIMULATION_NAME,
+        integrator = "kepler",              # Two bodies, so the orbit is computed exactly instead of stepped
+        G = G,                              # Only this simulation uses this G
+        G_units = "days"                    # G is in AU^3/(MEarth * day^2)
     )
 
     # Run the simulation and display elapsed time
@@ -47,7 +48,7 @@ def run_sim_with_G(G, sim_name, display_anim = False, overide_max_range = -1):
         run_anim(SIMULATION_NAME, overide_max_range)
 
 
-def get_data():
+def get_G_values():
     import numpy as np
 
     # Control Variables
@@ -56,37 +57,61 @@ def get_data():
     max_perc = 2
     num_runs = 11
     center_bias = 0.75
-    sim_name = "GravConstant_"
 
     # Get a set of values with a concentration near the default value
     start = min_perc * default_G
     end = max_perc * default_G
     even_steps = np.linspace(-1, 1, num_runs)
     concentrated_steps = np.sign(even_steps) * np.abs(even_steps)**(1 / center_bias)
-    scaled_steps = (concentrated_steps + 1) / 2 * (end - start) + start
+    return (concentrated_steps + 1) / 2 * (end - start) + start
+
+def get_data(display_anim = True, overide_max_range = 3):
+    sim_name = "GravConstant_"
+    scaled_steps = get_G_values()
     
-    for i in range(0, num_runs): 
-        run_sim_with_G(scaled_steps[i], sim_name + str(scaled_steps[i]), True, 3)
+    # Every G value runs at the same time in its own process
+    results = Sweep.run_sweep(
+        scenario_files = ["StartingData" + os.sep + "Grav_Constant_Test.csv"],
+        total_duration_years = 10.0,
+        G_values = list(scaled_steps),
+        time_steps = [.1],
+        G_units = "days",
+        dump_names = lambda key: sim_name + str(key[1]),
+        integrator = "kepler"
+    )
+    for key, result in results.items():
+        print(f"G = {key[1]}: finished in {result['elapsed']:.2f} s")
     
-def play_animations():
-    import numpy as np
-
-    # Control Variables
-    default_G = Body._G_ASTRO_DAYS_REF
-    min_perc = 0.5
-    max_perc = 2
-    num_runs = 11
-    center_bias = 0.75
+    # The worker processes cannot show windows, so the runs are animated once they are all done
+    if (display_anim):
+        for G in scaled_steps:
+            run_anim(sim_name + str(G), overide_max_range)
+    
+def get_data_ensemble():
     sim_name = "GravConstant_"
+    SIMULATION_DURATION_YEARS = 10.0
+    TIME_STEP_MONTHS = .1
+    FILE_NAME = "StartingData" + os.sep + "Grav_Constant_Test.csv"
+    scaled_steps = get_G_values()
+
+    # Every G value runs side by side in one ensemble instead of one simulation each
+    ensemble = EnsembleSimulation(
+        systems = [Body.read_system(FILE_NAME) for _ in range(len(scaled_steps))],
+        time_step_months = TIME_STEP_MONTHS,
+        G = scaled_steps,                     # One G per member, in AU^3/(MEarth * day^2)
+        G_units = "days",
+        name = sim_name
+    )
+    start_time = time.time()
+    ensemble.run_simulation(total_duration_years=SIMULATION_DURATION_YEARS)
+    print(f"Ensemble finished. Elapsed time: {time.time() - start_time}")
+    ensemble.dump_members([sim_name + str(G) for G in scaled_steps])
 
-    # Get a set of values with a concentration near the default value
-    start = min_perc * default_G
-    end = max_perc * default_G
-    even_steps = np.linspace(-1, 1, num_runs)
-    concentrated_steps = np.sign(even_steps) * np.abs(even_steps)**(1 / center_bias)
-    scaled_steps = (concentrated_steps + 1) / 2 * (end - start) + start
+def play_animations():
+    sim_name = "GravConstant_"
+    scaled_steps = get_G_values()
     
-    for i in range(0, num_runs):
+    for i in range(0, len(scaled_steps)):
         #run_anim(sim_name + str(scaled_steps[i]), 3)
         pass
     run_anim(sim_name + str(scaled_steps[0]), 3)
@@ -0,0 +1,241 @@
+# diagnostics.py
+import numpy as np
+from Body import KM_PER_S_TO_AU_PER_MONTH
+
+PAIR_BLOCK_SIZE = 1024  # Rows of the pair distance matrix computed at once
+
+#==============================================================================
+#                                 Package Methods
+#==============================================================================
+# Every reducer takes the state of the massive bodies and returns a dict of
+# named values (floats or small arrays). Any function with the same arguments
+# can be passed to Diagnostics alongside or instead of these.
+
+#------------------------------ Energy Reducer --------------------------------
+def energy(positions, velocities, masses, G):
+    """Get the kinetic, potential and total energy of the system.
+
+    Method Arguments:
+    * positions: An (N, 3) numpy array of positions in AU.
+    * velocities: An (N, 3) numpy array of velocities in km/s.
+    * masses: A length N array of masses in Earth masses.
+    * G: The gravitational constant in AU^3/(MEarth * month^2).
+
+    Output:
+    * A dict of 'kinetic', 'potential' and 'energy' in MEarth * AU^2/month^2.
+
+    Pairs that share a position add no potential energy, just like they
+    apply no force in Forces.direct_accelerations.
+    """
+    velocities = velocities * KM_PER_S_TO_AU_PER_MONTH
+    kinetic = 0.5 * np.einsum('i,ik,ik->', masses, velocities, velocities)
+    potential = 0.0
+    for start, distances in _pair_distances(positions):
+        with np.errstate(divide='ignore'):
+            inverse = np.where(distances > 0, 1.0 / distances, 0.0)
+        potential -= 0.5 * G * np.einsum('i,ij,j->', masses[start:start + len(distances)], inverse, masses)
+    return {'kinetic': kinetic, 'potential': potential, 'energy': kinetic + potential}
+
+
+
+#------------------------- Angular Momentum Reducer ---------------------------
+def angular_momentum(positions, velocities, masses, G):
+    """Get the total angular momentum of the system about the origin.
+
+    Method Arguments:
+    * positions: An (N, 3) numpy array of positions in AU.
+    * velocities: An (N, 3) numpy array of velocities in km/s.
+    * masses: A length N array of masses in Earth masses.
+    * G: Unused, part of the reducer arguments.
+
+    Output:
+    * A dict of the 'angular_momentum' vector in MEarth * AU^2/month.
+    """
+    momenta = masses[:, np.newaxis] * velocities * KM_PER_S_TO_AU_PER_MONTH
+    # Sum of r x p written out, which is much faster than np.cross on small N
+    ahead, behind = [1, 2, 0], [2, 0, 1]
+    return {'angular_momentum': (positions[:, ahead] * momenta[:, behind]
+                                 - positions[:, behind] * momenta[:, ahead]).sum(axis=0)}
+
+
+
+#-------------------------- Center of Mass Reducer ----------------------------
+def center_of_mass(positions, velocities, masses, G):
+    """Get the position and velocity of the center of mass.
+
+    Method Arguments:
+    * positions: An (N, 3) numpy array of positions in AU.
+    * velocities: An (N, 3) numpy array of velocities in km/s.
+    * masses: A length N array of masses in Earth masses.
+    * G: Unused, part of the reducer arguments.
+
+    Output:
+    * A dict of the 'com_position' (AU) and 'com_velocity' (km/s) vectors.
+    """
+    total_mass = masses.sum()
+    return {'com_position': masses @ positions / total_mass,
+            'com_velocity': masses @ velocities / total_mass}
+
+
+
+#------------------------- Pair Separation Reducer ----------------------------
+def pair_separations(positions, velocities, masses, G):
+    """Get the closest and widest separation of any two bodies.
+
+    Method Arguments:
+    * positions: An (N, 3) numpy array of positions in AU.
+    * velocities: Unused, part of the reducer arguments.
+    * masses: Unused, part of the reducer arguments.
+    * G: Unused, part of the reducer arguments.
+
+    Output:
+    * A dict of 'min_separation' and 'max_separation' in AU. Both are 0.0
+      for a single body.
+    """
+    closest, widest = np.inf, 0.0
+    for start, distances in _pair_distances(positions):
+        rows = np.arange(len(distances))
+        distances[rows, start + rows] = np.inf # A body and itself
+        closest = min(closest, distances.min(initial=np.inf))
+        distances[rows, start + rows] = 0.0
+        widest = max(widest, distances.max(initial=0.0))
+    return {'min_separation': 0.0 if np.isinf(closest) else float(closest), 'max_separation': float(widest)}
+
+
+
+DEFAULT_REDUCERS = (energy, angular_momentum, center_of_mass, pair_separations)
+
+
+
+def _relative(change, start):
+    """change / start, or the change itself when start is zero."""
+    return float(change / start) if start != 0 else float(change)
+
+
+
+def _pair_distances(positions):
+    """Yield (first row, distances) for blocks of rows of the all-pairs
+    distance matrix, so its memory stays PAIR_BLOCK_SIZE x N."""
+    for start in range(0, len(positions), PAIR_BLOCK_SIZE):
+        disp = positions[np.newaxis, :, :] - positions[start:start + PAIR_BLOCK_SIZE, np.newaxis, :]
+        yield start, np.sqrt(np.einsum('ijk,ijk->ij', disp, disp))
+
+
+
+#==============================================================================
+#                                Diagnostics Class
+#==============================================================================
+class Diagnostics:
+    """Time series of reduced quantities collected while a run goes.
+
+    Every every-th step (plus the final step) each reducer is applied to the
+    state of the massive bodies and its values are appended to the series, so
+    a run can be checked for energy, angular momentum and center of mass
+    drift without recording or storing its trajectory.
+    """
+
+    #--------------------------- Constructor Method ---------------------------
+    def __init__(self, num_steps, dt_months, every=1, reducers=None):
+        """Set up the evaluation schedule.
+
+        Method Arguments:
+        * num_steps: The number of integrator steps in the run.
+        * dt_months: The time step in months, used to convert steps to times.
+        * every: Evaluate every this many steps. The first and final steps
+          are always evaluated.
+        * reducers: A list of reducer functions. Defaults to
+          DEFAULT_REDUCERS.
+
+        Output:
+        * None
+        """
+        if int(every) < 1:
+            raise ValueError("every must be at least 1.")
+        self.num_steps = int(num_steps)
+        self.dt_months = float(dt_months)
+        self.every = int(every)
+        self.reducers = list(DEFAULT_REDUCERS if reducers is None else reducers)
+        self.eval_steps = np.arange(0, self.num_steps + 1, self.every)
+        if self.eval_steps[-1] != self.num_steps:
+            self.eval_steps = np.append(self.eval_steps, self.num_steps)
+        self.values = {}
+        self.count = 0
+
+    #---------------------------- Recording Methods ---------------------------
+    def wants(self, step):
+        """Check if a step is one that gets evaluated.
+
+        Method Arguments:
+        * step: The step number, 0 being the starting state.
+
+        Output:
+        * True if evaluate() should be called for this step.
+        """
+        return self.count < len(self.eval_steps) and self.eval_steps[self.count] == step
+
+    def evaluate(self, positions, velocities, masses, G):
+        """Apply every reducer to a state and append the results.
+
+        Method Arguments:
+        * positions: An (N, 3) array of positions in AU.
+        * velocities: An (N, 3) array of velocities in km/s.
+        * masses: A length N array of masses in Earth masses.
+        * G: The gravitational constant in AU^3/(MEarth * month^2).
+
+        Output:
+        * None
+        """
+        for reducer in self.reducers:
+            for name, value in reducer(positions, velocities, masses, G).items():
+                self.values.setdefault(name, []).append(value)
+        self.count += 1
+
+    #----------------------------- Getter Methods -----------------------------
+    def series(self):
+        """Get the collected time series.
+
+        Output:
+        * A dict of 'steps', 'times' (months) and one array per reduced
+          value, with the evaluations along the first axis.
+        """
+        series = {'steps': self.steps, 'times': self.times}
+        for name, values in self.values.items():
+            series[name] = np.array(values)
+        return series
+
+    def drift(self):
+        """Get how far the conserved quantities wandered from their starting
+        values.
+
+        Output:
+        * A dict of the largest relative 'energy' and 'angular_momentum'
+          change and the largest 'com_position' distance in AU from the
+          straight line the center of mass starts on, for whichever of them
+          were reduced. A quantity that starts at exactly zero (the angular
+          momentum of a radial orbit, say) has its absolute change reported
+          instead.
+        """
+        series = self.series()
+        drift = {}
+        if 'energy' in series:
+            energies = series['energy']
+            drift['energy'] = _relative(np.abs(energies - energies[0]).max(), abs(energies[0]))
+        if 'angular_momentum' in series:
+            momenta = series['angular_momentum']
+            drift['angular_momentum'] = _relative(np.linalg.norm(momenta - momenta[0], axis=1).max(),
+                                                  np.linalg.norm(momenta[0]))
+        if 'com_position' in series and 'com_velocity' in series:
+            expected = series['com_position'][0] + np.outer(series['times'],
+                                                            series['com_velocity'][0] * KM_PER_S_TO_AU_PER_MONTH)
+            drift['com_position'] = float(np.linalg.norm(series['com_position'] - expected, axis=1).max())
+        return drift
+
+    @property
+    def steps(self):
+        """Step number of every evaluation so far."""
+        return self.eval_steps[:self.count]
+
+    @property
+    def times(self):
+        """Simulated time in months of every evaluation so far."""
+        return self.eval_steps[:self.count] * self.dt_months
@@ -0,0 +1,512 @@
+# forces.py
+import numpy as np
+
+#==============================================================================
+#                                 Package Methods
+#==============================================================================
+
+#--------------------------- Direct Summation Kernel --------------------------
+def direct_accelerations(target_pos, source_pos, source_masses, G):
+    """Get the gravitational acceleration every source body applies to every
+    target body in one broadcast operation.
+
+    Method Arguments:
+    * target_pos: A (T, 3) numpy array of the positions being pulled in AU.
+    * source_pos: A (S, 3) numpy array of the positions applying gravity in
+      AU.
+    * source_masses: A (S,) numpy array of the source masses in Earth masses.
+    * G: The gravitational constant in AU^3/(MEarth * month^2).
+
+    Output:
+    * A (T, 3) numpy array of accelerations in AU/month^2.
+
+    Computes the same sum as calling
+    Planetary_Body.calculate_gravitational_force_exerted_by_on for every pair
+    and dividing by the target's mass. Pairs that share a position (including
+    a body and itself) apply no force, just like the per-body method.
+    """
+    # r_vector = acting_body.pos - target_body.pos for every pair
+    disp = source_pos[np.newaxis, :, :] - target_pos[:, np.newaxis, :]
+    dist_sq = np.einsum('tsk,tsk->ts', disp, disp)
+
+    # G * M / r^3, with coincident pairs contributing nothing
+    with np.errstate(divide='ignore'):
+        inv_dist_cubed = np.where(dist_sq > 0, dist_sq ** -1.5, 0.0)
+
+    return G * np.einsum('ts,s,tsk->tk', inv_dist_cubed, source_masses, disp)
+
+
+
+def direct_acc_jerk(target_pos, target_vel, source_pos, source_vel, source_masses, G):
+    """Get the gravitational acceleration and its time derivative (jerk) every
+    source body applies to every target body.
+
+    Method Arguments:
+    * target_pos: A (T, 3) numpy array of the target positions in AU.
+    * target_vel: A (T, 3) numpy array of the target velocities in AU/month.
+    * source_pos: A (S, 3) numpy array of the source positions in AU.
+    * source_vel: A (S, 3) numpy array of the source velocities in AU/month.
+    * source_masses: A (S,) numpy array of the source masses in Earth masses.
+    * G: The gravitational constant in AU^3/(MEarth * month^2).
+
+    Output:
+    * A tuple of (T, 3) numpy arrays: the accelerations in AU/month^2 and the
+      jerks in AU/month^3.
+
+    Used by the Hermite integrator. Coincident pairs contribute nothing.
+    """
+    disp = source_pos[np.newaxis, :, :] - target_pos[:, np.newaxis, :]
+    dvel = source_vel[np.newaxis, :, :] - target_vel[:, np.newaxis, :]
+    dist_sq = np.einsum('tsk,tsk->ts', disp, disp)
+    radial = np.einsum('tsk,tsk->ts', disp, dvel)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inv_dist_cubed = np.where(dist_sq > 0, dist_sq ** -1.5, 0.0)
+        rate = np.where(dist_sq > 0, 3.0 * radial / dist_sq, 0.0)
+
+    weight = G * source_masses[np.newaxis, :] * inv_dist_cubed
+    acc = np.einsum('ts,tsk->tk', weight, disp)
+    jerk = np.einsum('ts,tsk->tk', weight, dvel - rate[:, :, np.newaxis] * disp)
+    return acc, jerk
+
+
+
+def ensemble_accelerations(positions, masses, G, out=None):
+    """Get the gravitational accelerations inside many independent systems
+    of the same size in one broadcast operation.
+
+    Method Arguments:
+    * positions: An (E, N, 3) numpy array holding the positions of E systems
+      of N bodies in AU.
+    * masses: An (E, N) numpy array of masses in Earth masses.
+    * G: The gravitational constant in AU^3/(MEarth * month^2). A scalar or
+      an (E,) array with one value per system.
+    * out: An optional (E, N, 3) numpy array to write the result into.
+
+    Output:
+    * An (E, N, 3) numpy array of accelerations in AU/month^2.
+
+    Bodies only pull on bodies in the same system. Coincident pairs
+    contribute nothing.
+    """
+    disp = positions[:, np.newaxis, :, :] - positions[:, :, np.newaxis, :]
+    dist_sq = np.einsum('etsk,etsk->ets', disp, disp)
+
+    with np.errstate(divide='ignore'):
+        inv_dist_cubed = np.where(dist_sq > 0, dist_sq ** -1.5, 0.0)
+
+    # G * M per source, per system
+    weight = np.asarray(G, dtype=float).reshape(-1, 1) * masses
+    return np.einsum('ets,es,etsk->etk', inv_dist_cubed, weight, disp, out=out)
+
+
+#==============================================================================
+#                              Force Solver Classes
+#==============================================================================
+class DirectSummation:
+    """Exact all-pairs force solver that keeps its pairwise scratch arrays
+    between calls, so repeated evaluations on the same number of bodies do
+    not allocate any new arrays.
+    """
+
+    # Smallest r^3 used for coincident pairs. Their displacement is exactly
+    # zero, so the huge 1/r^3 still multiplies out to no force.
+    _MIN_DIST_CUBED = np.finfo(float).tiny
+
+    #--------------------------- Constructor Method ---------------------------
+    def __init__(self):
+        """Initialize the solver. Scratch arrays are sized on first use.
+
+        Method Arguments:
+        * None
+
+        Output:
+        * None
+        """
+        self._shape = None
+
+    def _allocate(self, num_targets, num_sources):
+        """Size the scratch arrays for num_targets x num_sources pairs."""
+        self._shape = (num_targets, num_sources)
+        self._disp = np.empty((num_targets, 3, num_sources))
+        self._disp_sq = np.empty((num_targets, 3, num_sources))
+        self._dist_sq = np.empty((num_targets, num_sources))
+        self._inv_dist_cubed = np.empty((num_targets, num_sources))
+
+    #----------------------------- Solver Methods -----------------------------
+    def accelerations(self, target_pos, source_pos, source_masses, G, out=None):
+        """Get the acceleration every source body applies to every target.
+
+        Method Arguments:
+        * target_pos: A (T, 3) numpy array of the positions being pulled in AU.
+        * source_pos: A (S, 3) numpy array of the positions applying gravity
+          in AU.
+        * source_masses: A (S,) numpy array of the source masses in Earth
+          masses.
+        * G: The gravitational constant in AU^3/(MEarth * month^2).
+        * out: An optional (T, 3) array to write the result into.
+
+        Output:
+        * A (T, 3) numpy array of accelerations in AU/month^2.
+        """
+        num_targets = target_pos.shape[0]
+        num_sources = source_pos.shape[0]
+        if self._shape != (num_targets, num_sources):
+            self._allocate(num_targets, num_sources)
+        if out is None:
+            out = np.empty((num_targets, 3))
+
+        disp = self._disp
+        disp_sq = self._disp_sq
+        dist_sq = self._dist_sq
+        inv_dist_cubed = self._inv_dist_cubed
+
+        # Displacements are laid out (target, component, source) so the final
+        # mass-weighted sum is a contiguous matrix-vector product.
+        np.subtract(source_pos.T[np.newaxis, :, :], 
+                    target_pos[:, :, np.newaxis], out=disp)
+        np.multiply(disp, disp, out=disp_sq)
+        np.add(disp_sq[:, 0, :], disp_sq[:, 1, :], out=dist_sq)
+        np.add(dist_sq, disp_sq[:, 2, :], out=dist_sq)
+
+        np.sqrt(dist_sq, out=inv_dist_cubed)
+        np.multiply(inv_dist_cubed, dist_sq, out=inv_dist_cubed)
+        np.maximum(inv_dist_cubed, self._MIN_DIST_CUBED, out=inv_dist_cubed)
+        np.divide(1.0, inv_dist_cubed, out=inv_dist_cubed)
+
+        np.multiply(disp, inv_dist_cubed[:, np.newaxis, :], out=disp)
+        np.matmul(disp, source_masses, out=out)
+        np.multiply(out, G, out=out)
+        return out
+
+
+
+class BarnesHut:
+    """Approximate O(N log N) force solver using a Barnes-Hut octree.
+
+    The tree is built level by level from the Morton (Z-order) keys of the
+    source bodies, and all targets walk it together: every (target, cell)
+    pair still being considered is tested at once with numpy. A cell is
+    treated as a single body at its centre of mass when
+
+        cell width / distance to centre of mass < theta
+
+    and the target is not inside the cell. Cells holding leaf_size bodies or
+    fewer are summed exactly. theta = 0 gives the exact all-pairs result.
+    """
+
+    # Bits of the Morton key per axis (3 * 21 = 63 bits fit in a uint64)
+    MAX_DEPTH = 21
+
+    #--------------------------- Constructor Method ---------------------------
+    def __init__(self, theta=0.5, leaf_size=8, batch_size=2048):
+        """Initialize the solver.
+
+        Method Arguments:
+        * theta: The opening angle. Smaller values are more accurate and
+          slower.
+        * leaf_size: Cells with this many bodies or fewer are not split.
+        * batch_size: The number of targets walking the tree together. Bounds
+          the memory used by the walk.
+
+        Output:
+        * None
+        """
+        if theta < 0:
+            raise ValueError("theta must not be negative.")
+        self.theta = float(theta)
+        self.leaf_size = max(1, int(leaf_size))
+        self.batch_size = max(1, int(batch_size))
+
+    #------------------------------ Tree Methods ------------------------------
+    def _morton_keys(self, pos, origin, width):
+        """Get the Morton key of every position inside the root cube."""
+        cells = 1 << self.MAX_DEPTH
+        scaled = np.floor((pos - origin) / width * cells)
+        grid = np.clip(scaled, 0, cells - 1).astype(np.uint64)
+
+        keys = np.zeros(pos.shape[0], dtype=np.uint64)
+        for bit in range(self.MAX_DEPTH):
+            for axis in range(3):
+                b = (grid[:, axis] >> np.uint64(bit)) & np.uint64(1)
+                keys |= b << np.uint64(3 * bit + (2 - axis))
+        return keys
+
+    def _build(self, source_pos, source_masses):
+        """Build the octree of the sources. Returns a dict of flat node arrays."""
+        lo = source_pos.min(axis=0)
+        hi = source_pos.max(axis=0)
+        width = float(np.max(hi - lo)) * (1.0 + 1e-9)
+        if width == 0.0:
+            width = 1.0
+        origin = (lo + hi) / 2.0 - width / 2.0
+
+        keys = self._morton_keys(source_pos, origin, width)
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        sorted_pos = source_pos[order]
+        sorted_mass = source_masses[order]
+        weighted_pos = sorted_pos * sorted_mass[:, np.newaxis]
+
+        level_nodes = []
+        parents = None
+        for level in range(self.MAX_DEPTH + 1):
+            shift = np.uint64(3 * (self.MAX_DEPTH - level))
+            cell_keys = keys >> shift
+            starts = np.flatnonzero(np.r_[True, cell_keys[1:] != cell_keys[:-1]])
+            node_keys = cell_keys[starts]
+            counts = np.diff(np.r_[starts, len(keys)])
+
+            mass = np.add.reduceat(sorted_mass, starts)
+            com = np.add.reduceat(weighted_pos, starts, axis=0)
+            geometric = np.add.reduceat(sorted_pos, starts, axis=0) / counts[:, np.newaxis]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                com = np.where(mass[:, np.newaxis] > 0, com / mass[:, np.newaxis], geometric)
+
+            if parents is not None:
+                # Only keep the children of cells that were split
+                keep = np.isin(node_keys >> np.uint64(3), parents)
+                starts, node_keys, counts = starts[keep], node_keys[keep], counts[keep]
+                mass, com = mass[keep], com[keep]
+
+            leaf = (counts <= self.leaf_size) | (level == self.MAX_DEPTH)
+            level_nodes.append({'key': node_keys, 'start': starts, 'count': counts,
+                                'mass': mass, 'com': com, 'leaf': leaf,
+                                'level': np.full(len(starts), level)})
+            parents = node_keys[~leaf]
+            if len(parents) == 0:
+                break
+
+        tree = {name: np.concatenate([nodes[name] for nodes in level_nodes])
+                for name in level_nodes[0]}
+
+        # Children of level L cells are a contiguous run of level L+1 cells
+        offsets = np.cumsum([0] + [len(nodes['key']) for nodes in level_nodes])
+        child_lo = np.zeros(offsets[-1], dtype=np.int64)
+        child_hi = np.zeros(offsets[-1], dtype=np.int64)
+        for level in range(len(level_nodes) - 1):
+            parent_keys = level_nodes[level]['key']
+            child_parent_keys = level_nodes[level + 1]['key'] >> np.uint64(3)
+            base = offsets[level + 1]
+            child_lo[offsets[level]:offsets[level + 1]] = base + np.searchsorted(child_parent_keys, parent_keys, 'left')
+            child_hi[offsets[level]:offsets[level + 1]] = base + np.searchsorted(child_parent_keys, parent_keys, 'right')
+        tree['child_lo'] = child_lo
+        tree['child_hi'] = child_hi
+        # A cell is far enough away when dist^2 > width^2 / theta^2
+        with np.errstate(divide='ignore'):
+            tree['open_dist_sq'] = (width / (2.0 ** tree['level'])) ** 2 / self.theta ** 2
+        tree['shift'] = (3 * (self.MAX_DEPTH - tree['level'])).astype(np.uint64)
+        tree['origin'] = origin
+        tree['root_width'] = width
+        tree['sorted_pos'] = sorted_pos
+        tree['sorted_mass'] = sorted_mass
+        return tree
+
+    @staticmethod
+    def _expand(pair_target, first, counts):
+        """Repeat each pair once per entry in [first, first + count)."""
+        pair_target = np.repeat(pair_target, counts)
+        group_start = np.repeat(np.cumsum(counts) - counts, counts)
+        index = np.repeat(first, counts) + (np.arange(len(pair_target)) - group_start)
+        return pair_target, index
+
+    #----------------------------- Solver Methods -----------------------------
+    def accelerations(self, target_pos, source_pos, source_masses, G, out=None):
+        """Get the approximate acceleration the sources apply to every target.
+
+        Method Arguments:
+        * target_pos: A (T, 3) numpy array of the positions being pulled in AU.
+        * source_pos: A (S, 3) numpy array of the positions applying gravity
+          in AU.
+        * source_masses: A (S,) numpy array of the source masses in Earth
+          masses.
+        * G: The gravitational constant in AU^3/(MEarth * month^2).
+        * out: An optional (T, 3) array to write the result into.
+
+        Output:
+        * A (T, 3) numpy array of accelerations in AU/month^2.
+        """
+        num_targets = target_pos.shape[0]
+        if out is None:
+            out = np.empty((num_targets, 3))
+        out[:] = 0.0
+        if num_targets == 0 or source_pos.shape[0] == 0:
+            return out
+
+        tree = self._build(source_pos, source_masses)
+        target_keys = self._morton_keys(target_pos, tree['origin'], tree['root_width'])
+
+        for batch_start in range(0, num_targets, self.batch_size):
+            batch = slice(batch_start, min(batch_start + self.batch_size, num_targets))
+            batch_pos = target_pos[batch]
+            batch_keys = target_keys[batch]
+            batch_acc = out[batch]
+            num_batch = batch_pos.shape[0]
+
+            # Every target starts at the root cell
+            pair_target = np.arange(num_batch)
+            pair_node = np.zeros(num_batch, dtype=np.int64)
+
+            while len(pair_target):
+                disp = tree['com'][pair_node] - batch_pos[pair_target]
+                dist_sq = np.einsum('ij,ij->i', disp, disp)
+                inside = (batch_keys[pair_target] >> tree['shift'][pair_node]) == tree['key'][pair_node]
+                far = ~inside & (dist_sq > tree['open_dist_sq'][pair_node])
+                leaf = tree['leaf'][pair_node] & ~far
+
+                # Well separated cells act as one body at their centre of mass
+                self._accumulate(batch_acc, pair_target[far], disp[far], dist_sq[far], tree['mass'][pair_node[far]], G)
+
+                # Nearby leaves are summed body by body
+                leaf_target, member = self._expand(pair_target[leaf], tree['start'][pair_node[leaf]], tree['count'][pair_node[leaf]])
+                leaf_disp = tree['sorted_pos'][member] - batch_pos[leaf_target]
+                self._accumulate(batch_acc, leaf_target, leaf_disp, np.einsum('ij,ij->i', leaf_disp, leaf_disp), tree['sorted_mass'][member], G)
+
+                # Everything else is opened into its children
+                opened = ~far & ~leaf
+                node = pair_node[opened]
+                pair_target, pair_node = self._expand(pair_target[opened], tree['child_lo'][node], tree['child_hi'][node] - tree['child_lo'][node])
+        return out
+
+    @staticmethod
+    def _accumulate(acc, pair_target, disp, dist_sq, mass, G):
+        """Add G * M * disp / r^3 of every pair onto its target's acceleration."""
+        if len(pair_target) == 0:
+            return
+        with np.errstate(divide='ignore'):
+            weight = np.where(dist_sq > 0, G * mass * dist_sq ** -1.5, 0.0)
+        for axis in range(3):
+            acc[:, axis] += np.bincount(pair_target, weights=weight * disp[:, axis], minlength=acc.shape[0])
+
+
+
+class TiledDirectSummation:
+    """Exact all-pairs force solver that works through the target/source pairs
+    in fixed size tiles spread across a pool of threads.
+
+    Each thread only ever holds tile_size x tile_size pairwise scratch
+    arrays, so peak memory is bounded by the tile size and the number of
+    threads instead of growing with N^2. NumPy releases the GIL inside its
+    array operations, so the tiles run in parallel on separate cores.
+    """
+
+    #--------------------------- Constructor Method ---------------------------
+    def __init__(self, tile_size=512, num_threads=None):
+        """Initialize the solver.
+
+        Method Arguments:
+        * tile_size: The number of targets and sources in one tile.
+        * num_threads: The number of worker threads. Defaults to the number of
+          CPUs.
+
+        Output:
+        * None
+        """
+        import os
+        import threading
+
+        if tile_size < 1:
+            raise ValueError("tile_size must be at least 1.")
+        self.tile_size = int(tile_size)
+        self.num_threads = int(num_threads) if num_threads else (os.cpu_count() or 1)
+        self._executor = None
+        self._local = threading.local()
+
+    def _tile_solver(self, num_targets, num_sources):
+        """Get this thread's DirectSummation for a tile shape. Edge tiles are
+        smaller, so each thread keeps one solver per tile shape it has seen."""
+        solvers = getattr(self._local, 'solvers', None)
+        if solvers is None:
+            solvers = self._local.solvers = {}
+        shape = (num_targets, num_sources)
+        if shape not in solvers:
+            solvers[shape] = (DirectSummation(), np.empty((num_targets, 3)))
+        return solvers[shape]
+
+    def _target_block(self, start, stop, target_pos, source_pos, source_masses, G, out):
+        """Sum the acceleration on targets [start, stop) one source tile at a
+        time."""
+        block_pos = target_pos[start:stop]
+        block_acc = out[start:stop]
+        block_acc[:] = 0.0
+        for source_start in range(0, source_pos.shape[0], self.tile_size):
+            source_stop = min(source_start + self.tile_size, source_pos.shape[0])
+            solver, partial = self._tile_solver(stop - start, source_stop - source_start)
+            solver.accelerations(block_pos, source_pos[source_start:source_stop],
+                                 source_masses[source_start:source_stop], G, out=partial)
+            block_acc += partial
+
+    #----------------------------- Solver Methods -----------------------------
+    def accelerations(self, target_pos, source_pos, source_masses, G, out=None):
+        """Get the acceleration every source body applies to every target.
+
+        Method Arguments:
+        * target_pos: A (T, 3) numpy array of the positions being pulled in AU.
+        * source_pos: A (S, 3) numpy array of the positions applying gravity
+          in AU.
+        * source_masses: A (S,) numpy array of the source masses in Earth
+          masses.
+        * G: The gravitational constant in AU^3/(MEarth * month^2).
+        * out: An optional (T, 3) array to write the result into.
+
+        Output:
+        * A (T, 3) numpy array of accelerations in AU/month^2.
+        """
+        num_targets = target_pos.shape[0]
+        if out is None:
+            out = np.empty((num_targets, 3))
+
+        blocks = [(start, min(start + self.tile_size, num_targets))
+                  for start in range(0, num_targets, self.tile_size)]
+        if len(blocks) <= 1 or self.num_threads == 1:
+            for start, stop in blocks:
+                self._target_block(start, stop, target_pos, source_pos, source_masses, G, out)
+            return out
+
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(max_workers=self.num_threads)
+        futures = [self._executor.submit(self._target_block, start, stop, target_pos,
+                                         source_pos, source_masses, G, out)
+                   for start, stop in blocks]
+        for future in futures:
+            future.result() # re-raises any error from the worker
+        return out
+
+    def close(self):
+        """Shut down the worker threads. The solver starts a new pool if it
+        is used again.
+
+        Method Arguments:
+        * None
+
+        Output:
+        * None
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+
+#==============================================================================
+#                                 Error Reporting
+#==============================================================================
+def force_error(approx_acc, exact_acc):
+    """Summarize the error of approximate accelerations against exact ones.
+
+    Method Arguments:
+    * approx_acc: A (T, 3) numpy array of approximate accelerations.
+    * exact_acc: A (T, 3) numpy array of exact accelerations.
+
+    Output:
+    * A dict of the 'median', 'rms' and 'max' relative error
+      |a_approx - a_exact| / |a_exact| over the targets.
+    """
+    error = np.linalg.norm(approx_acc - exact_acc, axis=1)
+    scale = np.linalg.norm(exact_acc, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        relative = np.where(scale > 0, error / scale, error)
+    return {'median': float(np.median(relative)),
+            'rms': float(np.sqrt(np.mean(relative ** 2))),
+            'max': float(np.max(relative))}
@@ -0,0 +1,694 @@
+# integrators.py
+import numpy as np
+import Forces
+import Kepler
+from Body import KM_PER_S_TO_AU_PER_MONTH, CONVERT_ACCEL_AU_MONTH2_TO_KM_S_MONTH
+
+#==============================================================================
+#                                RK4 Stepper Class
+#==============================================================================
+class RK4Stepper:
+    """Classical 4th order Runge-Kutta stepper for a Simulation's array state.
+
+    All stage derivatives (k1..k4) and intermediate states are preallocated
+    when the stepper is created and reused for every step, and the
+    simulation's position and velocity arrays are updated in place, so
+    stepping does not allocate any arrays once running.
+    """
+
+    name = "rk4"
+    force_evaluations_per_step = 4
+
+    #--------------------------- Constructor Method ---------------------------
+    def __init__(self, simulation):
+        """Initialize the stage buffers for a simulation.
+
+        Method Arguments:
+        * simulation: The Simulation whose positions (AU) and velocities (km/s)
+          will be advanced.
+
+        Output:
+        * None
+        """
+        self.simulation = simulation
+        shape = simulation._pos.shape
+
+        self.k_pos = [np.empty(shape) for _ in range(4)] # AU/month
+        self.k_vel = [np.empty(shape) for _ in range(4)] # km/(s*month)
+        self.stage_pos = np.empty(shape)                 # AU
+        self.stage_vel = np.empty(shape)                 # km/s
+
+    #----------------------------- Stepper Methods ----------------------------
+    def reset(self):
+        """RK4 keeps nothing between steps, so there is nothing to forget."""
+        pass
+
+    def _derivatives(self, pos, vel, k_pos, k_vel):
+        """Write the position and velocity derivatives of a state into
+        k_pos (AU/month) and k_vel (km/(s*month))."""
+        np.multiply(vel, KM_PER_S_TO_AU_PER_MONTH, out=k_pos)
+        self.simulation._accelerations(pos, out=k_vel)
+        np.multiply(k_vel, CONVERT_ACCEL_AU_MONTH2_TO_KM_S_MONTH, out=k_vel)
+
+    def _stage(self, pos, vel, k_pos, k_vel, h):
+        """Write the state y0 + k * h into the stage buffers."""
+        np.multiply(k_pos, h, out=self.stage_pos)
+        np.add(self.stage_pos, pos, out=self.stage_pos)
+        np.multiply(k_vel, h, out=self.stage_vel)
+        np.add(self.stage_vel, vel, out=self.stage_vel)
+
+    def step(self, dt):
+        """Advance the simulation state by one RK4 step in place.
+
+        Method Arguments:
+        * dt: The time step in months.
+
+        Output:
+        * None
+        """
+        pos = self.simulation._pos
+        vel = self.simulation._vel
+        k1_pos, k2_pos, k3_pos, k4_pos = self.k_pos
+        k1_vel, k2_vel, k3_vel, k4_vel = self.k_vel
+
+        self._derivatives(pos, vel, k1_pos, k1_vel)
+        self._stage(pos, vel, k1_pos, k1_vel, dt / 2.0)
+        self._derivatives(self.stage_pos, self.stage_vel, k2_pos, k2_vel)
+        self._stage(pos, vel, k2_pos, k2_vel, dt / 2.0)
+        self._derivatives(self.stage_pos, self.stage_vel, k3_pos, k3_vel)
+        self._stage(pos, vel, k3_pos, k3_vel, dt)
+        self._derivatives(self.stage_pos, self.stage_vel, k4_pos, k4_vel)
+
+        # y = y0 + (k1 + 2*k2 + 2*k3 + k4) / 6 * dt, reusing the stage buffers
+        for y, k1, k2, k3, k4, total in ((pos, k1_pos, k2_pos, k3_pos, k4_pos, self.stage_pos),
+                                         (vel, k1_vel, k2_vel, k3_vel, k4_vel, self.stage_vel)):
+            np.add(k2, k3, out=total)
+            np.multiply(total, 2.0, out=total)
+            np.add(total, k1, out=total)
+            np.add(total, k4, out=total)
+            np.multiply(total, dt / 6.0, out=total)
+            np.add(y, total, out=y)
+
+
+
+#==============================================================================
+#                            Symplectic Stepper Classes
+#==============================================================================
+class LeapfrogStepper:
+    """Kick-drift-kick leapfrog (velocity Verlet) stepper.
+
+    Second order and symplectic, so the energy error stays bounded instead of
+    drifting over long runs. The acceleration at the end of one step is the
+    one needed to start the next, so each step costs a single force
+    evaluation.
+    """
+
+    name = "leapfrog"
+    force_evaluations_per_step = 1
+
+    #--------------------------- Constructor Method ---------------------------
+    def __init__(self, simulation):
+        """Initialize the acceleration buffer for a simulation.
+
+        Method Arguments:
+        * simulation: The Simulation whose positions (AU) and velocities (km/s)
+          will be advanced.
+
+        Output:
+        * None
+        """
+        self.simulation = simulation
+        self.acc = np.empty(simulation._pos.shape)     # km/(s*month)
+        self.scratch = np.empty(simulation._pos.shape)
+        self._acc_valid = False
+
+    #----------------------------- Stepper Methods ----------------------------
+    def reset(self):
+        """Forget the cached acceleration. Call after changing the state."""
+        self._acc_valid = False
+
+    def _kick(self, vel, h):
+        """vel += acc * h"""
+        np.multiply(self.acc, h, out=self.scratch)
+        np.add(vel, self.scratch, out=vel)
+
+    def _drift(self, pos, vel, h):
+        """pos += vel * h, with vel converted from km/s to AU/month"""
+        np.multiply(vel, KM_PER_S_TO_AU_PER_MONTH * h, out=self.scratch)
+        np.add(pos, self.scratch, out=pos)
+
+    def _update_acc(self, pos):
+        """Evaluate the acceleration at pos in km/(s*month)."""
+        self.simulation._accelerations(pos, out=self.acc)
+        np.multiply(self.acc, CONVERT_ACCEL_AU_MONTH2_TO_KM_S_MONTH, out=self.acc)
+
+    def step(self, dt):
+        """Advance the simulation state by one leapfrog step in place.
+
+        Method Arguments:
+        * dt: The time step in months.
+
+        Output:
+        * None
+        """
+        pos = self.simulation._pos
+        vel = self.simulation._vel
+        if not self._acc_valid:
+            self._update_acc(pos)
+            self._acc_valid = True
+
+        self._kick(vel, dt / 2.0)
+        self._drift(pos, vel, dt)
+        self._update_acc(pos)
+        self._kick(vel, dt / 2.0)
+
+
+
+class Yoshida4Stepper(LeapfrogStepper):
+    """Fourth order symplectic stepper from Yoshida (1990).
+
+    Three drift-kick substeps with weights chosen so the second order errors
+    of leapfrog cancel. Costs three force evaluations per step.
+    """
+
+    name = "yoshida4"
+    force_evaluations_per_step = 3
+
+    _W1 = 1.0 / (2.0 - 2.0 ** (1.0 / 3.0))
+    _W0 = -(2.0 ** (1.0 / 3.0)) / (2.0 - 2.0 ** (1.0 / 3.0))
+    DRIFT_WEIGHTS = (_W1 / 2.0, (_W0 + _W1) / 2.0, (_W0 + _W1) / 2.0, _W1 / 2.0)
+    KICK_WEIGHTS = (_W1, _W0, _W1)
+
+    def step(self, dt):
+        """Advance the simulation state by one Yoshida step in place.
+
+        Method Arguments:
+        * dt: The time step in months.
+
+        Output:
+        * None
+        """
+        pos = self.simulation._pos
+        vel = self.simulation._vel
+        for i, kick_weight in enumerate(self.KICK_WEIGHTS):
+            self._drift(pos, vel, self.DRIFT_WEIGHTS[i] * dt)
+            self._update_acc(pos)
+            self._kick(vel, kick_weight * dt)
+        self._drift(pos, vel, self.DRIFT_WEIGHTS[-1] * dt)
+
+
+
+#==============================================================================
+#                             Adaptive Stepper Class
+#==============================================================================
+class DormandPrinceStepper:
+    """Adaptive Dormand-Prince 5(4) stepper with embedded error estimation.
+
+    step(dt) always advances the simulation by exactly dt (the recording
+    interval), but internally takes as many substeps as the tolerance needs:
+    the substep grows where the motion is smooth and shrinks during close
+    encounters. The error of each substep is estimated from the difference
+    between the embedded 5th and 4th order solutions and compared against
+
+        tolerance + tolerance * |y|
+
+    for every position (AU) and velocity (km/s) component. Substeps above
+    the tolerance are rejected and retried with a smaller step. A step raises
+    FloatingPointError, leaving the state where the step started, if the
+    error estimate is not finite (the state overflowed) or the substep has
+    to shrink below MIN_SUBSTEP_RATIO * dt to meet the tolerance.
+    """
+
+    name = "dopri5"
+    force_evaluations_per_step = None # varies with the tolerance
+
+    C = (0.0, 1.0 / 5.0, 3.0 / 10.0, 4.0 / 5.0, 8.0 / 9.0, 1.0, 1.0)
+    A = ((),
+         (1.0 / 5.0,),
+         (3.0 / 40.0, 9.0 / 40.0),
+         (44.0 / 45.0, -56.0 / 15.0, 32.0 / 9.0),
+         (19372.0 / 6561.0, -25360.0 / 2187.0, 64448.0 / 6561.0, -212.0 / 729.0),
+         (9017.0 / 3168.0, -355.0 / 33.0, 46732.0 / 5247.0, 49.0 / 176.0, -5103.0 / 18656.0),
+         (35.0 / 384.0, 0.0, 500.0 / 1113.0, 125.0 / 192.0, -2187.0 / 6784.0, 11.0 / 84.0))
+    # 5th order weights are the last row of A; E = 5th order - 4th order weights
+    E = (71.0 / 57600.0, 0.0, -71.0 / 16695.0, 71.0 / 1920.0, -17253.0 / 339200.0, 22.0 / 525.0, -1.0 / 40.0)
+
+    SAFETY = 0.9
+    MIN_FACTOR = 0.2
+    MAX_FACTOR = 5.0
+    MIN_SUBSTEP_RATIO = 1e-12 # Smallest substep as a fraction of dt
+
+    #--------------------------- Constructor Method ---------------------------
+    def __init__(self, simulation):
+        """Initialize the stage buffers for a simulation.
+
+        Method Arguments:
+        * simulation: The Simulation whose positions (AU) and velocities (km/s)
+          will be advanced. Its tolerance attribute sets the error target.
+
+        Output:
+        * None
+        """
+        self.simulation = simulation
+        shape = (2,) + simulation._pos.shape # [positions, velocities]
+
+        self.k = np.empty((7,) + shape)
+        self.y0 = np.empty(shape)
+        self.y_stage = np.empty(shape)
+        self.y_err = np.empty(shape)
+        self.scale = np.empty(shape)
+        self.scratch = np.empty(shape)
+
+        self.substep = None
+        self.time = 0.0 # Months advanced by this stepper
+        self.accepted_steps = 0
+        self.rejected_steps = 0
+        self.force_evaluations = 0
+        self._k1_valid = False
+
+    #----------------------------- Stepper Methods ----------------------------
+    def reset(self):
+        """Forget the cached first stage. Call after changing the state."""
+        self._k1_valid = False
+
+    def stats(self):
+        """Get the accepted/rejected substep and force evaluation counts."""
+        return {'accepted_steps': self.accepted_steps,
+                'rejected_steps': self.rejected_steps,
+                'force_evaluations': self.force_evaluations}
+
+    def _derivative(self, y, out):
+        """Write dy/dt of the state y into out."""
+        np.multiply(y[1], KM_PER_S_TO_AU_PER_MONTH, out=out[0])
+        self.simulation._accelerations(y[0], out=out[1])
+        np.multiply(out[1], CONVERT_ACCEL_AU_MONTH2_TO_KM_S_MONTH, out=out[1])
+        self.force_evaluations += 1
+
+    def _combine(self, weights, h, out):
+        """out = y0 + h * sum(weights[i] * k[i])"""
+        out[:] = self.y0
+        for i, weight in enumerate(weights):
+            if weight != 0.0:
+                np.multiply(self.k[i], weight * h, out=self.scratch)
+                np.add(out, self.scratch, out=out)
+
+    def _attempt(self, h):
+        """Try one substep of h months from y0. Leaves the 5th order result
+        in y_stage and returns the scaled error norm."""
+        for stage in range(1, 7):
+            self._combine(self.A[stage], h, self.y_stage)
+            self._derivative(self.y_stage, self.k[stage])
+
+        # Embedded error estimate
+        self.y_err[:] = 0.0
+        for i, weight in enumerate(self.E):
+            if weight != 0.0:
+                np.multiply(self.k[i], weight * h, out=self.scratch)
+                np.add(self.y_err, self.scratch, out=self.y_err)
+
+        tolerance = self.simulation.tolerance
+        np.abs(self.y0, out=self.scale)
+        np.abs(self.y_stage, out=self.scratch)
+        np.maximum(self.scale, self.scratch, out=self.scale)
+        np.multiply(self.scale, tolerance, out=self.scale)
+        np.add(self.scale, tolerance, out=self.scale)
+        np.divide(self.y_err, self.scale, out=self.y_err)
+        return float(np.sqrt(np.mean(self.y_err * self.y_err)))
+
+    def step(self, dt):
+        """Advance the simulation state by exactly dt months in place using
+        adaptive substeps.
+
+        Method Arguments:
+        * dt: The interval to advance in months.
+
+        Output:
+        * None
+        """
+        self.y0[0] = self.simulation._pos
+        self.y0[1] = self.simulation._vel
+        if not self._k1_valid:
+            self._derivative(self.y0, self.k[0])
+            self._k1_valid = True
+        if self.substep is None:
+            self.substep = dt
+
+        elapsed = 0.0
+        while elapsed < dt:
+            remaining = dt - elapsed
+            # Land exactly on the end of the interval without a sliver step
+            h = remaining if self.substep >= remaining * (1.0 - 1e-12) else self.substep
+
+            error = self._attempt(h)
+            if not np.isfinite(error):
+                self._k1_valid = False # k[0] may belong to an accepted substep
+                raise FloatingPointError(f"dopri5 error estimate is {error} at {self.time + elapsed:.6g} months "
+                                         f"(substep {h:.3g} months); the state has overflowed or two "
+                                         f"bodies are too close.")
+            if error == 0.0:
+                factor = self.MAX_FACTOR
+            else:
+                factor = min(self.MAX_FACTOR, max(self.MIN_FACTOR, self.SAFETY * error ** -0.2))
+
+            if error <= 1.0:
+                self.accepted_steps += 1
+                elapsed = dt if h == remaining else elapsed + h
+                self.y0[:] = self.y_stage
+                self.k[0][:] = self.k[6] # first same as last
+                # A step shortened to hit the interval end says nothing new
+                # about the step size the motion allows
+                if h == self.substep or factor < 1.0:
+                    self.substep = h * factor
+            else:
+                self.rejected_steps += 1
+                self.substep = h * min(1.0, factor)
+                if self.substep < dt * self.MIN_SUBSTEP_RATIO:
+                    self._k1_valid = False
+                    raise FloatingPointError(f"dopri5 substep fell to {self.substep:.3g} months at "
+                                             f"{self.time + elapsed:.6g} months without meeting the "
+                                             f"tolerance {self.simulation.tolerance:g}.")
+
+        self.simulation._pos[:] = self.y0[0]
+        self.simulation._vel[:] = self.y0[1]
+        self.time += dt
+
+
+
+#==============================================================================
+#                           Block Time Step Stepper Class
+#==============================================================================
+class HermiteBlockStepper:
+    """4th order Hermite predictor-corrector with individual block time steps.
+
+    Every body gets its own step h_i = dt / 2^level, chosen from its
+    acceleration and jerk with the Aarseth criterion, so fast inner bodies
+    (moons) take short steps while slow outer bodies take long ones. At each
+    block time only the bodies whose step ends there are "active": all
+    bodies are predicted to that time (cheap, O(N)), and only the active
+    bodies have their forces recomputed (O(N_active * N)) and corrected.
+
+    step(dt) advances every body by exactly dt; the levels carry over from
+    one call to the next. Times are tracked as integer ticks so the blocks
+    line up exactly.
+    """
+
+    name = "hermite_block"
+    force_evaluations_per_step = None # depends on the step levels
+
+    MAX_LEVEL = 30
+    START_ETA = 0.01 # accuracy of the first step estimate, |a| / |j|
+
+    #--------------------------- Constructor Method ---------------------------
+    def __init__(self, simulation):
+        """Initialize the per-body state for a simulation.
+
+        Method Arguments:
+        * simulation: The Simulation whose positions (AU) and velocities (km/s)
+          will be advanced. Its hermite_eta attribute is the accuracy
+          parameter of the step criterion.
+
+        Output:
+        * None
+        """
+        self.simulation = simulation
+        num_bodies = simulation._pos.shape[0]
+        self.levels = None
+        self.acc = np.zeros((num_bodies, 3))  # AU/month^2
+        self.jerk = np.zeros((num_bodies, 3)) # AU/month^3
+
+        self.block_steps = 0
+        self.body_steps = 0
+        self.pair_interactions = 0
+
+    #----------------------------- Stepper Methods ----------------------------
+    def reset(self):
+        """Forget the cached forces and levels. Call after changing the state."""
+        self.levels = None
+
+    def stats(self):
+        """Get the work counters and the current step level of every body."""
+        num_bodies = self.simulation._pos.shape[0]
+        return {'block_steps': self.block_steps,
+                'body_steps': self.body_steps,
+                'pair_interactions': self.pair_interactions,
+                'force_evaluations': self.pair_interactions / max(1, num_bodies * num_bodies),
+                'levels': None if self.levels is None else self.levels.tolist()}
+
+    def _forces(self, active, pos, vel):
+        """Compute the acceleration and jerk of the active bodies from every
+        body at the (predicted) positions and velocities."""
+        sim = self.simulation
+        acc, jerk = Forces.direct_acc_jerk(pos[active], vel[active], pos, vel,
+                                           sim.masses, sim.G)
+        self.pair_interactions += len(active) * pos.shape[0]
+        return acc, jerk
+
+    def _level_for(self, step_months, dt):
+        """Smallest level whose step dt / 2^level does not exceed step_months."""
+        with np.errstate(divide='ignore'):
+            level = np.ceil(np.log2(dt / step_months))
+        return np.clip(np.nan_to_num(level, nan=0, posinf=self.MAX_LEVEL, neginf=0),
+                       0, self.MAX_LEVEL).astype(np.int64)
+
+    def step(self, dt):
+        """Advance every body by exactly dt months in place.
+
+        Method Arguments:
+        * dt: The block interval in months.
+
+        Output:
+        * None
+        """
+        sim = self.simulation
+        eta = sim.hermite_eta
+        pos = sim._pos
+        vel = sim._vel * KM_PER_S_TO_AU_PER_MONTH # AU/month
+        num_bodies = pos.shape[0]
+        every_body = np.arange(num_bodies)
+
+        if self.levels is None:
+            self.acc, self.jerk = self._forces(every_body, pos, vel)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                first_step = self.START_ETA * np.linalg.norm(self.acc, axis=1) / np.linalg.norm(self.jerk, axis=1)
+            self.levels = self._level_for(first_step, dt)
+
+        end_tick = 1 << self.MAX_LEVEL
+        body_tick = np.zeros(num_bodies, dtype=np.int64)
+        tick_months = dt / end_tick
+
+        while True:
+            step_ticks = np.left_shift(1, self.MAX_LEVEL - self.levels)
+            next_tick = body_tick + step_ticks
+            block_tick = next_tick.min()
+            if block_tick > end_tick:
+                break
+            active = np.flatnonzero(next_tick == block_tick)
+
+            # Predict every body to the block time
+            tau = ((block_tick - body_tick) * tick_months)[:, np.newaxis]
+            pred_pos = pos + tau * (vel + tau * (self.acc / 2.0 + tau * self.jerk / 6.0))
+            pred_vel = vel + tau * (self.acc + tau * self.jerk / 2.0)
+
+            # Correct the active bodies with their new forces
+            new_acc, new_jerk = self._forces(active, pred_pos, pred_vel)
+            h = (step_ticks[active] * tick_months)[:, np.newaxis]
+            acc0 = self.acc[active]
+            jerk0 = self.jerk[active]
+            snap = (-6.0 * (acc0 - new_acc) - h * (4.0 * jerk0 + 2.0 * new_jerk)) / h ** 2
+            crackle = (12.0 * (acc0 - new_acc) + 6.0 * h * (jerk0 + new_jerk)) / h ** 3
+            pos[active] = pred_pos[active] + h ** 4 * (snap / 24.0 + h * crackle / 120.0)
+            vel[active] = pred_vel[active] + h ** 3 * (snap / 6.0 + h * crackle / 24.0)
+            self.acc[active] = new_acc
+            self.jerk[active] = new_jerk
+            body_tick[active] = block_tick
+
+            # Aarseth step criterion at the end of the step
+            snap_end = snap + h * crackle
+            a = np.linalg.norm(new_acc, axis=1)
+            j = np.linalg.norm(new_jerk, axis=1)
+            s = np.linalg.norm(snap_end, axis=1)
+            c = np.linalg.norm(crackle, axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                wanted = np.sqrt(eta * (a * s + j * j) / (j * c + s * s))
+            new_levels = self._level_for(wanted, dt)
+
+            # Grow by at most one level, and only onto a block boundary
+            old_levels = self.levels[active]
+            grow = new_levels < old_levels
+            new_levels[grow] = old_levels[grow] - 1
+            misaligned = (block_tick % np.left_shift(1, self.MAX_LEVEL - new_levels)) != 0
+            new_levels[misaligned & grow] = old_levels[misaligned & grow]
+            self.levels[active] = new_levels
+
+            self.block_steps += 1
+            self.body_steps += len(active)
+            if block_tick == end_tick and np.all(body_tick == end_tick):
+                break
+
+        sim._vel[:] = vel / KM_PER_S_TO_AU_PER_MONTH
+
+
+
+#==============================================================================
+#                            Wisdom-Holman Stepper Class
+#==============================================================================
+class WisdomHolmanStepper:
+    """Wisdom-Holman mixed variable symplectic stepper in democratic
+    heliocentric coordinates (Duncan, Levison & Lee 1998).
+
+    For systems dominated by one central mass (the most massive body) the
+    Keplerian motion around it is solved exactly, so the step only has to
+    resolve the much weaker planet-planet interactions. Each step is
+
+        kick(dt/2)  jump(dt/2)  Kepler drift(dt)  jump(dt/2)  kick(dt/2)
+
+    where the kicks apply the planet-planet accelerations to the barycentric
+    velocities, the jumps move the heliocentric positions by the total
+    planet momentum over the central mass, and the Kepler drift follows each
+    planet's two-body orbit around the central mass. The interaction
+    accelerations at the end of a step start the next one, so each step
+    costs one force evaluation among the planets.
+    """
+
+    name = "wisdom_holman"
+    force_evaluations_per_step = 1
+
+    #--------------------------- Constructor Method ---------------------------
+    def __init__(self, simulation):
+        """Initialize the stepper for a simulation.
+
+        Method Arguments:
+        * simulation: The Simulation whose positions (AU) and velocities (km/s)
+          will be advanced.
+
+        Output:
+        * None
+        """
+        self.simulation = simulation
+        self.central = int(np.argmax(simulation.masses))
+        self.planets = np.flatnonzero(np.arange(len(simulation.masses)) != self.central)
+        self.interaction_acc = None # AU/month^2
+
+    #----------------------------- Stepper Methods ----------------------------
+    def reset(self):
+        """Forget the cached interaction accelerations."""
+        self.interaction_acc = None
+
+    def _interactions(self, helio_pos):
+        """Planet-planet accelerations (AU/month^2) at heliocentric positions,
+        from the simulation's force solver. The central body is left out; its
+        pull is in the Kepler drift."""
+        sim = self.simulation
+        return sim._force_solver.accelerations(helio_pos, helio_pos, sim.masses[self.planets], sim.G)
+
+    def step(self, dt):
+        """Advance the simulation state by one Wisdom-Holman step in place.
+
+        Method Arguments:
+        * dt: The time step in months.
+
+        Output:
+        * None
+        """
+        sim = self.simulation
+        masses = sim.masses
+        pos = sim._pos
+        vel = sim._vel * KM_PER_S_TO_AU_PER_MONTH # AU/month
+        central_mass = masses[self.central]
+        planet_masses = masses[self.planets][:, np.newaxis]
+        total_mass = masses.sum()
+
+        # Democratic heliocentric coordinates: heliocentric positions and
+        # barycentric velocities
+        com_pos = (masses[:, np.newaxis] * pos).sum(axis=0) / total_mass
+        com_vel = (masses[:, np.newaxis] * vel).sum(axis=0) / total_mass
+        helio_pos = pos[self.planets] - pos[self.central]
+        bary_vel = vel[self.planets] - com_vel
+
+        if self.interaction_acc is None:
+            self.interaction_acc = self._interactions(helio_pos)
+
+        bary_vel += self.interaction_acc * (dt / 2.0)
+        helio_pos += (planet_masses * bary_vel).sum(axis=0) / central_mass * (dt / 2.0)
+        helio_pos, bary_vel = Kepler.kepler_drift(helio_pos, bary_vel,
+                                                  sim.G * central_mass, dt)
+        helio_pos += (planet_masses * bary_vel).sum(axis=0) / central_mass * (dt / 2.0)
+        self.interaction_acc = self._interactions(helio_pos)
+        bary_vel += self.interaction_acc * (dt / 2.0)
+
+        # Back to barycentric positions and velocities
+        com_pos = com_pos + com_vel * dt
+        central_pos = com_pos - (planet_masses * helio_pos).sum(axis=0) / total_mass
+        pos[self.central] = central_pos
+        pos[self.planets] = helio_pos + central_pos
+        vel[self.planets] = bary_vel + com_vel
+        vel[self.central] = com_vel - (planet_masses * bary_vel).sum(axis=0) / central_mass
+        sim._vel[:] = vel / KM_PER_S_TO_AU_PER_MONTH
+
+
+
+#==============================================================================
+#                               Kepler Stepper Class
+#==============================================================================
+class KeplerStepper:
+    """Exact propagation of an isolated two-body system.
+
+    Two bodies follow closed-form Keplerian orbits around their center of
+    mass, so each step solves Kepler's equation (universal variables) for
+    the relative orbit instead of integrating it. There is no truncation
+    error, any step size gives the same answer, and no forces are computed.
+    """
+
+    name = "kepler"
+    force_evaluations_per_step = 0
+
+    #--------------------------- Constructor Method ---------------------------
+    def __init__(self, simulation):
+        """Initialize the stepper for a simulation.
+
+        Method Arguments:
+        * simulation: The two-body Simulation whose positions (AU) and
+          velocities (km/s) will be advanced.
+
+        Output:
+        * None
+        """
+        if len(simulation.masses) != 2:
+            raise ValueError(f"The kepler integrator needs exactly 2 bodies, got {len(simulation.masses)}.")
+        self.simulation = simulation
+
+    #----------------------------- Stepper Methods ----------------------------
+    def reset(self):
+        """The orbit is recomputed from the current state every step, so there
+        is nothing to forget."""
+        pass
+
+    def step(self, dt):
+        """Advance the simulation state exactly by dt in place.
+
+        Method Arguments:
+        * dt: The time step in months.
+
+        Output:
+        * None
+        """
+        sim = self.simulation
+        pos, vel = Kepler.two_body_states(sim._pos, sim._vel * KM_PER_S_TO_AU_PER_MONTH,
+                                          sim.masses, sim.G, [dt])
+        sim._pos[:] = pos[0]
+        sim._vel[:] = vel[0] / KM_PER_S_TO_AU_PER_MONTH
+
+
+
+#==============================================================================
+#                                Stepper Registry
+#==============================================================================
+INTEGRATORS = {
+    RK4Stepper.name: RK4Stepper,
+    LeapfrogStepper.name: LeapfrogStepper,
+    Yoshida4Stepper.name: Yoshida4Stepper,
+    DormandPrinceStepper.name: DormandPrinceStepper,
+    HermiteBlockStepper.name: HermiteBlockStepper,
+    WisdomHolmanStepper.name: WisdomHolmanStepper,
+    KeplerStepper.name: KeplerStepper,
+}
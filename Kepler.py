@@ -0,0 +1,164 @@
+# kepler.py
+import numpy as np
+
+#==============================================================================
+#                                 Package Methods
+#==============================================================================
+
+#---------------------------- Stumpff Functions -------------------------------
+def stumpff_c_s(z):
+    """Get the Stumpff functions C(z) and S(z) used by the universal variable
+    form of Kepler's equation.
+
+    Method Arguments:
+    * z: A numpy array of alpha * chi^2 values.
+
+    Output:
+    * A tuple of numpy arrays (C(z), S(z)).
+
+    z > 0 is an elliptic orbit, z < 0 hyperbolic and z = 0 parabolic. A
+    series is used near zero where the closed forms lose precision.
+    """
+    z = np.asarray(z, dtype=float)
+    c = np.empty_like(z)
+    s = np.empty_like(z)
+
+    small = np.abs(z) < 1e-3
+    elliptic = (z > 0) & ~small
+    hyperbolic = (z < 0) & ~small
+
+    zs = z[small]
+    c[small] = 1.0 / 2.0 - zs * (1.0 / 24.0 - zs * (1.0 / 720.0 - zs / 40320.0))
+    s[small] = 1.0 / 6.0 - zs * (1.0 / 120.0 - zs * (1.0 / 5040.0 - zs / 362880.0))
+
+    root = np.sqrt(z[elliptic])
+    c[elliptic] = (1.0 - np.cos(root)) / z[elliptic]
+    s[elliptic] = (root - np.sin(root)) / root ** 3
+
+    root = np.sqrt(-z[hyperbolic])
+    c[hyperbolic] = (np.cosh(root) - 1.0) / -z[hyperbolic]
+    s[hyperbolic] = (np.sinh(root) - root) / root ** 3
+    return c, s
+
+
+
+#------------------------------- Kepler Drift ---------------------------------
+def kepler_drift(r0, v0, mu, dt, max_iterations=50):
+    """Propagate bodies along their two-body (Keplerian) orbits.
+
+    Method Arguments:
+    * r0: A (M, 3) numpy array of positions relative to the central mass in
+      AU.
+    * v0: A (M, 3) numpy array of velocities relative to the central mass in
+      AU/month.
+    * mu: G * (central mass + orbiting mass) in AU^3/month^2. A scalar or an
+      (M,) array.
+    * dt: The time to propagate in months. A scalar or an (M,) array. May be
+      negative.
+    * max_iterations: The iteration limit for solving Kepler's equation.
+
+    Output:
+    * A tuple of (M, 3) numpy arrays: the new positions (AU) and velocities
+      (AU/month).
+
+    Solves the universal variable form of Kepler's equation with the
+    Laguerre-Conway iteration, so elliptic, parabolic and hyperbolic orbits
+    are all handled by the same closed form f and g functions.
+    """
+    r0 = np.asarray(r0, dtype=float)
+    v0 = np.asarray(v0, dtype=float)
+    count = r0.shape[0]
+    mu = np.broadcast_to(np.asarray(mu, dtype=float), (count,))
+    dt = np.broadcast_to(np.asarray(dt, dtype=float), (count,)).copy()
+
+    r0_mag = np.linalg.norm(r0, axis=1)
+    v0_sq = np.einsum('ij,ij->i', v0, v0)
+    sqrt_mu = np.sqrt(mu)
+    sigma0 = np.einsum('ij,ij->i', r0, v0) / sqrt_mu
+    alpha = 2.0 / r0_mag - v0_sq / mu # 1 / semi-major axis
+
+    # Whole periods of an ellipse change nothing, so drop them
+    bound = alpha > 0
+    period = np.full(count, np.inf)
+    period[bound] = 2.0 * np.pi / np.sqrt(mu[bound] * alpha[bound] ** 3)
+    dt[bound] = np.fmod(dt[bound], period[bound])
+
+    # Starting guess (Danby)
+    chi = sqrt_mu * np.abs(alpha) * dt
+    unbound = ~bound
+    if np.any(unbound):
+        chi[unbound] = np.sign(dt[unbound]) * np.sqrt(np.abs(dt[unbound]) * sqrt_mu[unbound] / r0_mag[unbound]) \
+            + sqrt_mu[unbound] * dt[unbound] / r0_mag[unbound]
+
+    # Laguerre-Conway iteration on F(chi) = 0
+    n = 5.0
+    for _ in range(max_iterations):
+        z = alpha * chi * chi
+        c, s = stumpff_c_s(z)
+        chi_sq = chi * chi
+        f_val = sigma0 * chi_sq * c + (1.0 - alpha * r0_mag) * chi_sq * chi * s + r0_mag * chi - sqrt_mu * dt
+        f_prime = sigma0 * chi * (1.0 - z * s) + (1.0 - alpha * r0_mag) * chi_sq * c + r0_mag
+        f_second = sigma0 * (1.0 - z * c) + (1.0 - alpha * r0_mag) * chi * (1.0 - z * s)
+        root = np.sqrt(np.abs((n - 1.0) ** 2 * f_prime ** 2 - n * (n - 1.0) * f_val * f_second))
+        delta = n * f_val / (f_prime + np.sign(f_prime) * root)
+        chi = chi - delta
+        if np.all(np.abs(delta) <= 1e-15 * np.maximum(1.0, np.abs(chi))):
+            break
+
+    z = alpha * chi * chi
+    c, s = stumpff_c_s(z)
+    chi_sq = chi * chi
+    r_mag = sigma0 * chi * (1.0 - z * s) + (1.0 - alpha * r0_mag) * chi_sq * c + r0_mag
+
+    # Lagrange f and g coefficients
+    f = 1.0 - chi_sq * c / r0_mag
+    g = dt - chi_sq * chi * s / sqrt_mu
+    f_dot = sqrt_mu * chi * (z * s - 1.0) / (r_mag * r0_mag)
+    g_dot = 1.0 - chi_sq * c / r_mag
+
+    r = f[:, np.newaxis] * r0 + g[:, np.newaxis] * v0
+    v = f_dot[:, np.newaxis] * r0 + g_dot[:, np.newaxis] * v0
+    return r, v
+
+
+
+#------------------------------ Two Body States -------------------------------
+def two_body_states(pos, vel, masses, G, times):
+    """Get the exact states of an isolated two-body system at many times.
+
+    Method Arguments:
+    * pos: A (2, 3) numpy array of positions in AU.
+    * vel: A (2, 3) numpy array of velocities in AU/month.
+    * masses: A length 2 array of masses in Earth masses.
+    * G: The gravitational constant in AU^3/(MEarth * month^2).
+    * times: A 1D array of times in months, measured from the given state.
+
+    Output:
+    * A tuple of (T, 2, 3) numpy arrays: the positions (AU) and velocities
+      (AU/month) at each of the T requested times.
+
+    The relative orbit is propagated from the starting state to every time in
+    one vectorized Kepler solve, so no error builds up between times. The
+    center of mass moves in a straight line.
+    """
+    pos = np.asarray(pos, dtype=float)
+    vel = np.asarray(vel, dtype=float)
+    masses = np.asarray(masses, dtype=float)
+    times = np.asarray(times, dtype=float).reshape(-1)
+    total_mass = masses.sum()
+    count = times.shape[0]
+
+    com_pos = (masses[:, np.newaxis] * pos).sum(axis=0) / total_mass
+    com_vel = (masses[:, np.newaxis] * vel).sum(axis=0) / total_mass
+    rel_pos, rel_vel = kepler_drift(np.broadcast_to(pos[1] - pos[0], (count, 3)),
+                                    np.broadcast_to(vel[1] - vel[0], (count, 3)),
+                                    G * total_mass, times)
+
+    com_pos = com_pos + times[:, np.newaxis] * com_vel
+    positions = np.empty((count, 2, 3))
+    velocities = np.empty((count, 2, 3))
+    positions[:, 0] = com_pos - masses[1] / total_mass * rel_pos
+    positions[:, 1] = com_pos + masses[0] / total_mass * rel_pos
+    velocities[:, 0] = com_vel - masses[1] / total_mass * rel_vel
+    velocities[:, 1] = com_vel + masses[0] / total_mass * rel_vel
+    return positions, velocities
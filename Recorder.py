@@ -0,0 +1,376 @@
+# recorder.py
+import numpy as np
+from Body import KM_PER_S_TO_AU_PER_MONTH
+
+#==============================================================================
+#                                 Recorder Class
+#==============================================================================
+class Recorder:
+    """Preallocated in-memory record of a simulation run.
+
+    The positions and velocities of every recorded step go into one
+    (n_records, N, 6) float array that is allocated when the run starts:
+    columns 0-2 hold the position in AU and columns 3-5 the velocity in km/s.
+    Body names and masses are stored once for the whole run. Either every
+    record_every-th step (plus the final step) or only the final step is
+    recorded, which bounds both the memory and the time spent recording.
+
+    Given a capacity, the array only holds that many records. Once records
+    have been dumped, release() hands their rows back for the records that
+    follow, so memory no longer grows with the length of the run.
+    """
+
+    #--------------------------- Constructor Method ---------------------------
+    def __init__(self, names, masses, num_steps, dt_months, record_every=1, final_only=False, previous=None,
+                 capacity=None):
+        """Allocate the record array for a run.
+
+        Method Arguments:
+        * names: A list of the N body names.
+        * masses: A length N array of masses in Earth masses.
+        * num_steps: The number of integrator steps in the run. Step 0 is the
+          starting state and step num_steps the final state.
+        * dt_months: The time step in months, used to convert steps to times.
+        * record_every: Record every this many steps. The final step is
+          always recorded.
+        * final_only: Record only the final step.
+        * previous: An optional tuple (steps, positions, velocities) of records
+          already made by the run being continued. They become the first
+          records, and only the scheduled steps after the last of them are
+          recorded. steps may be None if the records are the first ones of
+          this schedule. positions and velocities may be None when the
+          earlier records are on disk and are not to be held again.
+        * capacity: The most records held at once. Defaults to every record
+          of the run.
+
+        Output:
+        * None
+        """
+        if int(record_every) < 1:
+            raise ValueError("record_every must be at least 1.")
+        self.names = list(names)
+        self.masses = np.array(masses, dtype=float)
+        self.num_steps = int(num_steps)
+        self.dt_months = float(dt_months)
+        self.record_every = int(record_every)
+        self.final_only = bool(final_only)
+
+        self.record_steps = self.schedule(self.num_steps, self.record_every, self.final_only)
+        self.count = 0
+        self.offset = 0 # Records before this one have been released
+
+        if previous is not None and len(previous[0] if previous[1] is None else previous[1]):
+            previous_steps, positions, velocities = previous
+            if previous_steps is None:
+                previous_steps = self.record_steps[:len(positions)]
+            later = self.record_steps[self.record_steps > previous_steps[-1]]
+            self.record_steps = np.concatenate([np.asarray(previous_steps, dtype=self.record_steps.dtype), later])
+            self.count = len(previous_steps)
+            if positions is None:
+                self.offset = self.count
+
+        num_rows = len(self.record_steps) - self.offset
+        if capacity is not None:
+            num_rows = max(1, min(num_rows, int(capacity)))
+        self.data = np.empty((num_rows, len(self.names), 6))
+        if self.offset < self.count:
+            self.data[:self.count, :, :3] = previous[1]
+            self.data[:self.count, :, 3:] = previous[2]
+
+    @staticmethod
+    def schedule(num_steps, record_every=1, final_only=False):
+        """Get the steps a run records.
+
+        Method Arguments:
+        * num_steps: The number of integrator steps in the run.
+        * record_every: Record every this many steps.
+        * final_only: Record only the final step.
+
+        Output:
+        * A numpy array of step numbers, always ending with num_steps.
+        """
+        if final_only:
+            return np.array([int(num_steps)])
+        record_steps = np.arange(0, int(num_steps) + 1, int(record_every))
+        if record_steps[-1] != num_steps:
+            record_steps = np.append(record_steps, int(num_steps))
+        return record_steps
+
+    #---------------------------- Recording Methods ---------------------------
+    def wants(self, step):
+        """Check if a step is one that gets recorded.
+
+        Method Arguments:
+        * step: The step number, 0 being the starting state.
+
+        Output:
+        * True if record() should be called for this step.
+        """
+        return self.count < len(self.record_steps) and self.record_steps[self.count] == step
+
+    def record(self, positions, velocities):
+        """Copy the state into the next free record.
+
+        Method Arguments:
+        * positions: An (N, 3) array of positions in AU.
+        * velocities: An (N, 3) array of velocities in km/s.
+
+        Output:
+        * None
+        """
+        row = self.count - self.offset
+        self.data[row, :, :3] = positions
+        self.data[row, :, 3:] = velocities
+        self.count += 1
+
+    def release(self):
+        """Drop the records held so far, once they have been dumped, and
+        reuse their rows for the records that follow.
+
+        Method Arguments:
+        * None
+
+        Output:
+        * None
+        """
+        self.offset = self.count
+
+    #----------------------------- Getter Methods -----------------------------
+    @property
+    def positions(self):
+        """(records held, N, 3) view of the recorded positions in AU."""
+        return self.data[:self.count - self.offset, :, :3]
+
+    @property
+    def velocities(self):
+        """(records held, N, 3) view of the recorded velocities in km/s."""
+        return self.data[:self.count - self.offset, :, 3:]
+
+    @property
+    def steps(self):
+        """Step number of every record held."""
+        return self.record_steps[self.offset:self.count]
+
+    @property
+    def times(self):
+        """Simulated time in months of every record held."""
+        return self.record_steps[self.offset:self.count] * self.dt_months
+
+    @property
+    def full(self):
+        """True when every row is in use, so the records must be dumped and
+        released before the next one."""
+        return self.count - self.offset == len(self.data)
+
+    @property
+    def nbytes(self):
+        """Size of the preallocated record array in bytes."""
+        return self.data.nbytes
+
+
+
+#==============================================================================
+#                               Dense Output Class
+#==============================================================================
+class DenseOutput:
+    """Continuous record of a run that can be evaluated at any time.
+
+    Every every-th step (plus the final step) is kept as a knot holding the
+    position, velocity and acceleration of each body in one (n_knots, N, 9)
+    float array. Between two knots the orbit is the quintic Hermite
+    polynomial matching all three at both ends, which is 6th order accurate
+    in the knot spacing. With a spacing a few times the time step this error
+    stays below the integrator's own, so a run can keep a handful of knots
+    per orbit instead of a record per step and still be sampled at any time.
+    """
+
+    #--------------------------- Constructor Method ---------------------------
+    def __init__(self, names, num_steps, dt_months, every, previous=None):
+        """Allocate the knot array for a run.
+
+        Method Arguments:
+        * names: A list of the N body names.
+        * num_steps: The number of integrator steps in the run.
+        * dt_months: The time step in months, used to convert steps to times.
+        * every: Keep a knot every this many steps. The first and final
+          steps are always knots.
+        * previous: An optional DenseOutput of the earlier part of a run
+          that is being continued. Its knots are kept and the new knots
+          follow its last one.
+
+        Output:
+        * None
+        """
+        if int(every) < 1:
+            raise ValueError("every must be at least 1.")
+        self.names = list(names)
+        self.num_steps = int(num_steps)
+        self.dt_months = float(dt_months)
+        self.every = int(every)
+        self.knot_steps = np.arange(0, self.num_steps + 1, self.every)
+        if self.knot_steps[-1] != self.num_steps:
+            self.knot_steps = np.append(self.knot_steps, self.num_steps)
+        self.count = 0
+        if previous is not None and previous.count:
+            kept_steps = previous.knot_steps[:previous.count]
+            self.knot_steps = np.concatenate([kept_steps, self.knot_steps[self.knot_steps > kept_steps[-1]]])
+            self.count = previous.count
+        self.data = np.empty((len(self.knot_steps), len(self.names), 9))
+        if self.count:
+            self.data[:self.count] = previous.data[:self.count]
+
+    #---------------------------- Recording Methods ---------------------------
+    def wants(self, step):
+        """Check if a step is one that becomes a knot.
+
+        Method Arguments:
+        * step: The step number, 0 being the starting state.
+
+        Output:
+        * True if add() should be called for this step.
+        """
+        return self.count < len(self.knot_steps) and self.knot_steps[self.count] == step
+
+    def add(self, positions, velocities, accelerations):
+        """Copy the state into the next knot.
+
+        Method Arguments:
+        * positions: An (N, 3) array of positions in AU.
+        * velocities: An (N, 3) array of velocities in km/s.
+        * accelerations: An (N, 3) array of accelerations in AU/month^2.
+
+        Output:
+        * None
+        """
+        self.data[self.count, :, :3] = positions
+        self.data[self.count, :, 3:6] = velocities
+        self.data[self.count, :, 6:] = accelerations
+        self.count += 1
+
+    #--------------------------- Evaluation Methods ---------------------------
+    def evaluate(self, times):
+        """Get the state of every body at any times covered by the knots.
+
+        Method Arguments:
+        * times: A scalar or 1D array of times in months since step 0.
+
+        Output:
+        * A tuple of (T, N, 3) numpy arrays: the positions (AU) and velocities
+          (km/s) at each of the T times.
+
+        All times are evaluated together: each is matched to its pair of
+        knots with one searchsorted and the polynomials are summed as
+        broadcast array expressions.
+        """
+        times = np.asarray(times, dtype=float).reshape(-1)
+        knot_times = self.times
+        if self.count < 2:
+            raise ValueError("Dense output needs at least two knots.")
+        if np.any(times < knot_times[0]) or np.any(times > knot_times[-1]):
+            raise ValueError(f"times must lie between {knot_times[0]} and {knot_times[-1]} months.")
+        left = np.clip(np.searchsorted(knot_times, times, side='right') - 1, 0, self.count - 2)
+        return self._hermite(left, left + 1, times)
+
+    def error_estimate(self):
+        """Estimate the largest position error of the interpolation in AU.
+
+        Output:
+        * A float, or 0.0 when there are fewer than three knots.
+
+        Every inner knot is predicted from its two neighbours, which is the
+        same interpolation with twice the knot spacing. Its error shrinks
+        with the 6th power of the spacing, so the miss divided by 2^6 is the
+        error between the actual knots.
+        """
+        if self.count < 3:
+            return 0.0
+        middle = np.arange(1, self.count - 1)
+        positions, _ = self._hermite(middle - 1, middle + 1, self.times[middle])
+        return float(np.abs(positions - self.data[middle, :, :3]).max() / 2 ** 6)
+
+    def _hermite(self, left, right, times):
+        """Evaluate the quintic Hermite polynomials between knots left and
+        right (index arrays) at the matching times in months."""
+        knot_times = self.times
+        span = (knot_times[right] - knot_times[left])[:, np.newaxis, np.newaxis]
+        s = ((times - knot_times[left]) / (knot_times[right] - knot_times[left]))[:, np.newaxis, np.newaxis]
+        start = self.data[left]
+        end = self.data[right]
+        s2 = s * s
+        s3 = s2 * s
+        s4 = s3 * s
+        s5 = s4 * s
+
+        # Basis polynomials for p0, v0, a0, a1, v1, p1 and their derivatives
+        h_p0 = 1.0 - 10.0 * s3 + 15.0 * s4 - 6.0 * s5
+        h_v0 = s - 6.0 * s3 + 8.0 * s4 - 3.0 * s5
+        h_a0 = 0.5 * s2 - 1.5 * s3 + 1.5 * s4 - 0.5 * s5
+        h_a1 = 0.5 * s3 - s4 + 0.5 * s5
+        h_v1 = -4.0 * s3 + 7.0 * s4 - 3.0 * s5
+        d_p0 = -30.0 * s2 + 60.0 * s3 - 30.0 * s4
+        d_v0 = 1.0 - 18.0 * s2 + 32.0 * s3 - 15.0 * s4
+        d_a0 = s - 4.5 * s2 + 6.0 * s3 - 2.5 * s4
+        d_a1 = 1.5 * s2 - 4.0 * s3 + 2.5 * s4
+        d_v1 = -12.0 * s2 + 28.0 * s3 - 15.0 * s4
+
+        # Work in AU and months so the derivatives are consistent
+        p0, p1 = start[..., :3], end[..., :3]
+        v0 = start[..., 3:6] * KM_PER_S_TO_AU_PER_MONTH * span
+        v1 = end[..., 3:6] * KM_PER_S_TO_AU_PER_MONTH * span
+        a0 = start[..., 6:] * span * span
+        a1 = end[..., 6:] * span * span
+        positions = h_p0 * p0 + h_v0 * v0 + h_a0 * a0 + h_a1 * a1 + h_v1 * v1 + (1.0 - h_p0) * p1
+        velocities = (d_p0 * (p0 - p1) + d_v0 * v0 + d_a0 * a0 + d_a1 * a1 + d_v1 * v1) / span
+        return positions, velocities / KM_PER_S_TO_AU_PER_MONTH
+
+    #----------------------------- Getter Methods -----------------------------
+    @property
+    def times(self):
+        """Simulated time in months of every knot so far."""
+        return self.knot_steps[:self.count] * self.dt_months
+
+    @property
+    def nbytes(self):
+        """Size of the preallocated knot array in bytes."""
+        return self.data.nbytes
+
+
+
+#==============================================================================
+#                              State Snapshot Class
+#==============================================================================
+class StateSnapshot:
+    """Read-only copy of a simulation's state at one step, as yielded by
+    Simulation.iter_states. The arrays can be kept or passed on freely; the
+    simulation never changes them."""
+    __slots__ = ("step", "time_months", "positions", "velocities", "tp_positions", "tp_velocities")
+
+    def __init__(self, step, time_months, positions, velocities, tp_positions, tp_velocities):
+        """Copy a state.
+
+        Method Arguments:
+        * step: The step number, 0 being the state the iteration started at.
+        * time_months: The simulated time since that state in months.
+        * positions: An (N, 3) array of positions in AU.
+        * velocities: An (N, 3) array of velocities in km/s.
+        * tp_positions: An (N_test, 3) array of test particle positions in AU.
+        * tp_velocities: An (N_test, 3) array of test particle velocities in
+          km/s.
+
+        Output:
+        * None
+        """
+        self.step = int(step)
+        self.time_months = float(time_months)
+        self.positions = _read_only(positions)
+        self.velocities = _read_only(velocities)
+        self.tp_positions = _read_only(tp_positions)
+        self.tp_velocities = _read_only(tp_velocities)
+
+
+
+def _read_only(array):
+    """Copy an array and lock the copy against writes."""
+    copy = np.array(array, dtype=float)
+    copy.setflags(write=False)
+    return copy
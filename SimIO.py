@@ -1,5 +1,13 @@
 DEFAULT_DUMP_PATH = "dumps"
-MIN_DUMP_TIME = 600.0 # in seconds
+DUMP_BYTES_BUDGET = 4 * 2**20  # Flush once this many bytes of records are waiting
+DUMP_QUEUE_SIZE = 4            # Chunks that may wait for the writer before the run blocks
+DUMP_FORMATS = ("columnar", "compressed", "pickle")
+DEFAULT_DUMP_FORMAT = "columnar"
+METADATA_FILE = "meta.json"
+MANIFEST_FILE = "manifest.json"
+HISTORY_CACHE_BYTES = 64 * 2**20  # Decoded chunks a HistoryView keeps in memory
+CHECKPOINT_FILE = "checkpoint.npz"
+DENSE_OUTPUT_FILE = "dense.npz"
 
 #==============================================================================
 #                                 Package Methods
@@ -93,6 +101,637 @@ def dump_history_pickle(system_hist, sim_name, inital_time, final_time):
 
 
 
+def dump_records_pickle(sim_name, names, masses, positions, velocities, inital_time, final_time):
+    """Dump recorded state arrays in the pickle format.
+
+    Method Arguments:
+    * sim_name: The name of the simulation.
+    * names: A list of the N body names.
+    * masses: A length N array of masses.
+    * positions: A (records, N, 3) array of positions in AU.
+    * velocities: A (records, N, 3) array of velocities in km/s.
+    * inital_time: The record index of the first record.
+    * final_time: The record index of the last record.
+
+    Output:
+    * None
+
+    The arrays are turned into lists of Planetary_Body objects here, so when
+    this runs on the background writer the integration loop never builds
+    them.
+    """
+    from Body import arrays_to_bodies
+
+    system_hist = [arrays_to_bodies(masses, positions[r], velocities[r], names)
+                   for r in range(len(positions))]
+    dump_history_pickle(system_hist, sim_name, inital_time, final_time)
+
+
+
+#--------------------------- Columnar Write Methods ---------------------------
+def clear_dump(sim_name):
+    """Remove the records an earlier run of the same name dumped, in any
+    format.
+
+    Method Arguments:
+    * sim_name: The name of the simulation.
+
+    Output:
+    * None
+
+    Deletes the pickle chunks and the columnar chunks, metadata and manifest,
+    so the readers can not mistake them for the new run's records. The
+    checkpoint and dense output files are left alone.
+    """
+    import os
+
+    folder = os.path.join(DEFAULT_DUMP_PATH, sim_name)
+    if not os.path.isdir(folder):
+        return
+    for file_name in os.listdir(folder):
+        if file_name.endswith((".pkl", ".npy", ".z")) or file_name in (METADATA_FILE, MANIFEST_FILE):
+            os.remove(os.path.join(folder, file_name))
+
+
+
+def start_columnar_dump(sim_name, names, masses, dt_months, extra_metadata=None, codec=None):
+    """Prepare a simulation's dump folder for columnar chunks and write its
+    metadata file.
+
+    Method Arguments:
+    * sim_name: The name of the simulation.
+    * names: A list of the N body names.
+    * masses: A length N array of masses in Earth masses.
+    * dt_months: The time step in months. A record's time is its step
+      number times dt_months.
+    * extra_metadata: An optional dict of more JSON values to store.
+    * codec: An optional TrajectoryCodec. When given, the chunks are written
+      compressed and its settings are stored in the metadata.
+
+    Output:
+    * None
+
+    Names and masses are stored once in the metadata file instead of with
+    every record. An empty chunk manifest is started next to it. Chunks left
+    by an earlier run of the same name are removed (see clear_dump) so they
+    can not mix with the new ones.
+    """
+    import json
+    import os
+
+    folder = os.path.join(DEFAULT_DUMP_PATH, sim_name)
+    clear_dump(sim_name)
+    os.makedirs(folder, exist_ok=True)
+
+    metadata = {'format': "columnar" if codec is None else "compressed",
+                'names': list(names),
+                'masses': [float(mass) for mass in masses],
+                'dt_months': float(dt_months)}
+    if codec is not None:
+        metadata['codec'] = codec.settings()
+    metadata.update(extra_metadata or {})
+    with open(os.path.join(folder, METADATA_FILE), 'w') as file:
+        json.dump(metadata, file, indent=1)
+    _write_manifest(sim_name, {'chunks': []})
+
+
+
+def dump_records_columnar(sim_name, first_record, steps, positions, velocities, codec=None):
+    """Write one chunk of records as binary numpy (.npy) blocks.
+
+    Method Arguments:
+    * sim_name: The name of the simulation.
+    * first_record: The record index of the first record in the chunk.
+    * steps: A length R array of the step number of every record.
+    * positions: An (R, N, 3) array of positions in AU.
+    * velocities: An (R, N, 3) array of velocities in km/s.
+    * codec: An optional TrajectoryCodec to compress the positions and
+      velocities with.
+
+    Output:
+    * None
+
+    Writes pos_<first_record>.npy, vel_<first_record>.npy and
+    step_<first_record>.npy, which MappedHistory memory-maps back, and adds
+    the chunk to the manifest with its record, step and time ranges and the
+    byte offset of the data in each file. With a codec the positions and
+    velocities go to pos_<first_record>.z and vel_<first_record>.z instead,
+    and the manifest lists their encoded sizes.
+    """
+    import os
+    import numpy as np
+
+    folder = os.path.join(DEFAULT_DUMP_PATH, sim_name)
+    arrays = {'pos': np.ascontiguousarray(positions, dtype=float),
+              'vel': np.ascontiguousarray(velocities, dtype=float),
+              'step': np.asarray(steps, dtype=np.int64)}
+    files = {}
+    offsets = {}
+    encoded_bytes = {}
+    for prefix, array in arrays.items():
+        if codec is not None and prefix != 'step':
+            tolerance = codec.tolerance_au if prefix == 'pos' else codec.tolerance_km_s
+            encoded = codec.encode(array, tolerance)
+            files[prefix] = f"{prefix}_{first_record}.z"
+            with open(os.path.join(folder, files[prefix]), 'wb') as file:
+                file.write(encoded)
+            encoded_bytes[prefix] = len(encoded)
+            continue
+        files[prefix] = f"{prefix}_{first_record}.npy"
+        np.save(os.path.join(folder, files[prefix]), array)
+        offsets[prefix] = int(np.load(os.path.join(folder, files[prefix]), mmap_mode='r').offset)
+
+    dt_months = read_metadata(sim_name)['dt_months']
+    manifest = read_manifest(sim_name)
+    manifest['chunks'].append({'first_record': int(first_record),
+                               'num_records': int(len(arrays['step'])),
+                               'first_step': int(arrays['step'][0]),
+                               'last_step': int(arrays['step'][-1]),
+                               'start_months': float(arrays['step'][0] * dt_months),
+                               'end_months': float(arrays['step'][-1] * dt_months),
+                               'files': files,
+                               'offsets': offsets})
+    if encoded_bytes:
+        manifest['chunks'][-1]['encoded_bytes'] = encoded_bytes
+    _write_manifest(sim_name, manifest)
+
+
+
+def _write_manifest(sim_name, manifest):
+    """Replace a simulation's manifest file in one step, so a reader never
+    sees a half written manifest."""
+    import json
+    import os
+
+    path = os.path.join(DEFAULT_DUMP_PATH, sim_name, MANIFEST_FILE)
+    with open(path + ".tmp", 'w') as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+
+#---------------------------- Columnar Read Methods ---------------------------
+def read_metadata(sim_name):
+    """Read the metadata file of a columnar dump.
+
+    Method Arguments:
+    * sim_name: The name of the simulation.
+
+    Output:
+    * A dict with the 'names', 'masses', 'dt_months' and run settings.
+    """
+    import json
+    import os
+
+    with open(os.path.join(DEFAULT_DUMP_PATH, sim_name, METADATA_FILE)) as file:
+        return json.load(file)
+
+
+
+def update_metadata(sim_name, values):
+    """Change or add values in the metadata file of a columnar dump.
+
+    Method Arguments:
+    * sim_name: The name of the simulation.
+    * values: A dict of JSON values to store.
+
+    Output:
+    * None
+    """
+    import json
+    import os
+
+    metadata = read_metadata(sim_name)
+    metadata.update(values)
+    with open(os.path.join(DEFAULT_DUMP_PATH, sim_name, METADATA_FILE), 'w') as file:
+        json.dump(metadata, file, indent=1)
+
+
+
+def read_manifest(sim_name):
+    """Read the chunk manifest of a columnar dump.
+
+    Method Arguments:
+    * sim_name: The name of the simulation.
+
+    Output:
+    * A dict whose 'chunks' list describes every chunk in record order: its
+      'first_record', 'num_records', 'first_step', 'last_step',
+      'start_months', 'end_months', 'files' and data byte 'offsets'.
+    """
+    import json
+    import os
+
+    with open(os.path.join(DEFAULT_DUMP_PATH, sim_name, MANIFEST_FILE)) as file:
+        return json.load(file)
+
+
+
+def load_range(sim_name, t0, t1, bodies=None, codec=None):
+    """Read the records of a columnar dump between two simulated times.
+
+    Method Arguments:
+    * sim_name: The name of the simulation.
+    * t0: The start of the range in years (inclusive).
+    * t1: The end of the range in years (inclusive).
+    * bodies: An optional list of body names or indices to read. Defaults to
+      every body.
+    * codec: An optional TrajectoryCodec that decodes compressed chunks and
+      counts their decode time, see read_chunk.
+
+    Output:
+    * A tuple (times, positions, velocities): a length R array of record
+      times in years, and (R, B, 3) arrays of positions (AU) and velocities
+      (km/s) for the B selected bodies.
+
+    Only the chunks whose time range overlaps [t0, t1] are opened, and they
+    are memory-mapped at the byte offsets in the manifest, so reading the
+    last century of a long run does not touch the rest of it. Compressed
+    chunks are decoded whole.
+    """
+    import os
+    import numpy as np
+
+    metadata = read_metadata(sim_name)
+    names = metadata['names']
+    num_bodies = len(names)
+    if bodies is None:
+        columns = np.arange(num_bodies)
+    else:
+        columns = np.array([names.index(body) if isinstance(body, str) else int(body) for body in bodies],
+                           dtype=int)
+
+    folder = os.path.join(DEFAULT_DUMP_PATH, sim_name)
+    t0_months, t1_months = t0 * 12.0, t1 * 12.0
+    times, positions, velocities = [], [], []
+    for chunk in read_manifest(sim_name)['chunks']:
+        if chunk['end_months'] < t0_months or chunk['start_months'] > t1_months:
+            continue
+        def mapped(prefix, dtype, shape):
+            return np.memmap(os.path.join(folder, chunk['files'][prefix]), dtype=dtype, mode='r',
+                             offset=chunk['offsets'][prefix], shape=shape)
+        count = chunk['num_records']
+        chunk_times = mapped('step', np.int64, (count,)) * metadata['dt_months']
+        lo = int(np.searchsorted(chunk_times, t0_months, side='left'))
+        hi = int(np.searchsorted(chunk_times, t1_months, side='right'))
+        times.append(chunk_times[lo:hi] / 12.0)
+        if 'pos' in chunk['offsets']:
+            # Chunks shared with a fork's parent may hold more bodies
+            stored = (count, chunk.get('num_bodies', num_bodies), 3)
+            stored_columns = np.asarray(chunk['columns'])[columns] if 'columns' in chunk else columns
+            positions.append(mapped('pos', np.float64, stored)[lo:hi][:, stored_columns])
+            velocities.append(mapped('vel', np.float64, stored)[lo:hi][:, stored_columns])
+        else:
+            records = read_chunk(sim_name, chunk, codec)[lo:hi][:, columns]
+            positions.append(records[:, :, :3])
+            velocities.append(records[:, :, 3:])
+
+    if not times:
+        return np.empty(0), np.empty((0, len(columns), 3)), np.empty((0, len(columns), 3))
+    return np.concatenate(times), np.concatenate(positions), np.concatenate(velocities)
+
+
+
+def has_columnar_dump(sim_name):
+    """Check if a simulation was dumped in the columnar format.
+
+    Method Arguments:
+    * sim_name: The name of the simulation.
+
+    Output:
+    * True if the simulation's folder holds a columnar metadata file.
+    """
+    import os
+    return os.path.isfile(os.path.join(DEFAULT_DUMP_PATH, sim_name, METADATA_FILE))
+
+
+
+def dump_format(sim_name):
+    """Get the format a simulation's records were dumped in.
+
+    Method Arguments:
+    * sim_name: The name of the simulation.
+
+    Output:
+    * "columnar", "compressed" or "pickle", or None if nothing was dumped.
+    """
+    import os
+    if has_columnar_dump(sim_name):
+        return read_metadata(sim_name).get('format', "columnar")
+    if os.path.isfile(os.path.join(DEFAULT_DUMP_PATH, sim_name, "0.pkl")):
+        return "pickle"
+    return None
+
+
+
+def read_chunk(sim_name, chunk, codec=None):
+    """Decode one chunk of a columnar dump into memory.
+
+    Method Arguments:
+    * sim_name: The name of the simulation.
+    * chunk: The chunk's entry in the manifest.
+    * codec: An optional TrajectoryCodec to decode compressed files with, so
+      its report() includes the decode throughput. Any codec can decode any
+      block; a new one is used when this is None.
+
+    Output:
+    * A (records, N, 6) numpy array laid out like Recorder.data: columns 0-2
+      hold the position in AU and columns 3-5 the velocity in km/s.
+    """
+    import os
+    import numpy as np
+
+    folder = os.path.join(DEFAULT_DUMP_PATH, sim_name)
+    codec = TrajectoryCodec() if codec is None else codec
+    def load(prefix):
+        path = os.path.join(folder, chunk['files'][prefix])
+        if not path.endswith(".z"):
+            return np.load(path)
+        with open(path, 'rb') as file:
+            return codec.decode(file.read())
+    positions = load('pos')
+    velocities = load('vel')
+    if 'columns' in chunk:
+        positions = positions[:, chunk['columns']]
+        velocities = velocities[:, chunk['columns']]
+    records = np.empty(positions.shape[:2] + (6,))
+    records[:, :, :3] = positions
+    records[:, :, 3:] = velocities
+    return records
+
+
+
+#---------------------------- Dense Output Methods ----------------------------
+def write_dense_output(sim_name, dense):
+    """Save the knots of a run's Recorder.DenseOutput.
+
+    Method Arguments:
+    * sim_name: The name of the simulation.
+    * dense: The Recorder.DenseOutput to save.
+
+    Output:
+    * None
+    """
+    import os
+    import numpy as np
+
+    folder = os.path.join(DEFAULT_DUMP_PATH, sim_name)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, DENSE_OUTPUT_FILE)
+    with open(path + ".tmp", 'wb') as file:
+        np.savez(file, knots=dense.data[:dense.count], knot_steps=dense.knot_steps,
+                 names=np.array(dense.names), dt_months=dense.dt_months, every=dense.every)
+    os.replace(path + ".tmp", path)
+
+
+
+def read_dense_output(sim_name):
+    """Load the dense output saved by a run.
+
+    Method Arguments:
+    * sim_name: The name of the simulation.
+
+    Output:
+    * A Recorder.DenseOutput holding the saved knots.
+    """
+    import os
+    import numpy as np
+    from Recorder import DenseOutput
+
+    with np.load(os.path.join(DEFAULT_DUMP_PATH, sim_name, DENSE_OUTPUT_FILE)) as saved:
+        knot_steps = saved['knot_steps']
+        dense = DenseOutput(saved['names'].tolist(), knot_steps[-1], float(saved['dt_months']), int(saved['every']))
+        # An extended run's knots are not all on the regular schedule
+        dense.knot_steps = knot_steps
+        dense.data = np.empty((len(knot_steps),) + saved['knots'].shape[1:])
+        dense.count = len(saved['knots'])
+        dense.data[:dense.count] = saved['knots']
+    return dense
+
+
+
+def has_dense_output(sim_name):
+    """Check if a simulation has a saved dense output."""
+    import os
+    return os.path.isfile(os.path.join(DEFAULT_DUMP_PATH, sim_name, DENSE_OUTPUT_FILE))
+
+
+
+def remove_dense_output(sim_name):
+    """Delete a simulation's saved dense output, if it has one."""
+    import os
+    path = os.path.join(DEFAULT_DUMP_PATH, sim_name, DENSE_OUTPUT_FILE)
+    if os.path.isfile(path):
+        os.remove(path)
+
+
+
+#----------------------------- Checkpoint Methods -----------------------------
+def write_checkpoint(sim_name, positions, velocities, masses, settings):
+    """Save everything needed to continue a run.
+
+    Method Arguments:
+    * sim_name: The name of the simulation.
+    * positions: An (N + N_test, 3) array of positions in AU, massive bodies
+      first.
+    * velocities: An (N + N_test, 3) array of velocities in km/s.
+    * masses: A length N array of the massive bodies' masses.
+    * settings: A JSON friendly dict of the step reached, the run and
+      integrator settings and the body names.
+
+    Output:
+    * None
+
+    The checkpoint replaces the previous one in a single step, so a run
+    killed while writing it still has the last complete checkpoint.
+    """
+    import json
+    import os
+    import numpy as np
+
+    folder = os.path.join(DEFAULT_DUMP_PATH, sim_name)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, CHECKPOINT_FILE)
+    with open(path + ".tmp", 'wb') as file:
+        np.savez(file, positions=positions, velocities=velocities, masses=masses,
+                 settings=np.array(json.dumps(settings)))
+    os.replace(path + ".tmp", path)
+
+
+
+def read_checkpoint(sim_name):
+    """Load a simulation's latest checkpoint.
+
+    Method Arguments:
+    * sim_name: The name of the simulation.
+
+    Output:
+    * A tuple (positions, velocities, masses, settings) as passed to
+      write_checkpoint.
+    """
+    import json
+    import os
+    import numpy as np
+
+    with np.load(os.path.join(DEFAULT_DUMP_PATH, sim_name, CHECKPOINT_FILE)) as checkpoint:
+        return (checkpoint['positions'], checkpoint['velocities'], checkpoint['masses'],
+                json.loads(str(checkpoint['settings'])))
+
+
+
+def has_checkpoint(sim_name):
+    """Check if a simulation has a checkpoint to resume from."""
+    import os
+    return os.path.isfile(os.path.join(DEFAULT_DUMP_PATH, sim_name, CHECKPOINT_FILE))
+
+
+
+def remove_checkpoint(sim_name):
+    """Delete a simulation's checkpoint, if it has one."""
+    import os
+    if has_checkpoint(sim_name):
+        os.remove(os.path.join(DEFAULT_DUMP_PATH, sim_name, CHECKPOINT_FILE))
+
+
+
+def discard_records(sim_name, num_records):
+    """Delete the dumped chunks from a record onwards.
+
+    Method Arguments:
+    * sim_name: The name of the simulation.
+    * num_records: The number of records to keep. Chunks starting at or
+      after this record are removed from the folder and the manifest.
+
+    Output:
+    * None
+
+    A run that is killed may have written chunks after its last checkpoint.
+    They are dropped so the resumed run can write them again.
+    """
+    import os
+
+    folder = os.path.join(DEFAULT_DUMP_PATH, sim_name)
+    if has_columnar_dump(sim_name):
+        manifest = read_manifest(sim_name)
+        for chunk in manifest['chunks']:
+            if chunk['first_record'] >= num_records:
+                for file_name in chunk['files'].values():
+                    os.remove(os.path.join(folder, file_name))
+        manifest['chunks'] = [chunk for chunk in manifest['chunks'] if chunk['first_record'] < num_records]
+        _write_manifest(sim_name, manifest)
+        return
+    for file_name in os.listdir(folder):
+        first, extension = os.path.splitext(file_name)
+        if extension == ".pkl" and first.isdigit() and int(first) >= num_records:
+            os.remove(os.path.join(folder, file_name))
+
+
+
+def fork_dump(parent_name, sim_name, num_records, names, masses, columns=None):
+    """Start a columnar dump that shares its first records with another.
+
+    Method Arguments:
+    * parent_name: The name of the simulation to share records with.
+    * sim_name: The name of the new simulation.
+    * num_records: The number of the parent's records to share. Must end on
+      a chunk boundary, as a checkpoint does.
+    * names: A list of the new simulation's body names.
+    * masses: A length N array of the new simulation's masses.
+    * columns: An optional list of the parent's body indices that the new
+      simulation keeps, in its own order. Defaults to all of them.
+
+    Output:
+    * None
+
+    The parent's chunk files are hard linked into the new folder, so the
+    shared records take no extra disk space, and since chunks are never
+    changed after they are written, either run can later delete or rewrite
+    its own files without touching the other's. File systems without hard
+    links get copies instead.
+    """
+    import os
+    import shutil
+
+    metadata = read_metadata(parent_name)
+    extra = {key: value for key, value in metadata.items()
+             if key not in ('format', 'names', 'masses', 'dt_months', 'codec')}
+    extra['parent'] = parent_name
+    codec = TrajectoryCodec(**metadata['codec']) if 'codec' in metadata else None
+    start_columnar_dump(sim_name, names, masses, metadata['dt_months'], extra, codec)
+
+    parent_folder = os.path.join(DEFAULT_DUMP_PATH, parent_name)
+    folder = os.path.join(DEFAULT_DUMP_PATH, sim_name)
+    parent_width = len(metadata['names'])
+    if columns is not None and list(columns) == list(range(parent_width)):
+        columns = None
+    manifest = read_manifest(sim_name)
+    for chunk in read_manifest(parent_name)['chunks']:
+        if chunk['first_record'] >= num_records:
+            continue
+        for file_name in chunk['files'].values():
+            try:
+                os.link(os.path.join(parent_folder, file_name), os.path.join(folder, file_name))
+            except OSError:
+                shutil.copy2(os.path.join(parent_folder, file_name), os.path.join(folder, file_name))
+        shared = dict(chunk)
+        if columns is not None:
+            # Map through the parent's own selection when it is a fork too
+            parent_columns = chunk.get('columns', list(range(parent_width)))
+            shared['columns'] = [parent_columns[column] for column in columns]
+            shared['num_bodies'] = chunk.get('num_bodies', parent_width)
+        manifest['chunks'].append(shared)
+    _write_manifest(sim_name, manifest)
+
+
+
+def read_records(sim_name, num_records=None):
+    """Read the first records of a dump in any format into arrays.
+
+    Method Arguments:
+    * sim_name: The name of the simulation.
+    * num_records: The number of records to read. Defaults to all of them.
+
+    Output:
+    * A tuple (steps, positions, velocities): the step number of every
+      record (None for pickle dumps, which do not store them) and
+      (records, N, 3) numpy arrays of positions (AU) and velocities (km/s).
+    """
+    import numpy as np
+    from Body import bodies_to_arrays
+
+    if has_columnar_dump(sim_name):
+        view = HistoryView(sim_name)[:num_records]
+        return view.steps, view.positions, view.velocities
+
+    system_hist = reconstruct_history_pickle(sim_name)[:num_records]
+    positions = np.empty((len(system_hist), system_hist.shape[1] if system_hist.ndim == 2 else 0, 3))
+    velocities = np.empty_like(positions)
+    for record, bodies in enumerate(system_hist):
+        _, record_pos, record_vel, _ = bodies_to_arrays(list(bodies))
+        positions[record] = record_pos.data
+        velocities[record] = record_vel.data
+    return None, positions, velocities
+
+
+
+def read_record_steps(sim_name, num_records=None):
+    """Read the step numbers of the first records of a dump without reading
+    the records themselves.
+
+    Method Arguments:
+    * sim_name: The name of the simulation.
+    * num_records: The number of records. Defaults to all of them.
+
+    Output:
+    * A numpy array of step numbers, or None for pickle dumps, which do not
+      store them.
+    """
+    if has_columnar_dump(sim_name):
+        return HistoryView(sim_name)[:num_records].steps
+    return None
+
+
+
 #------------------------------ CSV Read Method -------------------------------
 def reconstruct_history_csv(sim_name):
     """Create an array of all data over time dumped by the simulation
@@ -184,6 +823,616 @@ def reconstruct_history_pickle(sim_name):
 
     return np.array(system_hist)
 
+#==============================================================================
+#                              Async Writer Class
+#==============================================================================
+class AsyncDumpWriter:
+    """Runs dump jobs on a background thread so the integration loop does not
+    wait for the disk.
+
+    Jobs are handed over through a bounded queue of DUMP_QUEUE_SIZE entries:
+    submit() returns immediately unless that many chunks are already
+    waiting, in which case it blocks until the writer catches up. An error
+    raised by a job is raised again by the next submit() or by close().
+    Use it as a context manager, which waits for every job to finish.
+    """
+
+    #--------------------------- Constructor Method ---------------------------
+    def __init__(self, max_queue=None):
+        """Start the writer thread.
+
+        Method Arguments:
+        * max_queue: The most jobs that may wait. Defaults to DUMP_QUEUE_SIZE.
+
+        Output:
+        * None
+        """
+        import queue
+        import threading
+
+        self._queue = queue.Queue(maxsize=DUMP_QUEUE_SIZE if max_queue is None else max_queue)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="AsyncDumpWriter", daemon=True)
+        self._thread.start()
+
+    #----------------------------- Writer Methods -----------------------------
+    def _run(self):
+        """Write jobs until the stop marker arrives."""
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            function, args = job
+            if self._error is None:
+                try:
+                    function(*args)
+                except BaseException as error:
+                    self._error = error
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def submit(self, function, *args):
+        """Queue function(*args) to run on the writer thread.
+
+        Method Arguments:
+        * function: The dump function to call.
+        * args: Its arguments. Arrays must not be changed until the job has
+          run.
+
+        Output:
+        * None
+        """
+        self._raise_error()
+        self._queue.put((function, args))
+
+    def close(self):
+        """Wait for every queued job to finish and stop the thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+#==============================================================================
+#                             Trajectory Codec Class
+#==============================================================================
+class TrajectoryCodec:
+    """Compress (records, ...) float arrays of trajectories.
+
+    Consecutive records of an orbit differ by small, smooth amounts. Without
+    a tolerance the codec is lossless: the IEEE bit pattern of every value is
+    read as a 64 bit integer, and within an exponent range those integers
+    follow the value closely. With a tolerance the values are instead rounded
+    to a grid of spacing 2 * tolerance, so none moves by more than the
+    tolerance, and the grid indices are used. Either way only the order-th
+    differences between records are kept, which for a smooth orbit are a few
+    bits wide. They are zigzag coded so small negative numbers stay small,
+    shuffled so equal byte positions sit together, and compressed with zlib
+    or lzma. Decoding is a cumulative sum, so it needs no loop over records.
+
+    Encoded blocks carry their own shape and settings, so any codec can
+    decode them. The codec keeps running totals of the bytes it has seen and
+    the time it took, which report() turns into a compression ratio and
+    throughputs.
+    """
+    METHODS = ("zlib", "lzma")
+
+    #--------------------------- Constructor Method ---------------------------
+    def __init__(self, method="zlib", tolerance_au=None, tolerance_km_s=None, order=3):
+        """Set up a codec.
+
+        Method Arguments:
+        * method: "zlib" (fast) or "lzma" (smaller, slower).
+        * tolerance_au: The most a dumped position may differ from the
+          simulated one in AU. None keeps positions lossless.
+        * tolerance_km_s: The same for velocities in km/s.
+        * order: How many times to difference consecutive records, 1 to 3.
+          3 suits smooth orbits best.
+
+        Output:
+        * None
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"method must be one of {self.METHODS}, got '{method}'.")
+        for tolerance in (tolerance_au, tolerance_km_s):
+            if tolerance is not None and not tolerance > 0:
+                raise ValueError("Tolerances must be positive.")
+        if order not in (1, 2, 3):
+            raise ValueError("order must be 1, 2 or 3.")
+        self.method = method
+        self.tolerance_au = tolerance_au
+        self.tolerance_km_s = tolerance_km_s
+        self.order = int(order)
+
+        self.raw_bytes = 0
+        self.encoded_bytes = 0
+        self.encode_seconds = 0.0
+        self.decoded_bytes = 0
+        self.decode_seconds = 0.0
+
+    def settings(self):
+        """Get the codec's settings as a JSON friendly dict."""
+        return {'method': self.method, 'tolerance_au': self.tolerance_au,
+                'tolerance_km_s': self.tolerance_km_s, 'order': self.order}
+
+    #------------------------------ Codec Methods -----------------------------
+    def encode(self, array, tolerance=None):
+        """Compress an array of records.
+
+        Method Arguments:
+        * array: A numpy float array whose first axis is the record.
+        * tolerance: The largest error allowed in any value, or None to
+          encode losslessly.
+
+        Output:
+        * The encoded bytes.
+        """
+        import struct
+        import time
+        import numpy as np
+
+        start = time.perf_counter()
+        values = np.ascontiguousarray(array, dtype=np.float64)
+        rows = values.reshape(len(values), int(np.prod(values.shape[1:])))
+        if tolerance is None:
+            scale = 0.0
+            indices = rows.view(np.int64).copy()
+        else:
+            scale = 2.0 * tolerance
+            indices = np.rint(rows / scale).astype(np.int64)
+        for _ in range(self.order):
+            indices[1:] = indices[1:] - indices[:-1] # Wraps around like the sums in decode()
+        zigzag = ((indices << 1) ^ (indices >> 63)).view(np.uint64)
+
+        shuffled = zigzag.view(np.uint8).reshape(-1, 8).T.tobytes()
+        header = struct.pack(f"<BBB{values.ndim}qd", self.METHODS.index(self.method), self.order,
+                             values.ndim, *values.shape, scale)
+        encoded = header + self._compress(shuffled)
+
+        self.raw_bytes += values.nbytes
+        self.encoded_bytes += len(encoded)
+        self.encode_seconds += time.perf_counter() - start
+        return encoded
+
+    def decode(self, data):
+        """Rebuild an array encoded by any TrajectoryCodec.
+
+        Method Arguments:
+        * data: The encoded bytes.
+
+        Output:
+        * A numpy float64 array with the encoded shape.
+        """
+        import lzma
+        import struct
+        import time
+        import zlib
+        import numpy as np
+
+        start = time.perf_counter()
+        method, order, ndim = struct.unpack_from("<BBB", data)
+        header = struct.Struct(f"<BBB{ndim}qd")
+        fields = header.unpack_from(data)
+        shape, scale = fields[3:3 + ndim], fields[-1]
+        payload = data[header.size:]
+        raw = zlib.decompress(payload) if self.METHODS[method] == "zlib" else lzma.decompress(payload)
+
+        count = int(np.prod(shape))
+        zigzag = np.frombuffer(raw, dtype=np.uint8).reshape(8, count).T.copy().view(np.uint64)
+        zigzag = zigzag.reshape(shape[0], int(np.prod(shape[1:])))
+        indices = (zigzag >> np.uint64(1)).view(np.int64) ^ -(zigzag & np.uint64(1)).view(np.int64)
+        for _ in range(order):
+            indices = np.cumsum(indices, axis=0)
+        rows = indices.view(np.float64) if scale == 0.0 else indices * scale
+
+        values = rows.reshape(shape)
+        self.decoded_bytes += values.nbytes
+        self.decode_seconds += time.perf_counter() - start
+        return values
+
+    def _compress(self, data):
+        import lzma
+        import zlib
+        return zlib.compress(data, 6) if self.method == "zlib" else lzma.compress(data)
+
+    #----------------------------- Report Methods -----------------------------
+    def report(self):
+        """Summarize what the codec has encoded and decoded so far.
+
+        Method Arguments:
+        * None
+
+        Output:
+        * A dict with the compression 'ratio' (raw bytes per encoded byte),
+          'raw_bytes', 'encoded_bytes', and the 'encode_mb_per_s' and
+          'decode_mb_per_s' throughputs in MB of raw data per second.
+        """
+        def throughput(nbytes, seconds):
+            return nbytes / 2**20 / seconds if seconds > 0 else 0.0
+        return {'ratio': self.raw_bytes / self.encoded_bytes if self.encoded_bytes else 0.0,
+                'raw_bytes': self.raw_bytes,
+                'encoded_bytes': self.encoded_bytes,
+                'encode_mb_per_s': throughput(self.raw_bytes, self.encode_seconds),
+                'decode_mb_per_s': throughput(self.decoded_bytes, self.decode_seconds)}
+
+
+
+#==============================================================================
+#                             Mapped History Classes
+#==============================================================================
+class ChunkedArray:
+    """A read-only array made of several memory-mapped chunks stacked along
+    the first axis.
+
+    Indexing works like a numpy array of shape (records, N, 3). Only the
+    chunks and rows that are asked for are read from disk, and the result is
+    an ordinary numpy array. np.asarray() reads the whole array.
+    """
+
+    #--------------------------- Constructor Method ---------------------------
+    def __init__(self, chunks):
+        """Stack chunks along the first axis.
+
+        Method Arguments:
+        * chunks: A list of arrays (usually memory maps) with the same shape
+          after the first axis.
+
+        Output:
+        * None
+        """
+        import numpy as np
+        self.chunks = list(chunks)
+        lengths = [len(chunk) for chunk in self.chunks]
+        self.starts = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        inner = self.chunks[0].shape[1:] if self.chunks else (0, 3)
+        self.shape = (int(self.starts[-1]),) + tuple(inner)
+        self.dtype = self.chunks[0].dtype if self.chunks else np.dtype(float)
+
+    #---------------------------- Container Methods ---------------------------
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        import numpy as np
+        if not isinstance(key, tuple):
+            key = (key,)
+        first, rest = key[0], key[1:]
+
+        # A single record is read straight from its chunk
+        if isinstance(first, (int, np.integer)):
+            index = int(first) + (len(self) if first < 0 else 0)
+            if not 0 <= index < len(self):
+                raise IndexError(f"record {first} is out of range for {len(self)} records")
+            chunk = int(np.searchsorted(self.starts, index, side='right')) - 1
+            return self.chunks[chunk][(index - self.starts[chunk],) + rest]
+
+        # Gather the requested records chunk by chunk
+        indices = np.arange(len(self))[first]
+        out = np.empty((len(indices),) + self.shape[1:], dtype=self.dtype)
+        chunk_of = np.searchsorted(self.starts, indices, side='right') - 1
+        for chunk in np.unique(chunk_of):
+            mask = chunk_of == chunk
+            local = indices[mask] - self.starts[chunk]
+            if len(local) > 1 and np.all(np.diff(local) == 1):
+                out[mask] = self.chunks[chunk][local[0]:local[-1] + 1]
+            else:
+                out[mask] = self.chunks[chunk][local]
+        return out[(slice(None),) + rest]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[:]
+        return data if dtype is None else data.astype(dtype)
+
+
+
+class MappedHistory:
+    """Read a columnar dump without loading it.
+
+    Every chunk file is memory-mapped, so opening a run takes about as long
+    as reading its metadata file no matter how large the run is, and only
+    the pages of the records that are actually used are read. positions and
+    velocities behave like (records, N, 3) arrays. Compressed dumps can not
+    be mapped, so they are decoded into memory when opened; use HistoryView
+    to read them a chunk at a time. The same goes for chunks a fork shares
+    with a parent that had more bodies.
+    """
+
+    #--------------------------- Constructor Method ---------------------------
+    def __init__(self, sim_name, codec=None):
+        """Open a simulation's columnar dump.
+
+        Method Arguments:
+        * sim_name: The name of the simulation.
+        * codec: An optional TrajectoryCodec that decodes a compressed dump,
+          see read_chunk.
+
+        Output:
+        * None
+        """
+        import os
+        import numpy as np
+
+        folder = os.path.join(DEFAULT_DUMP_PATH, sim_name)
+        self.metadata = read_metadata(sim_name)
+        self.manifest = read_manifest(sim_name)
+        self.sim_name = sim_name
+        self.names = self.metadata['names']
+        self.masses = np.array(self.metadata['masses'])
+        self.dt_months = self.metadata['dt_months']
+
+        chunks = self.manifest['chunks']
+        def load(prefix, chunk):
+            mapped = np.load(os.path.join(folder, chunk['files'][prefix]), mmap_mode='r')
+            return mapped[:, chunk['columns']] if 'columns' in chunk and prefix != "step" else mapped
+        if self.metadata['format'] == "compressed":
+            decoded = [read_chunk(sim_name, chunk, codec) for chunk in chunks]
+            self.positions = ChunkedArray([records[:, :, :3] for records in decoded])
+            self.velocities = ChunkedArray([records[:, :, 3:] for records in decoded])
+        else:
+            self.positions = ChunkedArray([load("pos", chunk) for chunk in chunks])
+            self.velocities = ChunkedArray([load("vel", chunk) for chunk in chunks])
+        self.steps = np.concatenate([load("step", chunk) for chunk in chunks]) if chunks \
+            else np.empty(0, dtype=np.int64)
+
+    #----------------------------- Getter Methods -----------------------------
+    def __len__(self):
+        return len(self.positions)
+
+    @property
+    def times(self):
+        """Simulated time in months of every record."""
+        return self.steps * self.dt_months
+
+
+
+class ChunkCache:
+    """Least recently used cache of decoded chunks, bounded in bytes.
+
+    When adding a chunk pushes the total over max_bytes, the chunks used
+    longest ago are dropped until it fits again. The newest chunk is always
+    kept, even if it is larger than max_bytes on its own.
+    """
+
+    #--------------------------- Constructor Method ---------------------------
+    def __init__(self, max_bytes=None):
+        """Start an empty cache.
+
+        Method Arguments:
+        * max_bytes: The most bytes of decoded chunks to keep. Defaults to
+          HISTORY_CACHE_BYTES.
+
+        Output:
+        * None
+        """
+        from collections import OrderedDict
+        self.max_bytes = HISTORY_CACHE_BYTES if max_bytes is None else int(max_bytes)
+        self.chunks = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    #------------------------------ Cache Methods -----------------------------
+    def get(self, key, loader):
+        """Get a chunk, decoding it only if it is not cached.
+
+        Method Arguments:
+        * key: A hashable name for the chunk.
+        * loader: A function with no arguments that decodes the chunk and
+          returns it as a numpy array.
+
+        Output:
+        * The decoded chunk.
+        """
+        if key in self.chunks:
+            self.chunks.move_to_end(key)
+            self.hits += 1
+            return self.chunks[key]
+
+        self.misses += 1
+        chunk = loader()
+        self.chunks[key] = chunk
+        self.nbytes += chunk.nbytes
+        while self.nbytes > self.max_bytes and len(self.chunks) > 1:
+            _, dropped = self.chunks.popitem(last=False)
+            self.nbytes -= dropped.nbytes
+        return chunk
+
+    def clear(self):
+        """Drop every cached chunk."""
+        self.chunks.clear()
+        self.nbytes = 0
+
+
+
+class HistoryView:
+    """A lazy sequence over the records of a columnar dump.
+
+    Nothing but the record steps is read when the view is opened. Chunks are
+    decoded when a record in them is first used and kept in a ChunkCache
+    bounded in bytes, so walking a run of any length uses constant memory
+    and going back over nearby records does not touch the disk again.
+
+    Indexing with an int gives one record as a (bodies, 6) array (position in
+    AU, velocity in km/s). Slices and index arrays give a new view over those
+    records, and a body name gives a view of that body alone. The step_range,
+    time_range and select_bodies methods narrow a view the same way. Views
+    made from a view share its cache.
+    """
+
+    #--------------------------- Constructor Method ---------------------------
+    def __init__(self, sim_name, cache_bytes=None, codec=None):
+        """Open a simulation's columnar dump lazily.
+
+        Method Arguments:
+        * sim_name: The name of the simulation.
+        * cache_bytes: The most bytes of decoded chunks to keep in memory.
+          Defaults to HISTORY_CACHE_BYTES.
+        * codec: An optional TrajectoryCodec that decodes compressed chunks,
+          see read_chunk.
+
+        Output:
+        * None
+        """
+        import os
+        import numpy as np
+
+        self.sim_name = sim_name
+        self.metadata = read_metadata(sim_name)
+        self.chunks = read_manifest(sim_name)['chunks']
+        self.dt_months = self.metadata['dt_months']
+        self.cache = ChunkCache(cache_bytes)
+        self.codec = codec
+
+        folder = os.path.join(DEFAULT_DUMP_PATH, sim_name)
+        lengths = [chunk['num_records'] for chunk in self.chunks]
+        self._chunk_starts = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        self._all_steps = np.concatenate([np.load(os.path.join(folder, chunk['files']['step']))
+                                          for chunk in self.chunks]) if self.chunks \
+            else np.empty(0, dtype=np.int64)
+        self._records = np.arange(len(self._all_steps))
+        self._columns = np.arange(len(self.metadata['names']))
+
+    def _view(self, records=None, columns=None):
+        """Make a view over other records or bodies that shares this cache."""
+        import copy
+        view = copy.copy(self)
+        if records is not None:
+            view._records = records
+        if columns is not None:
+            view._columns = columns
+        return view
+
+    def _chunk(self, chunk_index):
+        """Get a decoded chunk through the cache."""
+        return self.cache.get(chunk_index, lambda: read_chunk(self.sim_name, self.chunks[chunk_index], self.codec))
+
+    #---------------------------- Container Methods ---------------------------
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, key):
+        import numpy as np
+        if isinstance(key, str):
+            return self.select_bodies([key])
+        if isinstance(key, (int, np.integer)):
+            record = self._records[key]
+            chunk_index = int(np.searchsorted(self._chunk_starts, record, side='right')) - 1
+            data = self._chunk(chunk_index)
+            return data[record - self._chunk_starts[chunk_index]][self._columns]
+        return self._view(records=self._records[key])
+
+    def __iter__(self):
+        for index in range(len(self._records)):
+            yield self[index]
+
+    #------------------------------ Select Methods ----------------------------
+    def at_step(self, step):
+        """Get the record of a step.
+
+        Method Arguments:
+        * step: The step number, 0 being the starting state.
+
+        Output:
+        * A (bodies, 6) array. Raises KeyError if the step was not recorded.
+        """
+        import numpy as np
+        matches = np.flatnonzero(self.steps == step)
+        if not len(matches):
+            raise KeyError(f"Step {step} was not recorded.")
+        return self[int(matches[0])]
+
+    def step_range(self, start, stop):
+        """Get a view of the records with start <= step < stop."""
+        import numpy as np
+        steps = self.steps
+        return self._view(records=self._records[(steps >= start) & (steps < stop)])
+
+    def at_time(self, time):
+        """Get the record closest to a simulated time in years.
+
+        Method Arguments:
+        * time: The time in years.
+
+        Output:
+        * A (bodies, 6) array.
+        """
+        import numpy as np
+        return self[int(np.argmin(np.abs(self.times - time * 12.0)))]
+
+    def time_range(self, t0, t1):
+        """Get a view of the records between two simulated times in years
+        (both inclusive)."""
+        times = self.times
+        return self._view(records=self._records[(times >= t0 * 12.0) & (times <= t1 * 12.0)])
+
+    def select_bodies(self, bodies):
+        """Get a view of some bodies.
+
+        Method Arguments:
+        * bodies: A list of body names or indices into this view's bodies.
+
+        Output:
+        * A HistoryView.
+        """
+        import numpy as np
+        names = self.names
+        picked = [names.index(body) if isinstance(body, str) else int(body) for body in bodies]
+        return self._view(columns=self._columns[np.array(picked, dtype=int)])
+
+    #----------------------------- Getter Methods -----------------------------
+    @property
+    def names(self):
+        """Names of the bodies in the view."""
+        return [self.metadata['names'][column] for column in self._columns]
+
+    @property
+    def masses(self):
+        """Masses of the bodies in the view in Earth masses."""
+        import numpy as np
+        return np.array(self.metadata['masses'])[self._columns]
+
+    @property
+    def steps(self):
+        """Step number of every record in the view."""
+        return self._all_steps[self._records]
+
+    @property
+    def times(self):
+        """Simulated time in months of every record in the view."""
+        return self.steps * self.dt_months
+
+    @property
+    def positions(self):
+        """(records, bodies, 3) array of the view's positions in AU."""
+        return self._gather(slice(0, 3))
+
+    @property
+    def velocities(self):
+        """(records, bodies, 3) array of the view's velocities in km/s."""
+        return self._gather(slice(3, 6))
+
+    def _gather(self, part):
+        """Copy one part of every record in the view, a chunk at a time."""
+        import numpy as np
+        out = np.empty((len(self._records), len(self._columns), 3))
+        chunk_indices = np.searchsorted(self._chunk_starts, self._records, side='right') - 1
+        for chunk_index in np.unique(chunk_indices):
+            rows = np.flatnonzero(chunk_indices == chunk_index)
+            data = self._chunk(int(chunk_index))
+            local = self._records[rows] - self._chunk_starts[chunk_index]
+            out[rows] = data[local][:, self._columns, part]
+        return out
+
+
+
 #==============================================================================
 #                                  Test Code
 #==============================================================================
@@ -1,21 +1,363 @@
 # simulation.py
 import numpy as np
+import Body
+import Diagnostics
+import Forces
+import Integrators
+import Kepler
+from Recorder import Recorder, DenseOutput, StateSnapshot
 from Body import Planetary_Body, Vector3, KM_PER_S_TO_AU_PER_MONTH, CONVERT_ACCEL_AU_MONTH2_TO_KM_S_MONTH
 
+BACKENDS = ("vectorized", "objects")
+FORCE_SOLVERS = ("direct", "tiled", "barnes_hut")
+ENSEMBLE_INTEGRATORS = ("rk4", "leapfrog", "yoshida4")
+TEST_PARTICLE_INTEGRATORS = ("rk4", "leapfrog", "yoshida4", "dopri5")
+
 class Simulation:
     """
-    Manages and runs an N-body gravitational simulation using RK4 integration.
+    Manages and runs an N-body gravitational simulation.
     Time step is in months. Positions are AU, Velocities are km/s.
+
+    integrator selects the time stepping scheme by name: "rk4" (classical
+    Runge-Kutta, the default), "leapfrog" (kick-drift-kick, 1 force
+    evaluation per step) or "yoshida4" (4th order symplectic, 3 force
+    evaluations per step). The symplectic schemes keep the energy error
+    bounded on long orbital runs and allow larger time steps. "dopri5" is an
+    adaptive Dormand-Prince 5(4) scheme: time_step_months becomes the
+    recording interval and the internal step grows and shrinks to keep the
+    estimated error per step below tolerance. "hermite_block" gives every
+    body its own power-of-two fraction of time_step_months (4th order Hermite
+    with block time steps, accuracy set by hermite_eta), so only the bodies
+    that need short steps have their forces recomputed often.
+    "wisdom_holman" solves each body's orbit around the most massive body
+    exactly and only integrates the interactions between the other bodies,
+    which allows much larger steps for Sun-dominated planetary systems.
+    "kepler" propagates a system of exactly 2 bodies along their closed-form
+    orbits, which is exact for any step. "auto" picks "kepler" for two bodies
+    and "rk4" otherwise.
+
+    The "vectorized" backend (default) integrates contiguous numpy arrays of
+    positions (N,3), velocities (N,3) and masses (N,). The "objects" backend
+    runs the original per-body Planetary_Body/Vector3 loop.
+
+    force_solver selects how the vectorized backend computes gravity:
+    "direct" sums every pair exactly, "tiled" sums every pair exactly in
+    tile_size blocks spread over num_threads threads (bounded memory for
+    medium N), "barnes_hut" uses an octree with opening angle theta for large
+    numbers of bodies. "hermite_block" also needs the jerks, so it only runs
+    with "direct".
+
+    G sets the gravitational constant for this simulation only, given in
+    AU^3/(MEarth * month^2) or, with G_units="days", AU^3/(MEarth * day^2).
+    It defaults to Body.G_ASTRO_MONTHS, so simulations with different G can
+    run side by side.
+
+    test_particles is an optional list of Planetary_Body probes that feel the
+    gravity of the massive bodies but pull on nothing (their masses are
+    ignored). Their state is kept in tp_positions and tp_velocities, apart
+    from the massive bodies, and each force evaluation costs
+    O(N_massive * (N_massive + N_test)) instead of growing with the square of
+    the probe count. More probes can be added from arrays with
+    add_test_particles.
     """
-    def __init__(self, list_of_planetary_bodies, time_step_months=0.1, name="Placeholder"): # Default to 0.1 months
+    def __init__(self, list_of_planetary_bodies, time_step_months=0.1, name="Placeholder", backend="vectorized",
+                 force_solver="direct", theta=0.5, tile_size=512, num_threads=None, integrator="rk4",
+                 tolerance=1e-9, hermite_eta=0.01, G=None, G_units="months",
+                 test_particles=None): # Default to 0.1 months
         if not all(isinstance(pb, Planetary_Body) for pb in list_of_planetary_bodies):
             raise TypeError("All items must be Planetary_Body instances.")
+        if backend not in BACKENDS:
+            raise ValueError(f"backend must be one of {BACKENDS}, got '{backend}'.")
+        if force_solver not in FORCE_SOLVERS:
+            raise ValueError(f"force_solver must be one of {FORCE_SOLVERS}, got '{force_solver}'.")
+        if backend == "objects" and force_solver != "direct":
+            raise ValueError("The objects backend only supports the direct force solver.")
+        if integrator == "auto":
+            integrator = "kepler" if len(list_of_planetary_bodies) == 2 and backend == "vectorized" \
+                and not test_particles else "rk4"
+        if integrator not in Integrators.INTEGRATORS:
+            raise ValueError(f"integrator must be one of {tuple(Integrators.INTEGRATORS) + ('auto',)}, got '{integrator}'.")
+        if integrator == "kepler" and len(list_of_planetary_bodies) != 2:
+            raise ValueError(f"The kepler integrator needs exactly 2 bodies, got {len(list_of_planetary_bodies)}.")
+        if backend == "objects" and integrator != "rk4":
+            raise ValueError("The objects backend only supports the rk4 integrator.")
+        if integrator == "hermite_block" and force_solver != "direct":
+            raise ValueError("The hermite_block integrator needs the direct force solver for its jerks.")
             
         self.bodies = list_of_planetary_bodies
-        self.dt_months = float(time_step_months) # Time step for RK4 in months
+        self.dt_months = float(time_step_months) # Integrator time step in months
         self.body_names = [body.name for body in self.bodies]
         self.position_history = []
+        self.recorder = None
+        self.dense_output = None
+        self.diagnostics = None
         self.sim_name = name
+        self.backend = backend
+        self.force_solver = force_solver
+        self.theta = float(theta)
+        self.tile_size = int(tile_size)
+        self.num_threads = num_threads
+        self.integrator = integrator
+        self.tolerance = float(tolerance)
+        self.hermite_eta = float(hermite_eta)
+        # Gravitational constant in AU^3/(MEarth * month^2), fixed for this simulation
+        self.G = Body.G_ASTRO_MONTHS if G is None else float(Body.G_to_months(G, G_units))
+        self.tp_names = []
+        self.load_bodies()
+        if test_particles:
+            if not all(isinstance(pb, Planetary_Body) for pb in test_particles):
+                raise TypeError("All test particles must be Planetary_Body instances.")
+            self.add_test_particles([tp.pos.to_list() for tp in test_particles],
+                                    [tp.velocity.to_list() for tp in test_particles],
+                                    [tp.name for tp in test_particles])
+
+    #------------------------------ Array State -------------------------------
+    # The integrated arrays hold the massive bodies first and then the test
+    # particles; positions/velocities and tp_positions/tp_velocities are views
+    # of the two parts. The objects backend copies its bodies into the arrays
+    # after every step, so the views are current on both backends.
+    @property
+    def positions(self):
+        """(N,3) array of body positions in AU."""
+        return self._pos[:self._num_massive]
+
+    @property
+    def velocities(self):
+        """(N,3) array of body velocities in km/s."""
+        return self._vel[:self._num_massive]
+
+    @property
+    def tp_positions(self):
+        """(N_test,3) array of test particle positions in AU."""
+        return self._pos[self._num_massive:]
+
+    @property
+    def tp_velocities(self):
+        """(N_test,3) array of test particle velocities in km/s."""
+        return self._vel[self._num_massive:]
+
+    @property
+    def num_test_particles(self):
+        """Number of massless test particles."""
+        return len(self._pos) - self._num_massive
+
+    def load_bodies(self):
+        """
+        Copies the state held in self.bodies into the position, velocity and
+        mass arrays. Call this after editing the Planetary_Body objects directly.
+        Test particles keep their current state.
+        """
+        if hasattr(self, "_pos"):
+            tp_pos, tp_vel = self.tp_positions.copy(), self.tp_velocities.copy()
+        else:
+            tp_pos, tp_vel = np.empty((0, 3)), np.empty((0, 3))
+        self.masses, positions, velocities, _ = Body.bodies_to_arrays(self.bodies)
+        self._num_massive = len(self.masses)
+        self._pos = np.concatenate([positions.data, tp_pos])
+        self._vel = np.concatenate([velocities.data, tp_vel])
+        # Solver and stepper buffers are sized for the bodies being loaded
+        self._replace_force_solver()
+        self._stepper = None
+
+    def add_test_particles(self, positions, velocities, names=None):
+        """
+        Adds massless test particles that feel the massive bodies but exert
+        no gravity.
+        Args:
+            positions (array-like): (M,3) positions in AU.
+            velocities (array-like): (M,3) velocities in km/s.
+            names (list, optional): A name for each particle. Defaults to
+                "tp<index>".
+        """
+        if self.backend == "objects":
+            raise ValueError("Test particles need the vectorized backend.")
+        if self.integrator not in TEST_PARTICLE_INTEGRATORS:
+            raise ValueError(f"Test particles need one of the {TEST_PARTICLE_INTEGRATORS} integrators, "
+                             f"got '{self.integrator}'.")
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        velocities = np.asarray(velocities, dtype=float).reshape(-1, 3)
+        if positions.shape != velocities.shape:
+            raise ValueError("positions and velocities must have the same shape.")
+        if names is None:
+            names = [f"tp{self.num_test_particles + i}" for i in range(len(positions))]
+        elif len(names) != len(positions):
+            raise ValueError("There must be one name per test particle.")
+
+        self._pos = np.concatenate([self._pos, positions])
+        self._vel = np.concatenate([self._vel, velocities])
+        self.tp_names = self.tp_names + list(names)
+        self._stepper = None
+
+    def _replace_force_solver(self):
+        """Creates a new force solver, shutting down the worker threads of the
+        one it replaces."""
+        old_solver = getattr(self, "_force_solver", None)
+        if hasattr(old_solver, "close"):
+            old_solver.close()
+        self._force_solver = self._make_force_solver()
+
+    def _make_force_solver(self):
+        """Creates the Forces solver object selected by self.force_solver."""
+        if self.force_solver == "barnes_hut":
+            return Forces.BarnesHut(theta=self.theta)
+        if self.force_solver == "tiled":
+            return Forces.TiledDirectSummation(tile_size=self.tile_size, num_threads=self.num_threads)
+        return Forces.DirectSummation()
+
+    def sync_bodies(self):
+        """
+        Writes the array state back into the Planetary_Body objects in
+        self.bodies so code using the object API sees the current state.
+        """
+        for body, pos, vel in zip(self.bodies, self.positions.tolist(), self.velocities.tolist()):
+            body.pos = Vector3(*pos)
+            body.velocity = Vector3(*vel)
+
+    def _snapshot_bodies(self):
+        """Returns new Planetary_Body objects holding the current array state."""
+        return Body.arrays_to_bodies(self.masses, self.positions, self.velocities, self.body_names)
+
+    def _accelerations(self, positions, out=None):
+        """
+        Gravitational acceleration on every body and test particle in
+        AU/month^2. Only the massive bodies are sources.
+        Args:
+            positions (np.ndarray): (N+N_test,3) positions in AU, massive
+                bodies first.
+            out (np.ndarray, optional): (N+N_test,3) array to write the result into.
+        Returns:
+            np.ndarray: (N+N_test,3) accelerations in AU/month^2.
+        """
+        return self._force_solver.accelerations(positions, positions[:self._num_massive], self.masses,
+                                                self.G, out=out)
+
+    def force_error(self, sample_size=1000, seed=0):
+        """
+        Compares the selected force solver against exact direct summation on
+        the current state.
+        Args:
+            sample_size (int, optional): Number of randomly chosen bodies to
+                check. All bodies are checked when there are fewer.
+            seed (int, optional): Seed for choosing the sample.
+        Returns:
+            dict: 'median', 'rms' and 'max' relative acceleration error.
+        """
+        num_bodies = len(self._pos)
+        if sample_size is None or sample_size >= num_bodies:
+            sample = np.arange(num_bodies)
+        else:
+            sample = np.random.default_rng(seed).choice(num_bodies, sample_size, replace=False)
+        approx = self._accelerations(self._pos)[sample]
+        exact = Forces.direct_accelerations(self._pos[sample], self.positions, self.masses, self.G)
+        return Forces.force_error(approx, exact)
+
+    def kepler_states(self, times):
+        """
+        Exact states of a two-body system at any times, starting from the
+        current state.
+        Args:
+            times (array-like): Times in months after the current state.
+        Returns:
+            tuple: (T,2,3) positions in AU and (T,2,3) velocities in km/s.
+        """
+        if len(self.masses) != 2:
+            raise ValueError(f"Kepler propagation needs exactly 2 bodies, got {len(self.masses)}.")
+        pos, vel = Kepler.two_body_states(self.positions, self.velocities * KM_PER_S_TO_AU_PER_MONTH,
+                                          self.masses, self.G, times)
+        return pos, vel / KM_PER_S_TO_AU_PER_MONTH
+
+    def integrator_stats(self):
+        """
+        Returns:
+            dict: Counters kept by the integrator, such as the accepted and
+                rejected step counts of the adaptive integrator. Empty for
+                fixed step integrators.
+        """
+        if self._stepper is None or not hasattr(self._stepper, "stats"):
+            return {}
+        return self._stepper.stats()
+
+    def step(self, dt=None):
+        """
+        Advances the array state in place by one integrator step.
+        Args:
+            dt (float, optional): Step in months. Defaults to self.dt_months.
+        """
+        dt = self.dt_months if dt is None else dt
+        if self.backend == "objects":
+            self._rk4_step_objects(dt)
+            return
+        if self._stepper is None:
+            self._stepper = Integrators.INTEGRATORS[self.integrator](self)
+        self._stepper.step(dt)
+
+    def _rk4_step_objects(self, dt):
+        """
+        Advances self.bodies by one classical RK4 step of dt months using the
+        per-body Planetary_Body/Vector3 derivative loop.
+        """
+        num_bodies = len(self.bodies)
+        y0_pos_AU = [body.pos.copy() for body in self.bodies]       # AU
+        y0_vel_kms = [body.velocity.copy() for body in self.bodies] # km/s
+
+        # --- RK4 Stage k1 ---
+        # Derivatives at current state (self.bodies)
+        k1_pos_deriv_AU_month, k1_vel_deriv_kms_month = self._get_system_state_derivatives(self.bodies)
+
+        # --- RK4 Stage k2 ---
+        temp_bodies_k2 = []
+        for i in range(num_bodies):
+            pos_k2_intermediate_AU = y0_pos_AU[i] + (k1_pos_deriv_AU_month[i] * (dt / 2.0))
+            vel_k2_intermediate_kms = y0_vel_kms[i] + (k1_vel_deriv_kms_month[i] * (dt / 2.0))
+            temp_bodies_k2.append(Planetary_Body(name_val=self.bodies[i].name, 
+                                                 mass_val=self.bodies[i].mass, 
+                                                 pos_vector=pos_k2_intermediate_AU, 
+                                                 vel_vector=vel_k2_intermediate_kms))
+        k2_pos_deriv_AU_month, k2_vel_deriv_kms_month = self._get_system_state_derivatives(temp_bodies_k2)
+
+        # --- RK4 Stage k3 ---
+        temp_bodies_k3 = []
+        for i in range(num_bodies):
+            pos_k3_intermediate_AU = y0_pos_AU[i] + (k2_pos_deriv_AU_month[i] * (dt / 2.0))
+            vel_k3_intermediate_kms = y0_vel_kms[i] + (k2_vel_deriv_kms_month[i] * (dt / 2.0))
+            temp_bodies_k3.append(Planetary_Body(name_val=self.bodies[i].name,
+                                                 mass_val=self.bodies[i].mass,
+                                                 pos_vector=pos_k3_intermediate_AU,
+                                                 vel_vector=vel_k3_intermediate_kms))
+        k3_pos_deriv_AU_month, k3_vel_deriv_kms_month = self._get_system_state_derivatives(temp_bodies_k3)
+
+        # --- RK4 Stage k4 ---
+        temp_bodies_k4 = []
+        for i in range(num_bodies):
+            pos_k4_intermediate_AU = y0_pos_AU[i] + (k3_pos_deriv_AU_month[i] * dt)
+            vel_k4_intermediate_kms = y0_vel_kms[i] + (k3_vel_deriv_kms_month[i] * dt)
+            temp_bodies_k4.append(Planetary_Body(name_val=self.bodies[i].name,
+                                                 mass_val=self.bodies[i].mass,
+                                                 pos_vector=pos_k4_intermediate_AU,
+                                                 vel_vector=vel_k4_intermediate_kms))
+        k4_pos_deriv_AU_month, k4_vel_deriv_kms_month = self._get_system_state_derivatives(temp_bodies_k4)
+
+        # --- Update final positions (AU) and velocities (km/s) ---
+        for i in range(num_bodies):
+            # Weighted average of position derivatives (AU/month)
+            avg_pos_deriv_AU_month = (k1_pos_deriv_AU_month[i] + 
+                                     (k2_pos_deriv_AU_month[i] * 2.0) + 
+                                     (k3_pos_deriv_AU_month[i] * 2.0) + 
+                                     k4_pos_deriv_AU_month[i]) / 6.0
+            self.bodies[i].pos = y0_pos_AU[i] + (avg_pos_deriv_AU_month * dt)
+
+            # Weighted average of velocity derivatives (km/(s*month))
+            avg_vel_deriv_kms_month = (k1_vel_deriv_kms_month[i] + 
+                                      (k2_vel_deriv_kms_month[i] * 2.0) + 
+                                      (k3_vel_deriv_kms_month[i] * 2.0) + 
+                                      k4_vel_deriv_kms_month[i]) / 6.0
+            self.bodies[i].velocity = y0_vel_kms[i] + (avg_vel_deriv_kms_month * dt)
+
+        # Keep the arrays in step with the objects so positions and
+        # velocities read the current state on this backend too
+        _, positions, velocities, _ = Body.bodies_to_arrays(self.bodies)
+        self._pos[:] = positions.data
+        self._vel[:] = velocities.data
 
     def _get_system_state_derivatives(self, temp_system_state):
         """
@@ -42,7 +384,8 @@ class Simulation:
                 # force is in MEarth * AU / month^2
                 force_vector = Planetary_Body.calculate_gravitational_force_exerted_by_on(
                     acting_body=acting_body,
-                    target_body=target_body
+                    target_body=target_body,
+                    G=self.G
                 )
                 total_force_on_target_AU_MEarth_month_sq += force_vector
             
@@ -61,107 +404,780 @@ class Simulation:
         return pos_derivatives_AU_month, vel_derivatives_kms_month
 
 
-    def run_simulation(self, total_duration_years):
-        # Data dump timer
+    def iter_states(self, duration, every=1):
+        """
+        Integrates for a simulated duration and yields the state every few
+        steps as the integration goes, without recording or dumping it, so
+        writers, reducers and live plots can consume a run of any length in
+        constant memory. The integration only advances while the consumer
+        asks for more states; stopping the iteration (break, or close() on
+        the generator) leaves the simulation at the last yielded state with
+        its Planetary_Body objects in sync.
+        Args:
+            duration (float): Simulated time to run in years.
+            every (int, optional): Yield every this many steps. The starting
+                and final states are always yielded.
+        Returns:
+            generator: StateSnapshot objects holding read-only copies of the
+                state, starting with step 0 (the current state).
+        """
+        if not isinstance(duration, (int, float)) or duration <= 0:
+            raise ValueError("duration must be a positive number.")
+        if int(every) < 1:
+            raise ValueError("every must be at least 1.")
+        return self._iter_states(int(duration * 12.0 / self.dt_months), int(every))
+
+    def _iter_states(self, num_steps, every):
+        """The generator behind iter_states."""
+        try:
+            yield self._state_snapshot(0)
+            for step_num in range(1, num_steps + 1):
+                self.step()
+                if step_num % every == 0 or step_num == num_steps:
+                    yield self._state_snapshot(step_num)
+        finally:
+            if self.backend == "vectorized":
+                self.sync_bodies()
+
+    def _state_snapshot(self, step_num):
+        """Copies the current state into a StateSnapshot."""
+        if self.backend == "vectorized":
+            positions, velocities = self.positions, self.velocities
+        else:
+            _, positions, velocities, _ = Body.bodies_to_arrays(self.bodies)
+            positions, velocities = positions.data, velocities.data
+        return StateSnapshot(step_num, step_num * self.dt_months, positions, velocities,
+                             self.tp_positions, self.tp_velocities)
+
+    def state_at(self, times):
+        """
+        Evaluates the dense output of the last run at any times, including
+        times between steps. The error is that of the quintic Hermite
+        interpolation between knots (see DenseOutput.error_estimate), which
+        is below the integrator's own error when dense_every is a few steps.
+        Args:
+            times (float or array-like): Times in years since the start of
+                the run.
+        Returns:
+            tuple: (T,N,3) positions in AU and (T,N,3) velocities in km/s.
+        """
+        if self.dense_output is None:
+            raise ValueError("state_at needs a run made with run_simulation(..., dense_every=k).")
+        return self.dense_output.evaluate(np.asarray(times, dtype=float) * 12.0)
+
+    def history_view(self, cache_bytes=None):
+        """
+        Opens the dump of this run lazily. A compressed dump is decoded with
+        the run's codec, so its report() includes the decode throughput.
+        Args:
+            cache_bytes (int, optional): The most bytes of decoded chunks to
+                keep in memory. Defaults to SimIO.HISTORY_CACHE_BYTES.
+        Returns:
+            SimIO.HistoryView: A lazy sequence over the dumped records.
+        """
+        import SimIO
+        return SimIO.HistoryView(self.sim_name, cache_bytes, codec=getattr(self, "_codec", None))
+
+    def run_simulation(self, total_duration_years, record_every=1, final_only=False, dump_format=None,
+                       codec=None, checkpoint_every=None, dense_every=None, diagnostics_every=None,
+                       reducers=None, keep_history=True):
+        """
+        Runs the simulation, recording its state into a preallocated
+        Recorder (self.recorder). Records are dumped to disk by a background
+        writer whenever SimIO.DUMP_BYTES_BUDGET bytes of them are waiting, so
+        the integration only waits for the disk when the writer's queue is
+        full. A checkpoint of the full state is written with every dump, so
+        Simulation.resume can continue the run if it is killed.
+        Args:
+            total_duration_years (float): Simulated time to run.
+            record_every (int, optional): Record every this many steps. The
+                final step is always recorded.
+            final_only (bool, optional): Record only the final state.
+            dump_format (str, optional): "columnar" (.npy chunks that
+                SimIO.MappedHistory memory-maps), "compressed" (columnar
+                chunks encoded by a SimIO.TrajectoryCodec) or "pickle" (lists
+                of Planetary_Body). Defaults to SimIO.DEFAULT_DUMP_FORMAT.
+            codec (SimIO.TrajectoryCodec, optional): The codec for
+                "compressed" dumps. Defaults to a lossless zlib codec.
+            checkpoint_every (int, optional): Also dump and checkpoint every
+                this many steps, on top of the dumps made by the byte budget.
+            dense_every (int, optional): Keep a dense output knot every this
+                many steps (self.dense_output, also saved with the dump), so
+                state_at can evaluate the run at any time. Records can then
+                be sparse or final_only.
+            diagnostics_every (int, optional): Apply the diagnostics reducers
+                to the massive bodies every this many steps and collect their
+                time series in self.diagnostics (a Diagnostics.Diagnostics).
+            reducers (list, optional): Reducer functions for the diagnostics.
+                Defaults to Diagnostics.DEFAULT_REDUCERS (energy, angular
+                momentum, center of mass and pair separations).
+            keep_history (bool, optional): Keep every record in memory and
+                return them. With False the recorder only holds the records
+                not dumped yet (about SimIO.DUMP_BYTES_BUDGET bytes) and
+                reuses their rows after each dump, so memory stays bounded
+                however long the run is; read the history back from the
+                dump with SimIO.HistoryView.
+        Returns:
+            np.ndarray: (n_records,N,3) recorded positions in AU. Empty when
+                keep_history is False.
+        """
         import time
         import SimIO
-        import copy
-        prev_time = time.time()
-        start_time = prev_time
-        prev_step = -1
+        start_time = time.time()
         
         
         if not isinstance(total_duration_years, (int, float)) or total_duration_years <= 0:
             raise ValueError("total_duration_years must be a positive number.")
+        self._dump_format = SimIO.DEFAULT_DUMP_FORMAT if dump_format is None else dump_format
+        if self._dump_format not in SimIO.DUMP_FORMATS:
+            raise ValueError(f"dump_format must be one of {SimIO.DUMP_FORMATS}, got '{self._dump_format}'.")
+        self._codec = None
+        if self._dump_format == "compressed":
+            self._codec = SimIO.TrajectoryCodec() if codec is None else codec
 
         total_duration_months = total_duration_years * 12.0
         num_simulation_steps = int(total_duration_months / self.dt_months)
-        dt = self.dt_months # RK4 time step in months
-        num_bodies = len(self.bodies)
+        dt = self.dt_months # Integrator time step in months
         
         print(f"Running N-body simulation for {total_duration_years:.2f} years ({total_duration_months:.2f} months) "
-              f"with a {self.dt_months:.3f}-month time step ({num_simulation_steps} steps) using RK4...")
+              f"with a {self.dt_months:.3f}-month time step ({num_simulation_steps} steps) using {self.integrator}...")
         
-        initial_positions_snapshot = [body.pos.to_list() for body in self.bodies]
-        self.position_history.append(initial_positions_snapshot)
-        sim_hist = [copy.deepcopy(self.bodies)]
+        self._keep_history = bool(keep_history)
+        self.recorder = Recorder(self.body_names, self.masses, num_simulation_steps, dt,
+                                 record_every=record_every, final_only=final_only,
+                                 capacity=None if self._keep_history else self._record_capacity())
+        self.dense_output = None
+        if dense_every is not None:
+            self.dense_output = DenseOutput(self.body_names, num_simulation_steps, dt, dense_every)
+        self.diagnostics = None
+        if diagnostics_every is not None:
+            self.diagnostics = Diagnostics.Diagnostics(num_simulation_steps, dt, diagnostics_every, reducers)
+        self._dumped_records = 0
+        self._checkpoint_every = checkpoint_every
+        SimIO.remove_checkpoint(self.sim_name)
+        SimIO.remove_dense_output(self.sim_name)
+        if self._dump_format != "pickle":
+            SimIO.start_columnar_dump(self.sim_name, self.body_names, self.masses, dt,
+                                      {'integrator': self.integrator, 'G': self.G,
+                                       'num_steps': num_simulation_steps}, codec=self._codec)
+        else:
+            SimIO.clear_dump(self.sim_name)
+        return self._run(0, start_time)
+
+    @classmethod
+    def resume(cls, sim_name):
+        """
+        Continues a run from its latest checkpoint. Chunks dumped after the
+        checkpoint are discarded, the records before it are read back into
+        the recorder, and the rest of the run is appended to the same dump
+        series as if it had never stopped. Adaptive and block step
+        integrators restart their step size control at the checkpoint.
+        Args:
+            sim_name (str): The name of the simulation to continue.
+        Returns:
+            np.ndarray: (n_records,N,3) recorded positions in AU for the
+                whole run.
+        """
+        import time
+        import SimIO
+        start_time = time.time()
+        positions, velocities, masses, settings = SimIO.read_checkpoint(sim_name)
+        simulation = cls._from_checkpoint(positions, velocities, masses, settings)
+        return simulation._continue_run(settings, settings['num_steps'], start_time)
+
+    @classmethod
+    def fork(cls, source, variants, total_duration_years=None):
+        """
+        Creates what-if variants of a simulation from its current state. Each
+        variant gets its own dump folder that shares the source's recorded
+        history on disk (hard linked chunks, so nothing is copied or
+        recomputed) and a checkpoint holding the changed state. Continue a
+        variant with Simulation.resume(variant_name).
+        Args:
+            source (Simulation or str): A Simulation (its state after its
+                last run, or its starting state if it has not run) or the
+                name of a simulation whose latest checkpoint to fork from.
+            variants (dict): Maps each variant name to a dict of changes:
+                "remove": a list of body names to remove,
+                "masses": {body name: new mass in Earth masses},
+                "swap": a list of (name, name) pairs whose positions swap,
+                "kick": {body name: (3,) velocity change in km/s}.
+            total_duration_years (float, optional): Simulated time from the
+                start of the source run that the variants run to when
+                resumed. Defaults to the source run's duration.
+        Returns:
+            dict: Variant name to a Simulation holding the variant's state.
+        """
+        import SimIO
+        if isinstance(source, Simulation):
+            positions, velocities, settings = source._checkpoint_state(
+                0 if source.recorder is None else source.recorder.num_steps)
+            masses = source.masses.copy()
+        else:
+            positions, velocities, masses, settings = SimIO.read_checkpoint(source)
+        parent_name = settings['sim_name']
+        if total_duration_years is not None:
+            settings['num_steps'] = int(total_duration_years * 12.0 / settings['dt_months'])
+            if settings['num_steps'] < settings['step']:
+                raise ValueError("total_duration_years ends before the state being forked.")
+
+        forks = {}
+        for variant_name, changes in variants.items():
+            unknown = set(changes) - {"remove", "masses", "swap", "kick"}
+            if unknown:
+                raise ValueError(f"Unknown changes {sorted(unknown)} for variant '{variant_name}'.")
+            names = list(settings['names'])
+            num_massive = len(names)
+            variant_pos, variant_vel, variant_masses = positions.copy(), velocities.copy(), masses.copy()
+            for name, mass in changes.get("masses", {}).items():
+                variant_masses[names.index(name)] = mass
+            for first, second in changes.get("swap", []):
+                i, j = names.index(first), names.index(second)
+                variant_pos[[i, j]] = variant_pos[[j, i]]
+            for name, kick in changes.get("kick", {}).items():
+                variant_vel[names.index(name)] += np.asarray(kick, dtype=float)
+            removed = [names.index(name) for name in changes.get("remove", [])]
+            columns = [i for i in range(num_massive) if i not in removed]
+            keep = columns + list(range(num_massive, len(variant_pos)))
+
+            variant_settings = dict(settings, sim_name=variant_name, names=[names[i] for i in columns])
+            variant_pos, variant_vel, variant_masses = variant_pos[keep], variant_vel[keep], variant_masses[columns]
+            if settings['records']:
+                if not SimIO.has_columnar_dump(parent_name):
+                    raise ValueError("Forking a recorded run needs a columnar or compressed dump.")
+                SimIO.fork_dump(parent_name, variant_name, settings['records'], variant_settings['names'],
+                                variant_masses, columns)
+            SimIO.write_checkpoint(variant_name, variant_pos, variant_vel, variant_masses, variant_settings)
+            forks[variant_name] = cls._from_checkpoint(variant_pos, variant_vel, variant_masses, variant_settings)
+        return forks
+
+    def extend(self, additional_years):
+        """
+        Runs this simulation's dump on for more simulated time, starting from
+        the last dumped state instead of step 0. Step numbers carry on from
+        the end of the earlier run and the new records are appended to its
+        dump series (and manifest), so the result reads as one longer run.
+        The state comes from the run's checkpoint. Dumps written before
+        checkpoints existed are continued from their last record, using this
+        simulation's settings for anything the dump does not hold. The
+        recording, dump and checkpoint settings are the earlier run's, but
+        this simulation must have been built with the same time step, G,
+        backend, integrator and force solver settings, and a dump whose
+        format does not match the run's (left by another run of the same
+        name) is not appended to; either raises a ValueError. A dense output
+        saved by the earlier run is extended with knots at the same spacing,
+        so state_at covers the whole run.
+        Args:
+            additional_years (float): Simulated time to add.
+        Returns:
+            np.ndarray: (n_records,N,3) recorded positions in AU for the
+                whole run.
+        """
+        import time
+        import SimIO
+        start_time = time.time()
+        if not isinstance(additional_years, (int, float)) or additional_years <= 0:
+            raise ValueError("additional_years must be a positive number.")
+        if SimIO.has_checkpoint(self.sim_name):
+            positions, velocities, masses, settings = SimIO.read_checkpoint(self.sim_name)
+        else:
+            positions, velocities, masses, settings = self._last_dumped_state()
+        run_format = getattr(self, "_dump_format", settings['dump_format'])
+        dumped_format = SimIO.dump_format(self.sim_name)
+        if settings['records'] and not dumped_format == settings['dump_format'] == run_format:
+            raise ValueError(f"The dump of '{self.sim_name}' holds {dumped_format} records, but the run "
+                             f"being extended wrote {run_format} records.")
+        changed = [key for key in ('dt_months', 'G', 'backend', 'integrator', 'force_solver', 'theta',
+                                   'tolerance', 'hermite_eta')
+                   if getattr(self, key) != settings[key]]
+        if changed:
+            raise ValueError(f"'{self.sim_name}' was run with other {', '.join(changed)} settings than this "
+                             f"simulation has. Build it with the run's settings, or use Simulation.resume.")
+        dense = SimIO.read_dense_output(self.sim_name) if SimIO.has_dense_output(self.sim_name) else None
+        if dense is not None and dense.knot_steps[dense.count - 1] != settings['step']:
+            dense = None # Saved by a run that did not end at the checkpoint
+        self._load_checkpoint_state(positions, velocities, masses, settings)
+        num_steps = settings['step'] + int(additional_years * 12.0 / self.dt_months)
+        return self._continue_run(settings, num_steps, start_time, dense)
+
+    def _last_dumped_state(self):
+        """
+        Builds checkpoint style state and settings from the last record of a
+        dump that has no checkpoint.
+        """
+        import SimIO
+        if self.num_test_particles:
+            raise ValueError("Dumps do not hold test particles, so extending them needs a checkpoint.")
+        steps, positions, velocities = SimIO.read_records(self.sim_name)
+        if not len(positions):
+            raise FileNotFoundError(f"No dumped records found for '{self.sim_name}'.")
+        step = len(positions) - 1 if steps is None else int(steps[-1])
+        _, _, settings = self._checkpoint_state(step)
+        masses = self.masses.copy()
+        if SimIO.has_columnar_dump(self.sim_name):
+            metadata = SimIO.read_metadata(self.sim_name)
+            masses = np.array(metadata['masses'])
+            settings.update(names=metadata['names'], dt_months=metadata['dt_months'],
+                            dump_format=metadata['format'], codec=metadata.get('codec'))
+        else:
+            settings['dump_format'] = "pickle"
+        settings.update(num_steps=step, records=len(positions), final_only=False,
+                        record_every=int(steps[1] - steps[0]) if steps is not None and len(steps) > 1 else 1)
+        return positions[-1], velocities[-1], masses, settings
+
+    @classmethod
+    def _from_checkpoint(cls, positions, velocities, masses, settings):
+        """Builds a Simulation holding a checkpoint's state and settings."""
+        num_massive = len(masses)
+        bodies = Body.arrays_to_bodies(masses, positions[:num_massive], velocities[:num_massive], settings['names'])
+        simulation = cls(bodies, settings['dt_months'], settings['sim_name'], backend=settings['backend'],
+                         force_solver=settings['force_solver'], theta=settings['theta'],
+                         tile_size=settings['tile_size'], num_threads=settings['num_threads'],
+                         integrator=settings['integrator'], tolerance=settings['tolerance'],
+                         hermite_eta=settings['hermite_eta'], G=settings['G'])
+        simulation._load_checkpoint_state(positions, velocities, masses, settings)
+        return simulation
+
+    def _load_checkpoint_state(self, positions, velocities, masses, settings):
+        """
+        Replaces the state (test particles included), time step, G,
+        integrator and dump settings with a checkpoint's.
+        """
+        import SimIO
+        num_massive = len(masses)
+        self.bodies = Body.arrays_to_bodies(masses, positions[:num_massive], velocities[:num_massive],
+                                            settings['names'])
+        self.body_names = list(settings['names'])
+        self.tp_names = list(settings['tp_names'])
+        self.masses = np.array(masses, dtype=float)
+        self._num_massive = num_massive
+        self._pos = np.array(positions, dtype=float)
+        self._vel = np.array(velocities, dtype=float)
+        self.dt_months = float(settings['dt_months'])
+        self.G = float(settings['G'])
+        self.integrator = settings['integrator']
+        self.tolerance = float(settings['tolerance'])
+        self.hermite_eta = float(settings['hermite_eta'])
+        self._replace_force_solver()
+        self._stepper = None
+        self._dump_format = settings['dump_format']
+        self._codec = SimIO.TrajectoryCodec(**settings['codec']) if settings['codec'] else None
+        self._checkpoint_every = settings['checkpoint_every']
+        self._keep_history = settings.get('keep_history', True)
+
+    def _continue_run(self, settings, num_steps, start_time, dense=None):
+        """
+        Runs on from a checkpoint's step to num_steps, appending to the dump
+        series the checkpoint belongs to, and to the dense output dense when
+        one is given.
+        """
+        import SimIO
+        num_records = settings['records']
+        previous = None
+        if num_records:
+            SimIO.discard_records(self.sim_name, num_records)
+            if self._keep_history:
+                previous = SimIO.read_records(self.sim_name, num_records)
+            else:
+                # Only the step numbers are needed to carry on the schedule
+                steps = SimIO.read_record_steps(self.sim_name, num_records)
+                if steps is None:
+                    steps = Recorder.schedule(num_steps, settings['record_every'],
+                                              settings['final_only'])[:num_records]
+                previous = (steps, None, None)
+            if self._dump_format != "pickle":
+                SimIO.update_metadata(self.sim_name, {'num_steps': num_steps})
+        elif self._dump_format != "pickle":
+            SimIO.start_columnar_dump(self.sim_name, self.body_names, self.masses, self.dt_months,
+                                      {'integrator': self.integrator, 'G': self.G, 'num_steps': num_steps},
+                                      codec=self._codec)
+        else:
+            SimIO.clear_dump(self.sim_name)
+        self.recorder = Recorder(self.body_names, self.masses, num_steps, self.dt_months,
+                                 record_every=settings['record_every'], final_only=settings['final_only'],
+                                 previous=previous,
+                                 capacity=None if self._keep_history else self._record_capacity())
+        self.dense_output = None
+        if dense is not None:
+            self.dense_output = DenseOutput(self.body_names, num_steps, self.dt_months, dense.every, previous=dense)
+        self.diagnostics = None
+        self._dumped_records = num_records
+
+        print(f"Continuing {self.sim_name} from step {settings['step']} to step {num_steps} using {self.integrator}...")
+        return self._run(settings['step'], start_time)
+
+    def _run(self, first_step, start_time):
+        """
+        Integrates from first_step to the end of the recorder's run, dumps
+        the remaining records with a final checkpoint and reports the run.
+        """
+        import SimIO
+        with SimIO.AsyncDumpWriter() as writer:
+            self._run_steps(self.recorder.num_steps, writer, start_time, first_step)
+            print("Dumping Data")
+            self._dump_records(writer)
+            self._checkpoint(writer, self.recorder.num_steps)
+            if self.dense_output is not None:
+                writer.submit(SimIO.write_dense_output, self.sim_name, self.dense_output)
         
-        for step_num in range(num_simulation_steps):
-            if num_simulation_steps > 100 and step_num > 0 and step_num % (num_simulation_steps // 20) == 0:
-                 print(f"  Processed step {step_num}/{num_simulation_steps} ({(step_num/num_simulation_steps*100):.0f}%), Elapsed time: {(time.time() - start_time):.0f}")
-            
-            y0_pos_AU = [body.pos.copy() for body in self.bodies]       # AU
-            y0_vel_kms = [body.velocity.copy() for body in self.bodies] # km/s
-
-            # --- RK4 Stage k1 ---
-            # Derivatives at current state (self.bodies)
-            k1_pos_deriv_AU_month, k1_vel_deriv_kms_month = self._get_system_state_derivatives(self.bodies)
-
-            # --- RK4 Stage k2 ---
-            temp_bodies_k2 = []
-            for i in range(num_bodies):
-                pos_k2_intermediate_AU = y0_pos_AU[i] + (k1_pos_deriv_AU_month[i] * (dt / 2.0))
-                vel_k2_intermediate_kms = y0_vel_kms[i] + (k1_vel_deriv_kms_month[i] * (dt / 2.0))
-                temp_bodies_k2.append(Planetary_Body(name_val=self.bodies[i].name, 
-                                                     mass_val=self.bodies[i].mass, 
-                                                     pos_vector=pos_k2_intermediate_AU, 
-                                                     vel_vector=vel_k2_intermediate_kms))
-            k2_pos_deriv_AU_month, k2_vel_deriv_kms_month = self._get_system_state_derivatives(temp_bodies_k2)
-
-            # --- RK4 Stage k3 ---
-            temp_bodies_k3 = []
-            for i in range(num_bodies):
-                pos_k3_intermediate_AU = y0_pos_AU[i] + (k2_pos_deriv_AU_month[i] * (dt / 2.0))
-                vel_k3_intermediate_kms = y0_vel_kms[i] + (k2_vel_deriv_kms_month[i] * (dt / 2.0))
-                temp_bodies_k3.append(Planetary_Body(name_val=self.bodies[i].name,
-                                                     mass_val=self.bodies[i].mass,
-                                                     pos_vector=pos_k3_intermediate_AU,
-                                                     vel_vector=vel_k3_intermediate_kms))
-            k3_pos_deriv_AU_month, k3_vel_deriv_kms_month = self._get_system_state_derivatives(temp_bodies_k3)
-
-            # --- RK4 Stage k4 ---
-            temp_bodies_k4 = []
-            for i in range(num_bodies):
-                pos_k4_intermediate_AU = y0_pos_AU[i] + (k3_pos_deriv_AU_month[i] * dt)
-                vel_k4_intermediate_kms = y0_vel_kms[i] + (k3_vel_deriv_kms_month[i] * dt)
-                temp_bodies_k4.append(Planetary_Body(name_val=self.bodies[i].name,
-                                                     mass_val=self.bodies[i].mass,
-                                                     pos_vector=pos_k4_intermediate_AU,
-                                                     vel_vector=vel_k4_intermediate_kms))
-            k4_pos_deriv_AU_month, k4_vel_deriv_kms_month = self._get_system_state_derivatives(temp_bodies_k4)
-
-            # --- Update final positions (AU) and velocities (km/s) ---
-            for i in range(num_bodies):
-                # Weighted average of position derivatives (AU/month)
-                avg_pos_deriv_AU_month = (k1_pos_deriv_AU_month[i] + 
-                                         (k2_pos_deriv_AU_month[i] * 2.0) + 
-                                         (k3_pos_deriv_AU_month[i] * 2.0) + 
-                                         k4_pos_deriv_AU_month[i]) / 6.0
-                self.bodies[i].pos = y0_pos_AU[i] + (avg_pos_deriv_AU_month * dt)
-
-                # Weighted average of velocity derivatives (km/(s*month))
-                avg_vel_deriv_kms_month = (k1_vel_deriv_kms_month[i] + 
-                                          (k2_vel_deriv_kms_month[i] * 2.0) + 
-                                          (k3_vel_deriv_kms_month[i] * 2.0) + 
-                                          k4_vel_deriv_kms_month[i]) / 6.0
-                self.bodies[i].velocity = y0_vel_kms[i] + (avg_vel_deriv_kms_month * dt)
-            
-            current_positions_snapshot = [body.pos.to_list() for body in self.bodies]
-            self.position_history.append(current_positions_snapshot)
-            sim_hist.append(copy.deepcopy(self.bodies))
-            
-            # Check if dump timer has been met
-            if (time.time() - prev_time >= SimIO.MIN_DUMP_TIME):
-                print("Dumping Data")
-                SimIO.dump_history_pickle(sim_hist, self.sim_name, prev_step +1, step_num)
-                prev_step = step_num
-                prev_time = time.time()
-                sim_hist = []
+        if self.backend == "vectorized":
+            self.sync_bodies()
+        stats = self.integrator_stats()
+        if "accepted_steps" in stats:
+            print(f"Adaptive steps: {stats['accepted_steps']} accepted, {stats['rejected_steps']} rejected")
+        if "levels" in stats:
+            print(f"Block steps: {stats['body_steps']} body steps, {stats['force_evaluations']:.0f} full force evaluations")
+        if self._codec is not None:
+            report = self._codec.report()
+            print(f"Compressed dump: {report['ratio']:.2f}x smaller, encoded at {report['encode_mb_per_s']:.0f} MB/s")
+        if self.diagnostics is not None:
+            for name, value in self.diagnostics.drift().items():
+                print(f"Diagnostics: {name} drift {value:.3e}")
         
-        print("Dumping Data")
         print("Simulation complete.")
-        SimIO.dump_history_pickle(sim_hist, self.sim_name, prev_step +1, num_simulation_steps-1)
-        return np.array(self.position_history)
+        self.position_history = self.recorder.positions
+        return self.position_history
+
+    def _run_steps(self, num_simulation_steps, writer, start_time, first_step=0):
+        """
+        The integration loop of run_simulation. Records the requested steps
+        and hands full chunks of records to the dump writer, each followed
+        by a checkpoint.
+        """
+        import time
+        import SimIO
+        dt = self.dt_months
+        record_nbytes = self.recorder.data[0].nbytes
+        if self.integrator == "kepler":
+            # Every recorded state comes from the closed-form orbit
+            recorder = self.recorder
+            if recorder.count == len(recorder.record_steps):
+                return
+            if self.dense_output is not None:
+                knot_steps = self.dense_output.knot_steps[self.dense_output.count:]
+                knot_pos, knot_vel = self.kepler_states((knot_steps - first_step) * dt)
+                for i in range(len(knot_pos)):
+                    self.dense_output.add(knot_pos[i], knot_vel[i], self._knot_accelerations(knot_pos[i]))
+            if self.diagnostics is not None:
+                eval_pos, eval_vel = self.kepler_states((self.diagnostics.eval_steps - first_step) * dt)
+                for i in range(len(eval_pos)):
+                    self.diagnostics.evaluate(eval_pos[i], eval_vel[i], self.masses, self.G)
+
+            # One dump's worth of records at a time, as many as fit in the
+            # recorder's free rows and the byte budget, and none past the
+            # next checkpoint step
+            budget_rows = max(1, -(-SimIO.DUMP_BYTES_BUDGET // record_nbytes))
+            step_num = first_step
+            while recorder.count < len(recorder.record_steps):
+                free_rows = len(recorder.data) - (recorder.count - recorder.offset)
+                batch = max(1, min(free_rows, budget_rows - (recorder.count - self._dumped_records)))
+                record_steps = recorder.record_steps[recorder.count:recorder.count + batch]
+                batch_steps = record_steps
+                if self._checkpoint_every:
+                    checkpoint_step = (step_num // self._checkpoint_every + 1) * self._checkpoint_every
+                    if checkpoint_step < record_steps[-1]:
+                        record_steps = record_steps[record_steps <= checkpoint_step]
+                        batch_steps = np.append(record_steps, checkpoint_step)
+                kepler_pos, kepler_vel = self.kepler_states((batch_steps - step_num) * dt)
+                for i in range(len(record_steps)):
+                    recorder.record(kepler_pos[i], kepler_vel[i])
+                self._pos[:] = kepler_pos[-1]
+                self._vel[:] = kepler_vel[-1]
+                step_num = int(batch_steps[-1])
+                if recorder.count < len(recorder.record_steps):
+                    self._dump_records(writer)
+                    self._checkpoint(writer, step_num)
+        else:
+            if self.recorder.wants(first_step):
+                self._record()
+            if self.dense_output is not None and self.dense_output.wants(first_step):
+                self._add_knot()
+            if self.diagnostics is not None and self.diagnostics.wants(first_step):
+                self.diagnostics.evaluate(*self._massive_state(), self.masses, self.G)
+            for step_num in range(first_step + 1, num_simulation_steps + 1):
+                if num_simulation_steps > 100 and step_num % (num_simulation_steps // 20) == 0:
+                     print(f"  Processed step {step_num}/{num_simulation_steps} ({(step_num/num_simulation_steps*100):.0f}%), Elapsed time: {(time.time() - start_time):.0f}")
+                
+                self.step(dt)
+                if self.dense_output is not None and self.dense_output.wants(step_num):
+                    self._add_knot()
+                if self.diagnostics is not None and self.diagnostics.wants(step_num):
+                    self.diagnostics.evaluate(*self._massive_state(), self.masses, self.G)
+                if self.recorder.wants(step_num):
+                    self._record()
+                    
+                    # Flush once enough records are waiting or the recorder is full
+                    if (self.recorder.count - self._dumped_records) * record_nbytes >= SimIO.DUMP_BYTES_BUDGET \
+                            or (self.recorder.full and step_num < num_simulation_steps):
+                        self._dump_records(writer)
+                        self._checkpoint(writer, step_num)
+                        continue
+                if self._checkpoint_every and step_num % self._checkpoint_every == 0:
+                    self._dump_records(writer)
+                    self._checkpoint(writer, step_num)
+
+    def _checkpoint(self, writer, step_num):
+        """
+        Hands a checkpoint of the current state to the dump writer. It is
+        queued after the records dumped so far, so on disk a checkpoint never
+        runs ahead of the records.
+        """
+        import SimIO
+        positions, velocities, settings = self._checkpoint_state(step_num)
+        writer.submit(SimIO.write_checkpoint, self.sim_name, positions, velocities, self.masses.copy(), settings)
+
+    def _checkpoint_state(self, step_num):
+        """
+        Copies the state and collects the settings a checkpoint at step_num
+        holds. A simulation that has not run yet is at step 0 of an empty run.
+        """
+        import SimIO
+        if self.backend == "vectorized":
+            positions, velocities = self._pos.copy(), self._vel.copy()
+        else:
+            _, positions, velocities, _ = Body.bodies_to_arrays(self.bodies)
+            positions, velocities = positions.data, velocities.data
+        recorder = self.recorder
+        codec = getattr(self, "_codec", None)
+        settings = {'sim_name': self.sim_name, 'step': int(step_num),
+                    'num_steps': 0 if recorder is None else recorder.num_steps,
+                    'records': 0 if recorder is None else recorder.count,
+                    'time_months': step_num * self.dt_months,
+                    'dt_months': self.dt_months, 'G': self.G, 'integrator': self.integrator,
+                    'backend': self.backend, 'force_solver': self.force_solver, 'theta': self.theta,
+                    'tile_size': self.tile_size, 'num_threads': self.num_threads,
+                    'tolerance': self.tolerance, 'hermite_eta': self.hermite_eta,
+                    'record_every': 1 if recorder is None else recorder.record_every,
+                    'final_only': False if recorder is None else recorder.final_only,
+                    'checkpoint_every': getattr(self, "_checkpoint_every", None),
+                    'keep_history': getattr(self, "_keep_history", True),
+                    'dump_format': getattr(self, "_dump_format", SimIO.DEFAULT_DUMP_FORMAT),
+                    'codec': None if codec is None else codec.settings(),
+                    'names': list(self.body_names), 'tp_names': list(self.tp_names)}
+        return positions, velocities, settings
+
+    def _record(self):
+        """Records the current state of the massive bodies."""
+        if self.backend == "vectorized":
+            self.recorder.record(self.positions, self.velocities)
+        else:
+            _, positions, velocities, _ = Body.bodies_to_arrays(self.bodies)
+            self.recorder.record(positions.data, velocities.data)
+
+    def _massive_state(self):
+        """The current positions and velocities of the massive bodies."""
+        if self.backend == "vectorized":
+            return self.positions, self.velocities
+        _, positions, velocities, _ = Body.bodies_to_arrays(self.bodies)
+        return positions.data, velocities.data
+
+    def _add_knot(self):
+        """Adds the current state of the massive bodies as a dense output knot."""
+        positions, velocities = self._massive_state()
+        self.dense_output.add(positions, velocities, self._knot_accelerations(positions))
+
+    def _knot_accelerations(self, positions):
+        """Mutual accelerations of the massive bodies in AU/month^2."""
+        return self._force_solver.accelerations(positions, positions, self.masses, self.G)
+
+    def _dump_records(self, writer):
+        """
+        Hands the records made since the last dump to the dump writer. A
+        recorder keeping the whole history never overwrites a record, so the
+        writer reads them in place. Otherwise the writer gets a copy and the
+        rows are released for the next records.
+        """
+        import SimIO
+        recorder = self.recorder
+        first_record = self._dumped_records
+        held = first_record - recorder.offset
+        steps = recorder.steps[held:]
+        positions, velocities = recorder.positions[held:], recorder.velocities[held:]
+        if not self._keep_history:
+            positions, velocities = positions.copy(), velocities.copy()
+        if recorder.count > first_record and self._dump_format != "pickle":
+            writer.submit(SimIO.dump_records_columnar, self.sim_name, first_record,
+                          steps, positions, velocities, self._codec)
+        elif recorder.count > first_record:
+            writer.submit(SimIO.dump_records_pickle, self.sim_name, recorder.names, recorder.masses,
+                          positions, velocities, first_record, recorder.count - 1)
+        self._dumped_records = recorder.count
+        if not self._keep_history:
+            recorder.release()
+
+    def _record_capacity(self):
+        """Records a recorder that does not keep the history holds: enough
+        for one dump of SimIO.DUMP_BYTES_BUDGET bytes."""
+        import SimIO
+        record_nbytes = len(self.body_names) * 6 * 8
+        return max(1, -(-SimIO.DUMP_BYTES_BUDGET // record_nbytes))
+
+class EnsembleSimulation:
+    """
+    Runs E independent systems with the same number of bodies N side by side.
+    Time step is in months. Positions are AU, Velocities are km/s.
+
+    Positions and velocities are stacked into (E,N,3) arrays and masses into
+    an (E,N) array, so every integrator stage is one vectorized force
+    evaluation for all members together. Each member may have its own
+    masses, gravitational constant G and time step, which makes parameter
+    sweeps and Monte-Carlo studies cost about as much interpreter overhead as
+    a single simulation. G is in AU^3/(MEarth * month^2), or per day^2 with
+    G_units="days". Bodies only pull on bodies in their own member system.
+    """
+    def __init__(self, systems, time_step_months=0.1, G=None, name="Ensemble", integrator="rk4", G_units="months"):
+        systems = [list(system) for system in systems]
+        if not systems:
+            raise ValueError("An ensemble needs at least one system.")
+        if not all(isinstance(pb, Planetary_Body) for system in systems for pb in system):
+            raise TypeError("All items must be Planetary_Body instances.")
+        if len({len(system) for system in systems}) != 1:
+            raise ValueError("Every system in an ensemble must have the same number of bodies.")
+        if integrator not in ENSEMBLE_INTEGRATORS:
+            raise ValueError(f"integrator must be one of {ENSEMBLE_INTEGRATORS}, got '{integrator}'.")
+
+        self.num_members = len(systems)
+        self.sim_name = name
+        self.integrator = integrator
+        self.body_names = [[body.name for body in system] for system in systems]
+        arrays = [Body.bodies_to_arrays(system) for system in systems]
+        self.masses = np.array([masses for masses, _, _, _ in arrays])
+        self._pos = np.array([positions.data for _, positions, _, _ in arrays]).reshape(self.num_members, -1, 3)
+        self._vel = np.array([velocities.data for _, _, velocities, _ in arrays]).reshape(self.num_members, -1, 3)
+
+        # One time step and one G per member
+        self.dt_months = np.array(np.broadcast_to(np.asarray(time_step_months, dtype=float),
+                                                  (self.num_members,)))
+        if np.any(self.dt_months <= 0):
+            raise ValueError("time_step_months must be positive.")
+        G = Body.G_ASTRO_MONTHS if G is None else Body.G_to_months(np.asarray(G, dtype=float), G_units)
+        self.G = np.array(np.broadcast_to(np.asarray(G, dtype=float), (self.num_members,)))
+
+        self.position_history = None
+        self.velocity_history = None
+        self.record_steps = None
+        self._stepper = Integrators.INTEGRATORS[integrator](self)
+
+    #------------------------------ Array State -------------------------------
+    @property
+    def positions(self):
+        """(E,N,3) array of body positions in AU."""
+        return self._pos
+
+    @property
+    def velocities(self):
+        """(E,N,3) array of body velocities in km/s."""
+        return self._vel
+
+    def _accelerations(self, positions, out=None):
+        """
+        Gravitational acceleration on every body of every member in AU/month^2.
+        Args:
+            positions (np.ndarray): (E,N,3) positions in AU.
+            out (np.ndarray, optional): (E,N,3) array to write the result into.
+        Returns:
+            np.ndarray: (E,N,3) accelerations in AU/month^2.
+        """
+        return Forces.ensemble_accelerations(positions, self.masses, self.G, out=out)
+
+    def member_bodies(self, member):
+        """
+        Args:
+            member (int): Index of the member system.
+        Returns:
+            list: New Planetary_Body objects holding the member's current state.
+        """
+        return Body.arrays_to_bodies(self.masses[member], self._pos[member], self._vel[member],
+                                     self.body_names[member])
+
+    #------------------------------- Stepping ---------------------------------
+    def step(self, dt=None):
+        """
+        Advances every member in place by one integrator step.
+        Args:
+            dt (float or np.ndarray, optional): Step in months, either one
+                value for all members or an (E,) array. Members with a step
+                of 0 are left unchanged. Defaults to self.dt_months.
+        """
+        dt = self.dt_months if dt is None else dt
+        dt = np.broadcast_to(np.asarray(dt, dtype=float), (self.num_members,))
+        self._stepper.step(dt[:, np.newaxis, np.newaxis])
+
+    def run_simulation(self, total_duration_years, record_every=1):
+        """
+        Runs every member for the same simulated duration using its own time
+        step. Members with longer steps finish in fewer steps and are then
+        held still while the others catch up.
+        Args:
+            total_duration_years (float): Simulated time for every member.
+            record_every (int, optional): Record the state every this many
+                steps. The initial and final states are always recorded.
+        Returns:
+            np.ndarray: (R,E,N,3) recorded positions in AU. Record r of
+                member e is at time self.record_steps[r, e] * dt_months[e].
+        """
+        if not isinstance(total_duration_years, (int, float)) or total_duration_years <= 0:
+            raise ValueError("total_duration_years must be a positive number.")
+        if record_every < 1:
+            raise ValueError("record_every must be at least 1.")
+
+        member_steps = (total_duration_years * 12.0 / self.dt_months).astype(int)
+        num_simulation_steps = int(member_steps.max())
+        print(f"Running {self.num_members} member ensemble for {total_duration_years:.2f} years "
+              f"({num_simulation_steps} steps) using {self.integrator}...")
+
+        positions = [self._pos.copy()]
+        velocities = [self._vel.copy()]
+        steps = [np.zeros(self.num_members, dtype=int)]
+        for step_num in range(1, num_simulation_steps + 1):
+            self.step(np.where(step_num <= member_steps, self.dt_months, 0.0))
+            if step_num % record_every == 0 or step_num == num_simulation_steps:
+                positions.append(self._pos.copy())
+                velocities.append(self._vel.copy())
+                steps.append(np.minimum(step_num, member_steps))
+
+        self.position_history = np.array(positions)
+        self.velocity_history = np.array(velocities)
+        self.record_steps = np.array(steps)
+        print("Ensemble complete.")
+        return self.position_history
+
+    def dump_members(self, member_names=None, dump_format=None, codec=None):
+        """
+        Writes each member's recorded history to its own dump folder so it
+        can be reloaded and animated like a normal Simulation.
+        Args:
+            member_names (list, optional): Dump name for each member. Defaults
+                to "<name>_<index>".
+            dump_format (str, optional): "columnar", "compressed" or
+                "pickle". Defaults to SimIO.DEFAULT_DUMP_FORMAT.
+            codec (SimIO.TrajectoryCodec, optional): The codec for
+                "compressed" dumps. Defaults to a lossless zlib codec.
+        """
+        import SimIO
+        if self.position_history is None:
+            raise RuntimeError("Run the ensemble before dumping it.")
+        if member_names is None:
+            member_names = [f"{self.sim_name}_{e}" for e in range(self.num_members)]
+        dump_format = SimIO.DEFAULT_DUMP_FORMAT if dump_format is None else dump_format
+        if dump_format == "compressed" and codec is None:
+            codec = SimIO.TrajectoryCodec()
+        elif dump_format != "compressed":
+            codec = None
+        for e, member_name in enumerate(member_names):
+            # Drop the repeated records of members that finished early
+            records = np.flatnonzero(np.r_[True, np.diff(self.record_steps[:, e]) > 0])
+            if dump_format != "pickle":
+                SimIO.start_columnar_dump(member_name, self.body_names[e], self.masses[e], self.dt_months[e],
+                                          {'integrator': self.integrator, 'G': float(self.G[e])}, codec=codec)
+                SimIO.dump_records_columnar(member_name, 0, self.record_steps[records, e],
+                                            self.position_history[records, e], self.velocity_history[records, e],
+                                            codec)
+            else:
+                SimIO.clear_dump(member_name)
+                SimIO.dump_records_pickle(member_name, self.body_names[e], self.masses[e],
+                                          self.position_history[records, e], self.velocity_history[records, e],
+                                          0, len(records) - 1)
 
 if __name__ == "__main__":
     print("Simulation.py example using months and km/s:")
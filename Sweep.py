@@ -0,0 +1,104 @@
+# sweep.py
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import Body
+from Simulation import Simulation
+
+#==============================================================================
+#                                 Package Methods
+#==============================================================================
+
+#------------------------------ Parameter Grid --------------------------------
+def parameter_grid(scenario_files, G_values=(None,), time_steps=(0.1,), perturbations=None):
+    """Get every combination of the sweep parameters.
+
+    Method Arguments:
+    * scenario_files: A list of starting data CSV files.
+    * G_values: A list of gravitational constants. None means the default
+      Body.G_ASTRO_MONTHS.
+    * time_steps: A list of time steps in months.
+    * perturbations: An optional dict mapping a name to a function that takes
+      the list of bodies read from the scenario file and changes it in place.
+      The functions must be defined at the top level of a module so they can
+      be sent to the worker processes.
+
+    Output:
+    * A list of (scenario_file, G, time_step, perturbation_name) keys.
+      perturbation_name is None for the unperturbed system.
+    """
+    perturbation_names = [None] if not perturbations else list(perturbations)
+    return list(itertools.product(scenario_files, G_values, time_steps, perturbation_names))
+
+
+
+#------------------------------- Sweep Runner ---------------------------------
+def run_sweep(scenario_files, total_duration_years, G_values=(None,), time_steps=(0.1,),
+              perturbations=None, max_workers=None, G_units="months", dump_names=None,
+              **simulation_options):
+    """Run a simulation for every point of a parameter grid, spread over a
+    pool of processes.
+
+    Method Arguments:
+    * scenario_files: A list of starting data CSV files.
+    * total_duration_years: How long to simulate every point.
+    * G_values: A list of gravitational constants in G_units. None means the
+      default Body.G_ASTRO_MONTHS.
+    * time_steps: A list of time steps in months.
+    * perturbations: An optional dict mapping a name to a top level function
+      that changes the list of bodies in place before the run.
+    * max_workers: The number of processes. Defaults to the number of CPUs.
+    * G_units: "months" or "days", the time unit the G values are given in.
+    * dump_names: An optional function mapping a key to a simulation name.
+      When given, every point runs with run_simulation and is dumped to disk
+      under that name. Otherwise only the final state is kept.
+    * simulation_options: Extra keyword arguments for Simulation, such as
+      backend, integrator or force_solver.
+
+    Output:
+    * A dict mapping every (scenario_file, G, time_step, perturbation_name)
+      key to a dict of the final 'positions' (AU), 'velocities' (km/s),
+      'body_names' and the 'elapsed' wall time in seconds.
+
+    Every simulation has its own G, so no module constants are changed and
+    the points can run at the same time. Call this from inside an
+    if __name__ == '__main__': block so the worker processes can start on
+    every platform.
+    """
+    keys = parameter_grid(scenario_files, G_values, time_steps, perturbations)
+    tasks = [(key, total_duration_years, G_units,
+              None if perturbations is None or key[3] is None else perturbations[key[3]],
+              None if dump_names is None else dump_names(key),
+              simulation_options)
+             for key in keys]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(_run_point, tasks)
+        return dict(zip(keys, results))
+
+
+
+def _run_point(task):
+    """Run the simulation for one sweep key. Executed in a worker process."""
+    key, total_duration_years, G_units, perturbation, dump_name, simulation_options = task
+    scenario_file, G, time_step, _ = key
+
+    system = Body.read_system(scenario_file)
+    if perturbation is not None:
+        perturbation(system)
+
+    start_time = time.time()
+    simulation = Simulation(system, time_step, name=dump_name or os.path.basename(scenario_file),
+                            G=G, G_units=G_units, **simulation_options)
+    if dump_name is not None:
+        simulation.run_simulation(total_duration_years)
+    else:
+        for _ in range(int(total_duration_years * 12.0 / time_step)):
+            simulation.step()
+
+    return {'positions': simulation.positions.copy(),
+            'velocities': simulation.velocities.copy(),
+            'body_names': list(simulation.body_names),
+            'elapsed': time.time() - start_time}
@@ -28,9 +28,16 @@ def anim_data(sim_name):
         
     Output:
     * A 2D array of planets formated for the animate_simulation method
+    
+    Columnar dumps are memory-mapped and only their positions are read.
+    Older pickle dumps are unpickled body by body.
     """
     import SimIO
 
+    if SimIO.has_columnar_dump(sim_name):
+        history = SimIO.MappedHistory(sim_name)
+        return (np.asarray(history.positions), list(history.names), list(history.masses))
+
     sim_hist = SimIO.reconstruct_history_pickle(sim_name)
     
     # Get position data
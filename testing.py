@@ -2,6 +2,16 @@ import math as m
 import unittest as ut
 import os
 import csv
+import shutil
+import tempfile
+import tracemalloc
+import warnings
+import numpy as np
+import SimIO
+import Forces
+import Diagnostics
+import Body
+from Simulation import Simulation, EnsembleSimulation
 from Body import Planetary_Body, Vector3, get_body_distance, get_gravitatonal_force_euler, KM_PER_S_TO_AU_PER_MONTH, AU_PER_MONTH_TO_KM_PER_SECOND, write_system, read_system
 
 # Constants
@@ -113,6 +123,37 @@ class TestVectorClass(ut.TestCase):
             print(f"\nExpected Magnitude: \n{expected_mag} \nGot: {result_mag}")
             print(f"\nExpected Normalization: \n{expected_norm} \nGot: {result_norm}")
 
+    def test_vector3_array_matches_vector3(self):
+        from Body import Vector3Array, bodies_to_arrays, arrays_to_bodies
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        vectors = [Vector3(5, 5, 2), Vector3(3, 4, 10), Vector3(0, 0, 0), Vector3(-1, 2, 0.5)]
+        other = Vector3(3, 3, 2)
+        scalar = 2.0
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        batch = Vector3Array.from_vectors(vectors)
+        others = Vector3Array.from_vectors([other] * len(vectors))
+
+        # Every batch operation gives what the same Vector3 operation gives
+        for result, expected in ((batch + other, [v + other for v in vectors]),
+                                 (batch - others, [v - other for v in vectors]),
+                                 (batch * scalar, [v * scalar for v in vectors]),
+                                 (batch / scalar, [v / scalar for v in vectors]),
+                                 (batch.normalize(), [v.normalize() for v in vectors])):
+            self.assertTrue(np.allclose(result.data, [e.to_list() for e in expected]))
+        self.assertTrue(np.allclose(batch.magnitude(), [v.magnitude() for v in vectors]))
+        with self.assertRaises(ValueError):
+            batch / 0
+
+        # Slotted objects have no per-instance dict, and convert to and from arrays
+        body = Planetary_Body(1.0, vectors[0], vectors[1], "Earth")
+        self.assertFalse(hasattr(vectors[0], "__dict__"))
+        self.assertFalse(hasattr(body, "__dict__"))
+        masses, positions, velocities, names = bodies_to_arrays([body, body])
+        round_trip = arrays_to_bodies(masses, positions, velocities, names)[1]
+        self.assertEqual((round_trip.name, round_trip.mass), ("Earth", 1.0))
+        self.assertEqual(round_trip.velocity.to_list(), vectors[1].to_list())
+
 class TestBody(ut.TestCase):
     def test_update_pos(self):
 
@@ -268,6 +309,948 @@ class TestPackageFunction(ut.TestCase):
 # Clean up
         if os.path.exists(test_file):
             os.remove(test_file)
-        
+
+class TestSimulation(ut.TestCase):
+    def setUp(self):
+        # Keep simulation dumps out of the working tree
+        self.dump_dir = tempfile.mkdtemp()
+        self.old_dump_path = SimIO.DEFAULT_DUMP_PATH
+        SimIO.DEFAULT_DUMP_PATH = self.dump_dir
+        self.old_dump_budget = SimIO.DUMP_BYTES_BUDGET
+
+    def tearDown(self):
+        SimIO.DEFAULT_DUMP_PATH = self.old_dump_path
+        SimIO.DUMP_BYTES_BUDGET = self.old_dump_budget
+        shutil.rmtree(self.dump_dir, ignore_errors=True)
+
+    def set_dump_budget(self, num_records, num_bodies):
+        """Flush dumps every num_records records of num_bodies bodies until
+        tearDown restores the budget."""
+        SimIO.DUMP_BYTES_BUDGET = num_records * num_bodies * 6 * 8
+
+    def test_vectorized_matches_objects(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Solar_System_Full_Initial.csv")
+        duration_years = 0.5
+        dt = 0.1
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        vectorized = Simulation(read_system(system_file), dt, "Vectorized")
+        objects = Simulation(read_system(system_file), dt, "Objects", backend="objects")
+
+        vec_hist = vectorized.run_simulation(duration_years)
+        obj_hist = objects.run_simulation(duration_years)
+
+        self.assertEqual(vec_hist.shape, obj_hist.shape)
+        self.assertTrue(np.allclose(vec_hist, obj_hist, rtol=0, atol=1e-12))
+        # The body objects are synced back at the end of the run
+        for vec_body, obj_body in zip(vectorized.bodies, objects.bodies):
+            self.assertTrue(m.isclose(vec_body.velocity.x, obj_body.velocity.x, rel_tol=1e-9))
+            self.assertTrue(m.isclose(vec_body.pos.y, obj_body.pos.y, rel_tol=1e-9))
+
+        # The array properties follow the objects backend step by step
+        for _ in range(3):
+            vectorized.step()
+            objects.step()
+        self.assertTrue(np.allclose(objects.positions, vectorized.positions, rtol=0, atol=1e-12))
+        self.assertTrue(np.allclose(objects.velocities, vectorized.velocities, rtol=1e-12, atol=0))
+
+    def test_rk4_step_allocation_is_flat(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Solar_System_Full_Initial.csv")
+        step_counts = [10, 100, 1000]
+        max_growth_bytes = 1024
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        sim = Simulation(read_system(system_file), 0.1, "Allocation")
+        sim.step() # first step sizes the stage and solver buffers
+
+        peaks = []
+        growths = []
+        tracemalloc.start()
+        try:
+            for count in step_counts:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                for _ in range(count):
+                    sim.step()
+                current, peak = tracemalloc.get_traced_memory()
+                growths.append(current - before)
+                peaks.append(peak - before)
+        finally:
+            tracemalloc.stop()
+
+        # Nothing is retained per step and the transient peak does not grow
+        # with the number of steps taken
+        for growth in growths:
+            self.assertLess(growth, max_growth_bytes)
+        self.assertLess(max(peaks) - min(peaks), max_growth_bytes)
+
+    def test_barnes_hut_force_error(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        num_bodies = 2000
+        theta = 0.5
+        max_median_error = 0.01
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        rng = np.random.default_rng(1)
+        bodies = [Planetary_Body(rng.uniform(0.001, 1.0), Vector3(*rng.normal(0, 5, 3)),
+                                 Vector3(*rng.normal(0, 1, 3)), f"Body{i}")
+                  for i in range(num_bodies)]
+        sim = Simulation(bodies, 0.1, "BarnesHut", force_solver="barnes_hut", theta=theta)
+
+        error = sim.force_error(sample_size=200)
+        self.assertLess(error['median'], max_median_error)
+        sim.step() # the solver also drives the integrator
+        self.assertTrue(np.all(np.isfinite(sim.positions)))
+
+        # An opening angle of zero never approximates and is exact
+        positions = sim.positions[:300]
+        masses = sim.masses[:300]
+        exact = Forces.direct_accelerations(positions, positions, masses, 1.0)
+        opened = Forces.BarnesHut(theta=0.0).accelerations(positions, positions, masses, 1.0)
+        self.assertLess(Forces.force_error(opened, exact)['max'], 1e-12)
+
+    def test_tiled_matches_pairwise_forces(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        num_bodies = 150
+        tile_size = 32 # does not divide num_bodies, so edge tiles are exercised
+        num_threads = 3
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        rng = np.random.default_rng(2)
+        bodies = [Planetary_Body(rng.uniform(0.001, 10.0), Vector3(*rng.normal(0, 5, 3)),
+                                 Vector3(0, 0, 0), f"Body{i}")
+                  for i in range(num_bodies)]
+        sim = Simulation(bodies, 0.1, "Tiled", force_solver="tiled",
+                         tile_size=tile_size, num_threads=num_threads)
+        tiled = sim._accelerations(sim.positions)
+
+        # Reference: the per-pair method summed and divided by target mass
+        for i in range(0, num_bodies, 7):
+            total = Vector3(0, 0, 0)
+            for j in range(num_bodies):
+                if i != j:
+                    total = total + Planetary_Body.calculate_gravitational_force_exerted_by_on(bodies[j], bodies[i])
+            expected = (total / bodies[i].mass).to_list()
+            self.assertTrue(np.allclose(tiled[i], expected, rtol=1e-12, atol=0))
+
+        # Reloading the bodies shuts down the replaced solver's threads
+        old_solver = sim._force_solver
+        sim.load_bodies()
+        self.assertIsNone(old_solver._executor)
+        self.assertTrue(np.array_equal(sim._accelerations(sim.positions), tiled))
+
+    def test_symplectic_integrator_order(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Sensitivity_Test_System1_Initial.csv")
+        duration_months = 6.0
+        # Halving the step should cut the error by about 2^order
+        expected_min_ratio = {"leapfrog": 3.0, "yoshida4": 10.0, "rk4": 10.0}
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        def final_position(integrator, dt):
+            sim = Simulation(read_system(system_file), dt, "Order", integrator=integrator)
+            for _ in range(int(round(duration_months / dt))):
+                sim.step()
+            return sim.positions[1].copy()
+
+        reference = final_position("rk4", 0.005)
+        for integrator, min_ratio in expected_min_ratio.items():
+            coarse = np.linalg.norm(final_position(integrator, 0.2) - reference)
+            fine = np.linalg.norm(final_position(integrator, 0.1) - reference)
+            self.assertGreater(coarse / fine, min_ratio, integrator)
+
+    def test_unknown_integrator_rejected(self):
+        system_file = os.path.join("StartingData", "Sun_To_Mars.csv")
+        with self.assertRaises(ValueError):
+            Simulation(read_system(system_file), 0.1, "Bad", integrator="euler")
+
+    def test_adaptive_integrator(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Slingshot_Ejection_Test_Initial.csv")
+        duration_years = 5.0
+        record_interval = 1.0 # months
+        tolerance = 1e-10
+        max_error_AU = 1e-5
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        adaptive = Simulation(read_system(system_file), record_interval, "Adaptive",
+                              integrator="dopri5", tolerance=tolerance)
+        history = adaptive.run_simulation(duration_years)
+
+        reference = Simulation(read_system(system_file), 0.005, "Reference")
+        for _ in range(int(round(duration_years * 12 / 0.005))):
+            reference.step()
+
+        # Output stays on the regular recording cadence
+        self.assertEqual(history.shape[0], int(duration_years * 12 / record_interval) + 1)
+        self.assertLess(np.abs(adaptive.positions - reference.positions).max(), max_error_AU)
+        stats = adaptive.integrator_stats()
+        self.assertGreater(stats['accepted_steps'], history.shape[0] - 1)
+        self.assertIn('rejected_steps', stats)
+
+        # A state that overflows or a tolerance no substep can meet raises
+        # instead of shrinking the substep forever
+        broken = Simulation(read_system(system_file), record_interval, "Broken", integrator="dopri5")
+        broken._vel[0, 0] = np.nan
+        with self.assertRaises(FloatingPointError):
+            broken.step()
+        unreachable = Simulation(read_system(system_file), record_interval, "Unreachable",
+                                 integrator="dopri5", tolerance=1e-40)
+        start = unreachable.positions.copy()
+        with self.assertRaises(FloatingPointError):
+            unreachable.step()
+        self.assertTrue(np.array_equal(unreachable.positions, start))
+
+    def test_hermite_block_time_steps(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Sun_Earth_Moon_Initial.csv")
+        duration_months = 12
+        block_months = 1.0
+        max_error_AU = 1e-5
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        block = Simulation(read_system(system_file), block_months, "Block",
+                           integrator="hermite_block", hermite_eta=0.002)
+        reference = Simulation(read_system(system_file), block_months, "Reference",
+                               integrator="dopri5", tolerance=1e-12)
+        for _ in range(duration_months):
+            block.step()
+            reference.step()
+        self.assertLess(np.abs(block.positions - reference.positions).max(), max_error_AU)
+
+        # The Moon needs shorter steps than the Sun, and only the active bodies
+        # were stepped at each block time
+        stats = block.integrator_stats()
+        sun, moon = block.body_names.index("Sun"), block.body_names.index("Moon")
+        self.assertGreater(stats['levels'][moon], stats['levels'][sun])
+        self.assertLess(stats['body_steps'], stats['block_steps'] * len(block.masses))
+
+        # The jerks come from direct summation, so other force solvers are refused
+        with self.assertRaises(ValueError):
+            Simulation(read_system(system_file), block_months, "Block", integrator="hermite_block",
+                       force_solver="barnes_hut")
+
+    def test_wisdom_holman_large_steps(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Solar_System_Full_Initial.csv")
+        duration_months = 60
+        wh_step_months = 0.5
+        max_error_AU = 5e-3
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        steps = int(duration_months / wh_step_months)
+        wisdom_holman = Simulation(read_system(system_file), wh_step_months, "WH",
+                                   integrator="wisdom_holman")
+        rk4 = Simulation(read_system(system_file), wh_step_months / 5, "RK4")
+        reference = Simulation(read_system(system_file), wh_step_months, "Reference",
+                               integrator="dopri5", tolerance=1e-12)
+        for _ in range(steps):
+            wisdom_holman.step()
+            reference.step()
+        for _ in range(steps * 5):
+            rk4.step()
+
+        # With 5x fewer steps Wisdom-Holman is still more accurate than RK4
+        wh_error = np.abs(wisdom_holman.positions - reference.positions).max()
+        rk4_error = np.abs(rk4.positions - reference.positions).max()
+        self.assertLess(wh_error, max_error_AU)
+        self.assertLess(wh_error, rk4_error)
+
+        # The planet-planet pulls go through the selected force solver
+        tiled = Simulation(read_system(system_file), wh_step_months, "Tiled", integrator="wisdom_holman",
+                           force_solver="tiled", tile_size=3, num_threads=2)
+        for _ in range(steps):
+            tiled.step()
+        self.assertTrue(np.allclose(tiled.positions, wisdom_holman.positions, rtol=0, atol=1e-12))
+
+    def test_kepler_two_body(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Grav_Constant_Test.csv")
+        duration_months = 120
+        max_error_AU = 1e-8
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        kepler = Simulation(read_system(system_file), 0.1, "Kepler", integrator="auto")
+        self.assertEqual(kepler.integrator, "kepler")
+        reference = Simulation(read_system(system_file), 1.0, "Reference",
+                               integrator="dopri5", tolerance=1e-12)
+        for _ in range(duration_months):
+            reference.step()
+
+        # All requested times at once, and stepping, both land on the reference
+        positions, velocities = kepler.kepler_states(np.linspace(0, duration_months, 7))
+        self.assertEqual(positions.shape, (7, 2, 3))
+        self.assertLess(np.abs(positions[-1] - reference.positions).max(), max_error_AU)
+        kepler.step(duration_months)
+        self.assertLess(np.abs(kepler.positions - reference.positions).max(), max_error_AU)
+
+        # Only two body systems can use it
+        three_bodies = read_system(os.path.join("StartingData", "Binary_Star_System_Initial.csv"))
+        self.assertEqual(Simulation(three_bodies, 0.1, "Auto", integrator="auto").integrator, "rk4")
+        with self.assertRaises(ValueError):
+            Simulation(three_bodies, 0.1, "Kepler", integrator="kepler")
+
+    def test_ensemble_matches_separate_runs(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Sun_To_Mars.csv")
+        G_scales = [0.5, 1.0, 2.0]
+        time_steps = [0.1, 0.05, 0.2]
+        duration_years = 1.0
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        default_G = Body.G_ASTRO_MONTHS
+        G_values = [default_G * scale for scale in G_scales]
+        ensemble = EnsembleSimulation([read_system(system_file) for _ in G_values],
+                                      time_steps, G=G_values, name="Ensemble")
+        history = ensemble.run_simulation(duration_years)
+        self.assertEqual(history.shape[1:], ensemble.positions.shape)
+        ensemble.dump_members()
+
+        # Each member ends where a separate simulation with its G and step does
+        for e, (G, dt) in enumerate(zip(G_values, time_steps)):
+            single = Simulation(read_system(system_file), dt, "Single", G=G)
+            for _ in range(int(duration_years * 12 / dt)):
+                single.step()
+            self.assertTrue(np.allclose(ensemble.positions[e], single.positions, rtol=0, atol=1e-10))
+            self.assertEqual(len(SimIO.MappedHistory(f"Ensemble_{e}")), int(duration_years * 12 / dt) + 1)
+
+        with self.assertRaises(ValueError):
+            EnsembleSimulation([read_system(system_file), read_system(system_file)[:1]])
+
+    def test_parallel_sweep_with_per_simulation_G(self):
+        import Sweep
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Sun_To_Mars.csv")
+        G_scales = [0.8, 1.25]
+        time_steps = [0.1, 0.2]
+        duration_years = 0.5
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        default_G = Body.G_ASTRO_MONTHS
+        G_values = [default_G * scale for scale in G_scales]
+        results = Sweep.run_sweep([system_file], duration_years, G_values=G_values,
+                                  time_steps=time_steps, max_workers=2)
+        single_start = Simulation(read_system(system_file), time_steps[0], "Start")
+        self.assertEqual(len(results), len(G_values) * len(time_steps))
+
+        # Every point matches a serial run, and the module G was never changed
+        for (scenario, G, dt, perturbation), result in results.items():
+            single = Simulation(read_system(scenario), dt, "Serial", G=G)
+            for _ in range(int(duration_years * 12 / dt)):
+                single.step()
+            self.assertTrue(np.array_equal(result['positions'], single.positions))
+        self.assertEqual(Body.G_ASTRO_MONTHS, default_G)
+
+        # The objects backend reports its final state, not the starting one
+        objects = Sweep.run_sweep([system_file], duration_years, G_values=G_values[:1],
+                                  time_steps=time_steps[:1], max_workers=1, backend="objects")
+        for key, result in objects.items():
+            self.assertFalse(np.allclose(result['positions'], single_start.positions))
+            self.assertTrue(np.allclose(result['positions'], results[key]['positions'], rtol=0, atol=1e-12))
+            self.assertTrue(np.allclose(result['velocities'], results[key]['velocities'], rtol=1e-12, atol=0))
+
+        # G given per day^2 is converted to per month^2
+        in_days = Simulation(read_system(system_file), 0.1, "Days",
+                             G=Body._G_ASTRO_DAYS_REF, G_units="days")
+        self.assertAlmostEqual(in_days.G / default_G, 1.0, places=12)
+        with self.assertRaises(ValueError):
+            Simulation(read_system(system_file), 0.1, "Bad", G=1.0, G_units="years")
+
+    def test_test_particles_feel_but_do_not_pull(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Lagrange_Point_Test_Initial.csv")
+        duration_months = 12
+        num_probes = 500
+        max_error_AU = 1e-8
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        system = read_system(system_file)
+        l4 = [body for body in system if body.name == "L4_Object"][0]
+        probe = Planetary_Body(0.0, l4.pos.copy(), l4.velocity.copy(), "L4_Probe")
+        with_probes = Simulation(read_system(system_file), 0.1, "Probes", test_particles=[probe])
+        rng = np.random.default_rng(0)
+        with_probes.add_test_particles(rng.uniform(-2, 2, (num_probes, 3)), rng.uniform(-30, 30, (num_probes, 3)))
+        without_probes = Simulation(read_system(system_file), 0.1, "NoProbes")
+        self.assertEqual(with_probes.num_test_particles, num_probes + 1)
+        self.assertEqual(with_probes.positions.shape, without_probes.positions.shape)
+
+        for _ in range(duration_months * 10):
+            with_probes.step()
+            without_probes.step()
+
+        # The probes change nothing, and the probe placed on the L4 object follows it
+        self.assertTrue(np.array_equal(with_probes.positions, without_probes.positions))
+        l4_index = with_probes.body_names.index("L4_Object")
+        self.assertLess(np.abs(with_probes.tp_positions[0] - with_probes.positions[l4_index]).max(), max_error_AU)
+        self.assertEqual(with_probes.tp_names[0], "L4_Probe")
+
+        with self.assertRaises(ValueError):
+            Simulation(read_system(system_file), 0.1, "Block", integrator="hermite_block", test_particles=[probe])
+
+    def test_recorder_stride_and_final_only(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Sun_Earth_Moon_Initial.csv")
+        duration_years = 1.0
+        record_every = 7
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        full = Simulation(read_system(system_file), 0.1, "Full")
+        full_history = full.run_simulation(duration_years)
+        strided = Simulation(read_system(system_file), 0.1, "Strided")
+        strided_history = strided.run_simulation(duration_years, record_every=record_every)
+        final = Simulation(read_system(system_file), 0.1, "Final")
+        final_history = final.run_simulation(duration_years, final_only=True)
+
+        # One preallocated (n_records, N, 6) array, names and masses kept once
+        num_steps = full.recorder.num_steps
+        recorder = strided.recorder
+        self.assertEqual(recorder.data.shape, (num_steps // record_every + 2, 3, 6))
+        self.assertEqual(recorder.names, strided.body_names)
+        self.assertTrue(np.array_equal(recorder.steps[:-1], np.arange(0, num_steps + 1, record_every)))
+        self.assertEqual(recorder.steps[-1], num_steps)
+
+        # Strided and final records are the same states as the full record
+        self.assertTrue(np.array_equal(strided_history, full_history[recorder.steps]))
+        self.assertEqual(final_history.shape, (1, 3, 3))
+        self.assertTrue(np.array_equal(final_history[0], full_history[-1]))
+        self.assertTrue(np.array_equal(final.recorder.velocities[0], full.velocities))
+        self.assertTrue(np.array_equal(SimIO.MappedHistory("Strided").steps, recorder.steps))
+
+    def test_async_dumps_flush_on_byte_budget(self):
+        import time
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Sun_Earth_Moon_Initial.csv")
+        duration_years = 1.0
+        budget_records = 16
+        slow_write_seconds = 0.2
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        simulation = Simulation(read_system(system_file), 0.1, "Budget")
+        self.set_dump_budget(budget_records, 3)
+        history = simulation.run_simulation(duration_years, dump_format="pickle")
+
+        # Chunks of budget_records records, which read back as the full history
+        chunk_files = [file_name for file_name in os.listdir(os.path.join(SimIO.DEFAULT_DUMP_PATH, "Budget"))
+                       if file_name.endswith(".pkl")]
+        self.assertEqual(len(chunk_files), -(-len(history) // budget_records))
+        dumped = SimIO.reconstruct_history_pickle("Budget")
+        self.assertEqual(len(dumped), len(history))
+        self.assertEqual(dumped[-1][1].pos.to_list(), history[-1][1].tolist())
+
+        # The two body fast path flushes on the same budget
+        kepler_file = os.path.join("StartingData", "Grav_Constant_Test.csv")
+        kepler = Simulation(read_system(kepler_file), 0.1, "BudgetKepler", integrator="kepler")
+        self.set_dump_budget(budget_records, 2)
+        kepler_history = kepler.run_simulation(duration_years)
+        manifest = SimIO.read_manifest("BudgetKepler")
+        self.assertEqual(len(manifest['chunks']), -(-len(kepler_history) // budget_records))
+        self.assertTrue(np.array_equal(SimIO.HistoryView("BudgetKepler").positions, kepler_history))
+
+        # Submitting does not wait for the write, and write errors are not lost
+        writer = SimIO.AsyncDumpWriter(max_queue=2)
+        start = time.time()
+        writer.submit(time.sleep, slow_write_seconds)
+        self.assertLess(time.time() - start, slow_write_seconds / 2)
+        writer.submit(os.remove, os.path.join(SimIO.DEFAULT_DUMP_PATH, "missing.pkl"))
+        with self.assertRaises(FileNotFoundError):
+            writer.close()
+
+    def test_recorder_without_history_reuses_its_rows(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Solar_System_Full_Initial.csv")
+        duration_years = 2.0
+        record_every = 2
+        budget_records = 16
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        kept = Simulation(read_system(system_file), 0.1, "Kept", integrator="leapfrog")
+        self.set_dump_budget(budget_records, len(kept.masses))
+        history = kept.run_simulation(duration_years, record_every=record_every)
+
+        # Only one dump's worth of rows, and the same records end up on disk
+        streamed = Simulation(read_system(system_file), 0.1, "Streamed", integrator="leapfrog")
+        held = streamed.run_simulation(duration_years, record_every=record_every, keep_history=False)
+        self.assertEqual(len(held), 0)
+        self.assertEqual(len(streamed.recorder.data), budget_records)
+        steps, positions, _ = SimIO.read_records("Streamed")
+        self.assertTrue(np.array_equal(steps, kept.recorder.steps))
+        self.assertTrue(np.array_equal(positions, history))
+
+        # Extending carries on without reading the earlier records back
+        streamed.extend(duration_years)
+        kept.extend(duration_years)
+        self.assertEqual(len(streamed.recorder.data), budget_records)
+        self.assertTrue(np.array_equal(SimIO.read_records("Streamed")[1], SimIO.read_records("Kept")[1]))
+
+    def test_pickle_run_replaces_columnar_dump(self):
+        from Visualizer import anim_data
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Sun_Earth_Moon_Initial.csv")
+        first_years = 1.0
+        second_years = 2.0
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        Simulation(read_system(system_file), 0.1, "Same").run_simulation(first_years)
+        history = Simulation(read_system(system_file), 0.1, "Same").run_simulation(second_years,
+                                                                                     dump_format="pickle")
+
+        # The readers see the pickle run, not the columnar one before it
+        self.assertFalse(SimIO.has_columnar_dump("Same"))
+        _, positions, _ = SimIO.read_records("Same")
+        self.assertEqual(len(positions), len(history))
+        self.assertTrue(np.array_equal(positions, history))
+        self.assertEqual(len(anim_data("Same")[0]), len(history))
+
+    def test_columnar_dump_is_memory_mapped(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Solar_System_Full_Initial.csv")
+        duration_years = 2.0
+        budget_records = 50
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        simulation = Simulation(read_system(system_file), 0.1, "Columnar")
+        self.set_dump_budget(budget_records, len(simulation.masses))
+        history = simulation.run_simulation(duration_years)
+
+        # Several chunks, opened as memory maps and read back as one array
+        mapped = SimIO.MappedHistory("Columnar")
+        self.assertGreater(len(mapped.positions.chunks), 1)
+        self.assertIsInstance(mapped.positions.chunks[0], np.memmap)
+        self.assertEqual(mapped.positions.shape, history.shape)
+        self.assertEqual(mapped.names, simulation.body_names)
+        self.assertTrue(np.array_equal(mapped.masses, simulation.masses))
+        self.assertTrue(np.array_equal(np.asarray(mapped.positions), history))
+        self.assertTrue(np.array_equal(mapped.velocities[-1], simulation.velocities))
+
+        # Indexing across chunk boundaries matches the in-memory history
+        for key in (budget_records, -1, slice(budget_records - 3, budget_records + 3),
+                    (slice(None, None, 7), 3), ([0, 140, 60], slice(None), 2)):
+            self.assertTrue(np.array_equal(mapped.positions[key], history[key]))
+        self.assertTrue(np.allclose(mapped.times, simulation.recorder.times))
+
+    def test_manifest_and_load_range(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Solar_System_Full_Initial.csv")
+        duration_years = 3.0
+        budget_records = 60
+        t0, t1 = 1.25, 1.75
+        bodies = ["Earth", "Jupiter"]
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        simulation = Simulation(read_system(system_file), 0.1, "Manifest")
+        self.set_dump_budget(budget_records, len(simulation.masses))
+        history = simulation.run_simulation(duration_years)
+
+        # The chunks tile the run with no gaps and their offsets point at the data
+        chunks = SimIO.read_manifest("Manifest")['chunks']
+        self.assertGreater(len(chunks), 2)
+        self.assertEqual(chunks[0]['first_step'], 0)
+        self.assertEqual(chunks[-1]['last_step'], simulation.recorder.steps[-1])
+        for before, after in zip(chunks, chunks[1:]):
+            self.assertEqual(after['first_record'], before['first_record'] + before['num_records'])
+            self.assertEqual(after['first_step'], before['last_step'] + 1)
+            self.assertLess(before['end_months'], after['start_months'])
+        first = os.path.join(SimIO.DEFAULT_DUMP_PATH, "Manifest", chunks[0]['files']['pos'])
+        self.assertEqual(os.path.getsize(first) - chunks[0]['offsets']['pos'],
+                         chunks[0]['num_records'] * len(simulation.masses) * 3 * 8)
+
+        # A time window matches the same slice of the in-memory history
+        times, positions, velocities = SimIO.load_range("Manifest", t0, t1, bodies=bodies)
+        record_years = simulation.recorder.times / 12.0
+        window = (record_years >= t0) & (record_years <= t1)
+        columns = [simulation.body_names.index(name) for name in bodies]
+        self.assertTrue(np.allclose(times, record_years[window]))
+        self.assertTrue(np.array_equal(positions, history[window][:, columns]))
+        self.assertTrue(np.array_equal(velocities, simulation.recorder.velocities[window][:, columns]))
+
+        # Only the chunks overlapping the window are opened
+        opened = []
+        memmap = np.memmap
+        def counting_memmap(path, *args, **kwargs):
+            opened.append(os.path.basename(path))
+            return memmap(path, *args, **kwargs)
+        np.memmap = counting_memmap
+        try:
+            SimIO.load_range("Manifest", t0, t1)
+        finally:
+            np.memmap = memmap
+        needed = [chunk for chunk in chunks
+                  if chunk['end_months'] >= t0 * 12 and chunk['start_months'] <= t1 * 12]
+        self.assertLess(len(needed), len(chunks))
+        self.assertEqual(sorted(set(opened)), sorted(name for chunk in needed
+                                                     for name in chunk['files'].values()))
+
+    def test_history_view_is_lazy_and_bounded(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Solar_System_Full_Initial.csv")
+        duration_years = 3.0
+        budget_records = 40
+        cached_chunks = 2
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        simulation = Simulation(read_system(system_file), 0.1, "Lazy")
+        self.set_dump_budget(budget_records, len(simulation.masses))
+        chunk_bytes = SimIO.DUMP_BYTES_BUDGET
+        history = simulation.run_simulation(duration_years)
+        velocities = simulation.recorder.velocities
+
+        # Opening reads no chunks, walking the run keeps the cache bounded
+        view = SimIO.HistoryView("Lazy", cache_bytes=cached_chunks * chunk_bytes)
+        self.assertEqual(len(view), len(history))
+        self.assertEqual(view.cache.misses, 0)
+        for index, record in enumerate(view):
+            self.assertTrue(np.array_equal(record[:, :3], history[index]))
+            self.assertLessEqual(view.cache.nbytes, cached_chunks * chunk_bytes)
+        self.assertEqual(view.cache.misses, len(view.chunks))
+
+        # Going back over nearby records is served from the cache
+        misses = view.cache.misses
+        for index in range(len(view) - budget_records, len(view)):
+            view[index]
+        self.assertEqual(view.cache.misses, misses)
+
+        # Slicing by record, step, time and body
+        earth = simulation.body_names.index("Earth")
+        self.assertTrue(np.array_equal(view[5:90:3]["Earth"].positions, history[5:90:3, [earth]]))
+        self.assertTrue(np.array_equal(view.at_step(77), np.hstack((history[77], velocities[77]))))
+        steps = view.step_range(30, 130)
+        self.assertTrue(np.array_equal(steps.steps, np.arange(30, 130)))
+        self.assertTrue(np.array_equal(steps.velocities, velocities[30:130]))
+        window = view.time_range(1.0, 2.0).select_bodies(["Sun", "Jupiter"])
+        self.assertEqual(window.names, ["Sun", "Jupiter"])
+        self.assertTrue(np.allclose(window.times / 12.0, np.arange(120, 241) * 0.1 / 12.0))
+        self.assertTrue(np.array_equal(view.at_time(1.0), view.at_step(120)))
+        with self.assertRaises(KeyError):
+            view[::2].at_step(1)
+
+    def test_compressed_dumps(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Solar_System_Full_Initial.csv")
+        duration_years = 2.0
+        tolerance_au = 1e-6
+        tolerance_km_s = 1e-5
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        # Lossless: every bit comes back, through every reader
+        simulation = Simulation(read_system(system_file), 0.1, "Lossless")
+        history = simulation.run_simulation(duration_years, dump_format="compressed")
+        velocities = simulation.recorder.velocities
+        self.assertEqual(SimIO.read_metadata("Lossless")['format'], "compressed")
+        self.assertTrue(np.array_equal(np.asarray(SimIO.MappedHistory("Lossless").positions), history))
+        self.assertTrue(np.array_equal(SimIO.HistoryView("Lossless").velocities, velocities))
+        times, positions, _ = SimIO.load_range("Lossless", 0.5, 1.0, bodies=["Earth"])
+        window = (simulation.recorder.times >= 6.0) & (simulation.recorder.times <= 12.0)
+        self.assertTrue(np.array_equal(positions[:, 0], history[window, simulation.body_names.index("Earth")]))
+        lossless = simulation._codec.report()
+        self.assertGreater(lossless['ratio'], 1.2)
+        self.assertGreater(lossless['encode_mb_per_s'], 0.0)
+        self.assertEqual(lossless['decode_mb_per_s'], 0.0)
+        # Reads given the run's codec add their decode time to its report
+        self.assertTrue(np.array_equal(simulation.history_view().positions, history))
+        self.assertGreater(simulation._codec.report()['decode_mb_per_s'], 0.0)
+
+        # Lossy: within the tolerances and much smaller
+        codec = SimIO.TrajectoryCodec("lzma", tolerance_au=tolerance_au, tolerance_km_s=tolerance_km_s)
+        simulation = Simulation(read_system(system_file), 0.1, "Lossy")
+        history = simulation.run_simulation(duration_years, dump_format="compressed", codec=codec)
+        view = SimIO.HistoryView("Lossy", codec=codec)
+        self.assertLessEqual(np.abs(view.positions - history).max(), tolerance_au * (1 + 1e-9))
+        self.assertLessEqual(np.abs(view.velocities - simulation.recorder.velocities).max(),
+                             tolerance_km_s * (1 + 1e-9))
+        self.assertGreater(codec.report()['ratio'], 3 * lossless['ratio'])
+        decoded = codec.decoded_bytes
+        SimIO.load_range("Lossy", 0.0, duration_years, codec=codec)
+        SimIO.MappedHistory("Lossy", codec=codec)
+        self.assertEqual(codec.decoded_bytes, 3 * decoded)
+        self.assertGreater(codec.report()['decode_mb_per_s'], 0.0)
+
+        # Blocks carry their own settings, so any codec decodes them
+        block = codec.encode(history[:10])
+        self.assertTrue(np.array_equal(SimIO.TrajectoryCodec().decode(block), codec.decode(block)))
+        with self.assertRaises(ValueError):
+            SimIO.TrajectoryCodec("gzip")
+
+    def test_resume_from_checkpoint(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Solar_System_Full_Initial.csv")
+        duration_years = 2.0
+        checkpoint_every = 50
+        crash_step = 130
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        complete = Simulation(read_system(system_file), 0.1, "Complete", integrator="leapfrog")
+        expected = complete.run_simulation(duration_years, record_every=3).copy()
+
+        # Kill a run part way through
+        simulation = Simulation(read_system(system_file), 0.1, "Crash", integrator="leapfrog")
+        step = simulation.step
+        steps_taken = []
+        def crashing_step(dt=None):
+            if len(steps_taken) == crash_step:
+                raise KeyboardInterrupt("Node preempted")
+            steps_taken.append(dt)
+            step(dt)
+        simulation.step = crashing_step
+        with self.assertRaises(KeyboardInterrupt):
+            simulation.run_simulation(duration_years, record_every=3, checkpoint_every=checkpoint_every)
+
+        _, _, _, settings = SimIO.read_checkpoint("Crash")
+        self.assertEqual(settings['step'], crash_step // checkpoint_every * checkpoint_every)
+        self.assertEqual(settings['integrator'], "leapfrog")
+        self.assertEqual(settings['G'], simulation.G)
+        # A chunk written after the checkpoint is thrown away on resume
+        SimIO.dump_records_columnar("Crash", settings['records'], [9999], expected[:1], expected[:1])
+
+        resumed = Simulation.resume("Crash")
+        self.assertTrue(np.array_equal(resumed, expected))
+        self.assertTrue(np.array_equal(SimIO.MappedHistory("Crash").positions[:], expected))
+        self.assertTrue(np.array_equal(SimIO.MappedHistory("Crash").steps, complete.recorder.steps))
+        _, _, _, settings = SimIO.read_checkpoint("Crash")
+        self.assertEqual(settings['step'], settings['num_steps'])
+
+        # The two body fast path checkpoints on the same steps
+        kepler_file = os.path.join("StartingData", "Grav_Constant_Test.csv")
+        kepler_complete = Simulation(read_system(kepler_file), 0.1, "KeplerComplete", integrator="kepler")
+        kepler_expected = kepler_complete.run_simulation(duration_years, record_every=3,
+                                                         checkpoint_every=checkpoint_every).copy()
+        kepler = Simulation(read_system(kepler_file), 0.1, "KeplerCrash", integrator="kepler")
+        checkpoint = kepler._checkpoint
+        checkpoint_steps = []
+        def crashing_checkpoint(writer, step_num):
+            checkpoint(writer, step_num)
+            checkpoint_steps.append(step_num)
+            if step_num >= crash_step // checkpoint_every * checkpoint_every:
+                raise KeyboardInterrupt("Node preempted")
+        kepler._checkpoint = crashing_checkpoint
+        with self.assertRaises(KeyboardInterrupt):
+            kepler.run_simulation(duration_years, record_every=3, checkpoint_every=checkpoint_every)
+        self.assertEqual(checkpoint_steps, list(range(checkpoint_every, crash_step, checkpoint_every)))
+        self.assertTrue(np.array_equal(Simulation.resume("KeplerCrash"), kepler_expected))
+
+    def test_fork_variants_share_history(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Solar_System_Full_Initial.csv")
+        warm_up_years = 2.0
+        total_years = 3.0
+        budget_records = 60
+        variants = {"No_Jupiter": {"remove": ["Jupiter"]},
+                    "Heavy_Mars": {"masses": {"Mars": 300.0}},
+                    "Swapped": {"swap": [("Earth", "Mars")]},
+                    "Kicked": {"kick": {"Earth": [0.0, 1.0, 0.0]}}}
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        warm_up = Simulation(read_system(system_file), 0.1, "Family", integrator="leapfrog")
+        self.set_dump_budget(budget_records, len(warm_up.masses))
+        prefix = warm_up.run_simulation(warm_up_years).copy()
+        forks = Simulation.fork(warm_up, variants, total_duration_years=total_years)
+        names = warm_up.body_names
+        jupiter = names.index("Jupiter")
+        kept = [i for i in range(len(names)) if i != jupiter]
+
+        # The forked states carry the changes
+        self.assertEqual(forks["No_Jupiter"].body_names, [names[i] for i in kept])
+        self.assertEqual(forks["Heavy_Mars"].masses[names.index("Mars")], 300.0)
+        self.assertTrue(np.array_equal(forks["Swapped"].positions[names.index("Earth")],
+                                       warm_up.positions[names.index("Mars")]))
+        self.assertTrue(np.allclose(forks["Kicked"].velocities[names.index("Earth")] - [0.0, 1.0, 0.0],
+                                    warm_up.velocities[names.index("Earth")]))
+
+        # The prefix is shared on disk, not copied
+        chunk = SimIO.read_manifest("Family")['chunks'][0]['files']['pos']
+        shared = [os.path.join(SimIO.DEFAULT_DUMP_PATH, sim_name, chunk) for sim_name in ("Family", "No_Jupiter")]
+        self.assertTrue(os.path.samefile(*shared))
+
+        # Resuming a variant only integrates the part after the fork
+        remaining = int(total_years * 12.0 / 0.1) - warm_up.recorder.num_steps
+        direct = Simulation(Body.arrays_to_bodies(warm_up.masses[kept], warm_up.positions[kept],
+                                                  warm_up.velocities[kept], forks["No_Jupiter"].body_names),
+                            0.1, "Direct", integrator="leapfrog")
+        for _ in range(remaining):
+            direct.step()
+        history = Simulation.resume("No_Jupiter")
+        self.assertTrue(np.array_equal(history[:len(prefix)], prefix[:, kept]))
+        self.assertTrue(np.array_equal(history[-1], direct.positions))
+
+        # Re-running the parent leaves the variant's history intact
+        warm_up.run_simulation(0.5)
+        self.assertTrue(np.array_equal(np.asarray(SimIO.MappedHistory("No_Jupiter").positions), history))
+        _, saturn, _ = SimIO.load_range("No_Jupiter", 0.0, total_years, bodies=["Saturn"])
+        self.assertTrue(np.array_equal(saturn[:, 0], history[:, forks["No_Jupiter"].body_names.index("Saturn")]))
+
+    def test_extend_appends_to_the_run(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Sun_To_Mars.csv")
+        time_step = 0.125 # Whole steps per year, so 1 + 1 years is 2 years
+        budget_records = 40
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        complete = Simulation(read_system(system_file), time_step, "Three_Years", integrator="leapfrog")
+        expected = complete.run_simulation(3.0).copy()
+
+        self.set_dump_budget(budget_records, len(complete.masses))
+        simulation = Simulation(read_system(system_file), time_step, "Extended", integrator="leapfrog")
+        simulation.run_simulation(1.0)
+        chunks = SimIO.read_manifest("Extended")['chunks']
+        history = simulation.extend(1.0)
+
+        # A dump from before checkpoints is continued from its last record
+        SimIO.remove_checkpoint("Extended")
+        history = Simulation(read_system(system_file), time_step, "Extended", integrator="leapfrog").extend(1.0)
+
+        self.assertTrue(np.array_equal(history, expected))
+        mapped = SimIO.MappedHistory("Extended")
+        self.assertTrue(np.array_equal(mapped.steps, np.arange(len(expected))))
+        self.assertTrue(np.array_equal(np.asarray(mapped.positions), expected))
+        self.assertEqual(SimIO.read_manifest("Extended")['chunks'][:len(chunks)], chunks)
+        self.assertEqual(mapped.metadata['num_steps'], len(expected) - 1)
+
+        # Extending with other integration settings than the run's fails
+        # instead of quietly using the run's
+        with self.assertRaises(ValueError):
+            Simulation(read_system(system_file), time_step, "Extended", integrator="yoshida4").extend(1.0)
+        with self.assertRaises(ValueError):
+            Simulation(read_system(system_file), 2 * time_step, "Extended", integrator="leapfrog").extend(1.0)
+        self.assertEqual(SimIO.read_checkpoint("Extended")[3]['step'], len(expected) - 1)
+
+        # Records in another format than the run wrote are not appended to
+        mixed = Simulation(read_system(system_file), time_step, "Mixed", integrator="leapfrog")
+        mixed.run_simulation(1.0, dump_format="pickle")
+        for file_name in os.listdir(os.path.join(SimIO.DEFAULT_DUMP_PATH, "Three_Years")):
+            if file_name != SimIO.CHECKPOINT_FILE:
+                shutil.copy(os.path.join(SimIO.DEFAULT_DUMP_PATH, "Three_Years", file_name),
+                            os.path.join(SimIO.DEFAULT_DUMP_PATH, "Mixed"))
+        with self.assertRaises(ValueError):
+            mixed.extend(1.0)
+        SimIO.remove_checkpoint("Mixed")
+        with self.assertRaises(ValueError):
+            mixed.extend(1.0)
+
+    def test_iter_states_streams_the_run(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Solar_System_Full_Initial.csv")
+        duration_years = 2.0
+        every = 7
+        stop_step = 70
+        long_duration_years = 20.0
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        recorded = Simulation(read_system(system_file), 0.1, "Recorded")
+        history = recorded.run_simulation(duration_years, record_every=every)
+
+        # The same states as a recorded run, read-only
+        streamed = Simulation(read_system(system_file), 0.1, "Streamed")
+        snapshots = list(streamed.iter_states(duration_years, every=every))
+        self.assertTrue(np.array_equal([snapshot.step for snapshot in snapshots], recorded.recorder.steps))
+        self.assertTrue(np.array_equal([snapshot.positions for snapshot in snapshots], history))
+        self.assertAlmostEqual(snapshots[-1].time_months, recorded.recorder.times[-1])
+        with self.assertRaises(ValueError):
+            snapshots[0].positions[0, 0] = 1.0
+
+        # Breaking out stops the integration at the last state handed out
+        stopped = Simulation(read_system(system_file), 0.1, "Stopped")
+        for snapshot in stopped.iter_states(duration_years, every=every):
+            if snapshot.step >= stop_step:
+                break
+        self.assertTrue(np.array_equal(stopped.positions, snapshot.positions))
+        self.assertEqual(stopped.bodies[3].pos.to_list(), snapshot.positions[3].tolist())
+
+        # A consumer that keeps nothing runs in constant memory
+        tracemalloc.start()
+        farthest = 0.0
+        for snapshot in Simulation(read_system(system_file), 0.1, "Long").iter_states(long_duration_years):
+            farthest = max(farthest, np.abs(snapshot.positions).max())
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertGreater(farthest, 0.0)
+        self.assertLess(peak, 1e6)
+
+    def test_dense_output_matches_the_integrator(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Solar_System_Full_Initial.csv")
+        duration_years = 2.0
+        dense_every = 5
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        simulation = Simulation(read_system(system_file), 0.1, "Dense")
+        history = simulation.run_simulation(duration_years, dense_every=dense_every)
+        fine = Simulation(read_system(system_file), 0.025, "Fine")
+        reference = fine.run_simulation(duration_years, record_every=4)
+        integrator_error = np.abs(history - reference[:len(history)]).max()
+
+        # Between knots the interpolation misses the integrated steps by far
+        # less than the integrator misses the true orbit
+        positions, velocities = simulation.state_at(simulation.recorder.times / 12.0)
+        interpolation_error = np.abs(positions - history).max()
+        self.assertLess(interpolation_error, integrator_error / 10.0)
+        self.assertLess(np.abs(velocities - simulation.recorder.velocities).max(), 0.5)
+        self.assertLess(simulation.dense_output.error_estimate(), 2.0 * interpolation_error)
+        self.assertLess(simulation.dense_output.nbytes, simulation.recorder.nbytes / 2)
+
+        # Knots come back exactly, also from the saved dense output
+        knots = simulation.dense_output.times / 12.0
+        self.assertTrue(np.array_equal(simulation.state_at(knots)[0], history[::dense_every]))
+        saved = SimIO.read_dense_output("Dense")
+        self.assertTrue(np.array_equal(saved.evaluate(knots * 12.0)[0], history[::dense_every]))
+        with self.assertRaises(ValueError):
+            simulation.state_at(duration_years + 1.0)
+
+        # Extending the run extends its dense output too
+        extended = simulation.extend(1.0)
+        knot_steps = simulation.dense_output.knot_steps
+        self.assertEqual(knot_steps[-1], len(extended) - 1)
+        self.assertTrue(np.all(np.diff(knot_steps) == dense_every))
+        self.assertTrue(np.array_equal(simulation.state_at(knot_steps * 0.1 / 12.0)[0], extended[knot_steps]))
+        saved = SimIO.read_dense_output("Dense")
+        self.assertTrue(np.array_equal(saved.knot_steps, knot_steps))
+        self.assertTrue(np.array_equal(saved.evaluate(knot_steps * 0.1)[0], extended[knot_steps]))
+
+    def test_diagnostics_track_conserved_quantities(self):
+
+#~{}~~~~~~~~~~~~~~User Modification Area~~~~~~~~~~~~~~{}~
+        system_file = os.path.join("StartingData", "Solar_System_Full_Initial.csv")
+        duration_years = 5.0
+        diagnostics_every = 10
+#~{}~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~{}~
+        def farthest(positions, velocities, masses, G):
+            return {'farthest': np.linalg.norm(positions, axis=1).max()}
+
+        simulation = Simulation(read_system(system_file), 0.1, "Diagnosed", integrator="leapfrog")
+        simulation.run_simulation(duration_years, final_only=True, diagnostics_every=diagnostics_every,
+                                  reducers=list(Diagnostics.DEFAULT_REDUCERS) + [farthest])
+        series = simulation.diagnostics.series()
+        num_evaluations = int(duration_years * 12.0 / 0.1) // diagnostics_every + 1
+        self.assertEqual(len(series['times']), num_evaluations)
+        self.assertEqual(series['angular_momentum'].shape, (num_evaluations, 3))
+        self.assertEqual(len(series['farthest']), num_evaluations)
+
+        # Leapfrog conserves momentum exactly and energy to a bounded error
+        drift = simulation.diagnostics.drift()
+        self.assertLess(drift['energy'], 1e-4)
+        self.assertLess(drift['angular_momentum'], 1e-12)
+        self.assertLess(drift['com_position'], 1e-12)
+
+        # The last evaluation is the final state, computed pair by pair
+        positions, velocities, masses = simulation.positions, simulation.velocities, simulation.masses
+        pairs = [(i, j) for i in range(len(masses)) for j in range(i + 1, len(masses))]
+        separations = [np.linalg.norm(positions[i] - positions[j]) for i, j in pairs]
+        potential = -sum(simulation.G * masses[i] * masses[j] / np.linalg.norm(positions[i] - positions[j])
+                         for i, j in pairs)
+        self.assertAlmostEqual(series['min_separation'][-1], min(separations), places=12)
+        self.assertAlmostEqual(series['max_separation'][-1], max(separations), places=12)
+        self.assertAlmostEqual(series['potential'][-1] / potential, 1.0, places=12)
+
+        # A head-on fall has no angular momentum to divide by
+        bodies = [Planetary_Body(332946.0, Vector3(0, 0, 0), Vector3(0, 0, 0), "Sun"),
+                  Planetary_Body(1.0, Vector3(1, 0, 0), Vector3(0, 0, 0), "Earth")]
+        radial = Simulation(bodies, 0.1, "Radial")
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            radial.run_simulation(0.1, final_only=True, diagnostics_every=1)
+            drift = radial.diagnostics.drift()
+        self.assertEqual(drift['angular_momentum'], 0.0)
+        self.assertGreater(drift['energy'], 0.0)
+
 if __name__ == '__main__':
     ut.main()